@@ -2,7 +2,12 @@ import streamlit as st
 from src.authentication import display_login_page
 from src.admin_dashboard import display_admin_dashboard
 from src.user_dashboard import display_user_dashboard
-from src.helpers import display_password_change_section
+from src.helpers import display_password_change_section, ensure_task_indexes, show_flash
+from src.scanner import start_attention_scanner
+from src.profiler import run_profiled
+from src.archive import start_archiver
+from src.analytics import start_analytics_snapshots
+from src.jobs import start_job_runners, reset_job_polling, poll_jobs
 from src.tasks import display_task_details, display_subtasks_details  # Add this import at the top of your file
 
 def initialize_session_state():
@@ -24,8 +29,12 @@ def run_app():
     #st.sidebar.image("stem.jpg")
     st.sidebar.image("knowledge.png")
     st.title("Tasks @ Office of Hannah Chair")
+    show_flash()
 
     initialize_session_state()  # Ensure session state is properly initialized
+    # Process-wide, so jobs left by a stopped process resume before anyone from their tenant logs in
+    start_job_runners()
+    reset_job_polling()
 
     # Initialize the new session state variable
     if 'show_create_user_form' not in st.session_state:
@@ -38,22 +47,29 @@ def run_app():
         #     display_password_change_section(st.session_state.user["email"], st.session_state.company_name)  # Redirect to password change function
         # else:
         if st.session_state.company_name == "":
-            st.session_state.company_name = st.session_state.user["company_name"]  # Set the company name from the user data
+            st.session_state.company_name = st.session_state.user.company_name  # Set the company name from the user data
 
-        if st.session_state.user["role"] == "admin":
+        ensure_task_indexes(st.session_state.company_name)
+        start_attention_scanner(st.session_state.company_name)
+        start_archiver(st.session_state.company_name)
+        start_analytics_snapshots(st.session_state.company_name)
+
+        if st.session_state.user.role == "admin":
             if st.session_state.page == "Task Details":
-                display_task_details(st.session_state.user["email"])
+                display_task_details(st.session_state.user.email)
             elif st.session_state.page == "Subtask Details":
-                display_subtasks_details(st.session_state.user["email"])
+                display_subtasks_details(st.session_state.user.email)
             else:
-                display_admin_dashboard(st.session_state.user["name"])  # add st.session_state as a parameter
-        elif st.session_state.user["role"] == "user":
+                display_admin_dashboard(st.session_state.user.name)  # add st.session_state as a parameter
+        elif st.session_state.user.role == "user":
             if st.session_state.page == "Task Details":
-                display_task_details(st.session_state.user["email"])
+                display_task_details(st.session_state.user.email)
             elif st.session_state.page == "Subtask Details":
-                display_subtasks_details(st.session_state.user["email"])
+                display_subtasks_details(st.session_state.user.email)
             else:
-                display_user_dashboard(st.session_state.user["name"])
+                display_user_dashboard(st.session_state.user.name)
 
 if __name__ == "__main__":
-    run_app()
+    run_profiled(run_app)
+    # After the page is fully drawn, and outside the profiled run, since it waits for running jobs
+    poll_jobs()
@@ -0,0 +1,107 @@
+"""Compare fully decoded task dicts with lazily decoded Task models.
+
+Renders the fields a task list row needs (name, status, priority, assignees, due date) from a tenant's
+worth of task documents, once via plain dicts and once via ``src.models.Task`` over
+``RawBSONDocument``, and reports decode time and peak memory for each.
+
+    python benchmarks/bench_models.py --tasks 20000
+    python benchmarks/bench_models.py --uri mongodb://localhost:27017 --company My_Project
+    python benchmarks/bench_models.py --sqlite data/project_management.sqlite3 --company My_Project
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.models import Task, RAW_CODEC_OPTIONS  # noqa: E402
+
+
+def synthetic_task(i):
+    now = datetime(2024, 1, 1)
+    return {
+        "_id": bson.ObjectId(),
+        "name": f"Task {i}",
+        "description": "Lorem ipsum dolor sit amet. " * 80,
+        "assigned_to": [f"user{i % 97}@example.com", f"user{i % 13}@example.com"],
+        "task_admin": [f"admin{i % 7}@example.com"],
+        "status": ["pending", "in progress", "completed", "cancelled"][i % 4],
+        "priority": ["High", "Moderate", "Low"][i % 3],
+        "created_at": now + timedelta(minutes=i),
+        "due_date": now + timedelta(days=i % 60),
+        "depends_on": None,
+        "dependent_tasks": [],
+        "subtasks": [
+            {"name": f"Subtask {i}.{j}", "description": "Subtask details. " * 20, "assigned_to": [f"user{j}@example.com"],
+             "task_admin": [], "status": "pending", "priority": "Low", "created_at": now, "due_date": now}
+            for j in range(5)
+        ],
+        "status_updates": [
+            {"status": "in progress", "comment": "Worked on it. " * 10, "timestamp": now, "minutes_worked": 30, "updated_by": "Bench"}
+            for _ in range(20)
+        ],
+    }
+
+
+def load_documents(args):
+    """Return the tasks as encoded BSON bytes, the form pymongo receives them off the wire."""
+    if args.uri:
+        from pymongo import MongoClient
+        tasks = MongoClient(args.uri)[args.company].tasks.with_options(codec_options=RAW_CODEC_OPTIONS)
+        return [task.raw for task in tasks.find()]
+    if args.sqlite:
+        from src.sqlite_backend import SQLiteClient
+        tasks = SQLiteClient(args.sqlite)[args.company].tasks.with_options(codec_options=RAW_CODEC_OPTIONS)
+        return [task.raw for task in tasks.find()]
+    return [bson.encode(synthetic_task(i)) for i in range(args.tasks)]
+
+
+def render_rows(tasks, get):
+    return [(get(t, "name"), get(t, "status"), get(t, "priority"), get(t, "assigned_to"), get(t, "due_date")) for t in tasks]
+
+
+def decode_dicts(documents):
+    tasks = [bson.decode(document) for document in documents]
+    return tasks, render_rows(tasks, lambda task, key: task.get(key))
+
+
+def decode_models(documents):
+    tasks = [Task(RawBSONDocument(document, RAW_CODEC_OPTIONS)) for document in documents]
+    return tasks, render_rows(tasks, getattr)
+
+
+def measure(label, fn, documents):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(documents)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"{label:<8} {elapsed * 1000:10.1f} ms {peak / 1024 / 1024:10.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000, help="Number of synthetic tasks")
+    parser.add_argument("--uri", help="Benchmark a real tenant instead of synthetic data")
+    parser.add_argument("--sqlite", help="Benchmark a real tenant from a SQLite storage file instead")
+    parser.add_argument("--company", help="Tenant database name (with --uri or --sqlite)")
+    args = parser.parse_args()
+
+    documents = load_documents(args)
+    print(f"{len(documents)} tasks, {sum(len(d) for d in documents) / 1024 / 1024:.1f} MiB of BSON")
+    print(f"{'':<8} {'time':>13} {'peak mem':>14}")
+    measure("dicts", decode_dicts, documents)
+    measure("models", decode_models, documents)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Load test for the task API.
+
+Logs in once, then runs ``--concurrency`` client threads against a running ``python -m src.api`` for
+``--duration`` seconds, each on its own keep-alive connection, cycling through the given paths. With
+``--write-every N`` every Nth request from a client is a status update on a task from the first page,
+so reads and writes mix. Reports throughput, latency percentiles and responses by status code.
+
+    python -m src.api --workers 4 &
+    python benchmarks/load_test.py --email admin@example.com --password secret --concurrency 32 --duration 30
+    python benchmarks/load_test.py --email admin@example.com --password secret --path "/api/tasks?limit=50" --path /api/statistics
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def request(connection, method, path, token=None, body=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def connect(base_url):
+    url = urlsplit(base_url)
+    return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+
+
+def run_client(base_url, token, paths, task_ids, write_every, deadline, results, lock):
+    connection = connect(base_url)
+    latencies = []
+    statuses = Counter()
+    count = 0
+    while time.perf_counter() < deadline:
+        count += 1
+        if write_every and task_ids and count % write_every == 0:
+            method, path = "POST", f"/api/tasks/{random.choice(task_ids)}/status"
+            body = {"status": random.choice(["pending", "in progress"]), "comment": "load test", "minutes_worked": 0}
+        else:
+            method, path, body = "GET", paths[count % len(paths)], None
+        start = time.perf_counter()
+        try:
+            status, _ = request(connection, method, path, token, body)
+        except (OSError, http.client.HTTPException):
+            status = "connection error"
+            connection.close()
+            connection = connect(base_url)
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+    connection.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["statuses"].update(statuses)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent load against the task API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8600")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds to run")
+    parser.add_argument("--path", action="append", help="GET path to cycle through; may be repeated (default /api/tasks?limit=50)")
+    parser.add_argument("--write-every", type=int, default=0, help="Make every Nth request a status update (0: reads only)")
+    args = parser.parse_args()
+    paths = args.path or ["/api/tasks?limit=50"]
+
+    connection = connect(args.url)
+    status, data = request(connection, "POST", "/api/login", body={"email": args.email, "password": args.password})
+    if status != 200:
+        raise SystemExit(f"Login failed ({status}): {data.decode()}")
+    token = json.loads(data)["token"]
+    task_ids = []
+    if args.write_every:
+        status, data = request(connection, "GET", "/api/tasks?status=pending,in%20progress&limit=100", token)
+        task_ids = [task["_id"] for task in json.loads(data)["tasks"]] if status == 200 else []
+    connection.close()
+
+    results = {"latencies": [], "statuses": Counter()}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=run_client, args=(args.url, token, paths, task_ids, args.write_every, deadline, results, lock))
+        for _ in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(results["latencies"])
+    print(f"{len(latencies)} requests in {elapsed:.1f}s from {args.concurrency} clients: {len(latencies) / elapsed:.0f} req/s")
+    print("latency ms  p50 {:.1f}  p90 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+        *(1000 * percentile(latencies, fraction) for fraction in (0.5, 0.9, 0.99, 1.0))))
+    print("responses  " + "  ".join(f"{status}: {count}" for status, count in sorted(results["statuses"].items(), key=str)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,24 @@
 import streamlit as st
-from .database import get_users_collection
-from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, change_password, admin_user_exists, get_task_collection, load_lottie_file, update_task_priority_based_on_dependencies
+from .database import get_users_collection, causal_session
+from .helpers import create_new_user, create_task, update_task_status, login, change_password, admin_user_exists, my_work_query, split_my_work, build_task_query, find_tasks_matching, save_task_view, list_task_views, delete_task_view, get_data_version, TASK_STATUSES, TASK_PRIORITIES, load_lottie_file, flash, InvalidInput
 from datetime import datetime
-from pymongo import DESCENDING
 # from .authentication import display_password_change_section
-from .tasks import display_task
+from .tasks import display_task_list, display_attention_summary
+from .session_cache import session_cached, display_session_memory
+from .snapshots import snapshot_tasks
+from .profiler import display_profiler_page
+from .onboarding import display_bulk_user_import
+from .task_import import display_bulk_task_import
+from .offboarding import display_bulk_offboarding, offboard_users
+from .task_statistics import build_statistics_figures, build_snapshot_figures, TIME_UNITS
+from .analytics import read_manifest, ANALYTICS_INTERVAL_SECONDS
+from .jobs import submit_job, list_jobs, display_job
+from .portfolio import display_portfolio
+from .workload import display_workload, display_assignee_load
+from .pickers import user_picker, task_picker
 from streamlit_lottie import st_lottie
 import json
-import time
 from email_validator import validate_email, EmailNotValidError
-import plotly.express as px
-from collections import Counter
-import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
 import mplcursors
 
 def display_admin_dashboard(name):
@@ -26,7 +31,10 @@ def display_admin_dashboard(name):
         "Monitor Tasks": "🔍",
         "User Management": "👥",
         "Profile": "👤",
-        "Task Statistics": "📊"
+        "Task Statistics": "📊",
+        "Workload": "⚖️",
+        "Portfolio": "🗂️",
+        "Profiler": "⏱️"
     }
 
     state = st.session_state
@@ -52,70 +60,65 @@ def display_admin_dashboard(name):
         #     for idx, task in enumerate(tasks):
         #         if not (hide_completed_tasks and task["status"] == "completed"):
         #             display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=True, task_index=idx)
-        tabs = st.tabs(["Assigned Tasks", "Admin Tasks"])
+        display_attention_summary(st.session_state.user.email, st.session_state.company_name)
+
+        # Both tabs come from one query; the checkboxes below keep their values in session state,
+        # so their current values are known before they are drawn
+        hide_completed_assigned = st.session_state.get("admin_hide_completed_assigned", True)
+        hide_completed_admin = st.session_state.get("admin_hide_completed_admin", True)
+        email = st.session_state.user.email
+        # Kept for the session and patched with just the tasks changed since the last refresh
+        tasks = snapshot_tasks("my_work", my_work_query(email, hide_completed_assigned, hide_completed_admin), st.session_state.company_name)
+        assigned_tasks, admin_tasks = split_my_work(tasks, email, hide_completed_assigned, hide_completed_admin)
+
+        tabs = st.tabs([f"Assigned Tasks ({len(assigned_tasks)})", f"Admin Tasks ({len(admin_tasks)})"])
 
         with tabs[0]:
             st.header("Assigned Tasks")
-            hide_completed_tasks = st.checkbox("Hide completed tasks", key="admin_hide_completed_assigned", value=True)
+            st.checkbox("Hide completed tasks", key="admin_hide_completed_assigned", value=True)
             
-            # Fetch tasks where the user is assigned
-            tasks = list(get_task_collection(st.session_state.company_name).find({
-                "assigned_to": st.session_state.user["email"]
-            }))
+            tasks = assigned_tasks
             
             if len(tasks) == 0:
                 st.info("No tasks assigned to you.")
             else:
-                for idx, task in enumerate(tasks):
-                    if not (hide_completed_tasks and task["status"] == "completed"):
-                        display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=True, task_index=idx)
+                display_task_list(tasks, st.session_state.user.email, st.session_state.company_name, is_admin=True, allow_status_change=True, key="admin-assigned-tasks")
 
         with tabs[1]:
             st.header("Admin Tasks")
-            hide_completed_tasks = st.checkbox("Hide completed tasks", key="admin_hide_completed_admin", value=True)
+            st.checkbox("Hide completed tasks", key="admin_hide_completed_admin", value=True)
             
-            # Fetch tasks where the user is an admin
-            tasks = list(get_task_collection(st.session_state.company_name).find({
-                "task_admin": st.session_state.user["email"]
-            }))
+            tasks = admin_tasks
             
             if len(tasks) == 0:
                 st.info("No tasks where you are the admin.")
             else:
-                for idx, task in enumerate(tasks):
-                    if not (hide_completed_tasks and task["status"] == "completed"):
-                        display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=True, task_index=idx)
+                display_task_list(tasks, st.session_state.user.email, st.session_state.company_name, is_admin=True, allow_status_change=True, key="admin-admin-tasks")
 
 
     elif selected_option == "Create Task":
         st.subheader("Create New Task")
-
-        with st.form(key='create_task_form', clear_on_submit=True):
-            task_name = st.text_input("Task Name", "")
-            task_description = st.text_area("Task Description", "")
-            users = list(get_users_collection().find({"company_name": st.session_state.company_name}))
-            user_mapping = {f"{user['name']} ({user['email']})": user['email'] for user in users}
-            user_keys = list(user_mapping.keys())
-            selected_user_keys = st.multiselect("Assign To", user_keys, default=[f"{st.session_state.user['name']} ({st.session_state.user['email']})"])
-            assign_to = [user_mapping[key] for key in selected_user_keys]
-
-            task_admin_keys = st.multiselect("Task Admin (optional)", user_keys)
-            task_admin = [user_mapping[key] for key in task_admin_keys]
-
-            # Task priority field
-            task_priorities = ["High", "Moderate", "Low"]
-            task_priority = st.selectbox("Task Priority", task_priorities)
-
-            # Depends on field
-            tasks = list(get_task_collection(st.session_state.company_name).find({"status": {"$in": ["pending", "in progress"]}}))
-            task_mapping = {task['name']: task['_id'] for task in tasks}
-            task_keys = list(task_mapping.keys())
-            selected_task_key = st.selectbox("Depends On", ["None"] + task_keys)
-            depends_on = task_mapping.get(selected_task_key)
-            due_date = st.date_input("Due Date", key="due_date", min_value=datetime.now().date())
-            create_task_btn = st.form_submit_button("Create Task")
-
-            if create_task_btn:
+        display_bulk_task_import()
+
+        # Not an st.form: the typeahead pickers re-query as the user types
+        company_name = st.session_state.company_name
+        task_name = st.text_input("Task Name", "", key="create_task_name")
+        task_description = st.text_area("Task Description", "", key="create_task_description")
+        assign_to = user_picker("Assign To", company_name, key="create_task_assign_to", default=[st.session_state.user.email])
+        display_assignee_load(assign_to, company_name)
+        task_admin = user_picker("Task Admin (optional)", company_name, key="create_task_admin")
+
+        # Task priority field
+        task_priorities = ["High", "Moderate", "Low"]
+        task_priority = st.selectbox("Task Priority", task_priorities, key="create_task_priority")
+
+        # Depends on field
+        depends_on = task_picker("Depends On", company_name, key="create_task_depends_on")
+        due_date = st.date_input("Due Date", key="due_date", min_value=datetime.now().date())
+        create_task_btn = st.button("Create Task", key="create_task_btn")
+
+        if create_task_btn:
+            try:
                 create_task({
                     "name": task_name, 
                     "description": task_description, 
@@ -125,110 +128,121 @@ def display_admin_dashboard(name):
                     "depends_on": depends_on,  # Add this line
                     "due_date":datetime.combine(due_date, datetime.min.time()),  # Convert to datetime
                     "task_admin": task_admin
-                }, st.session_state.company_name)
-                update_task_priority_based_on_dependencies(st.session_state.company_name)  # Add this line
-                st.success("Task created successfully!")
-                time.sleep(2)
+                }, company_name)
+            except InvalidInput as e:
+                st.error(str(e))
+            else:
+                # In the background; one queued rescan covers any number of new tasks
+                submit_job("priority_rescan", company_name, st.session_state.user.email, coalesce=True)
+                flash("Task created successfully!")
+                for key in [key for key in st.session_state if key.startswith("create_task_") or key == "due_date"]:
+                    del st.session_state[key]
                 st.experimental_rerun()
 
     elif selected_option == "Monitor Tasks":
         st.subheader("Monitor Tasks")
-        monitor_options = [
-            "Monitor all tasks",
-            "Fetch Tasks by Status",
-            "Fetch Tasks by User",
-            "Search Tasks by Name",
-            "Fetch Tasks by Priority",  # Add this line
-        ]
-        selected_monitor_option = st.selectbox("Select an option", monitor_options)
-
-        if selected_monitor_option == "Monitor all tasks":
+        company_name = st.session_state.company_name
+        owner = st.session_state.user.email
+
+        users = list(get_users_collection().find({"company_name": company_name}, {"name": 1, "email": 1}))
+        user_mapping = {f"{user['name']} ({user['email']})": user['email'] for user in users}
+        email_to_key = {email: key for key, email in user_mapping.items()}
+
+        # Default filters match the old "Monitor all tasks" view with completed tasks hidden
+        filter_defaults = {
+            "monitor_statuses": ["pending", "in progress", "cancelled"],
+            "monitor_priorities": [],
+            "monitor_assignees": [],
+            "monitor_admins": [],
+            "monitor_due_from": None,
+            "monitor_due_to": None,
+            "monitor_overdue_only": False,
+            "monitor_text": "",
+            "monitor_newest_first": False,
+            "monitor_include_archived": False,
+        }
+        for key, value in filter_defaults.items():
+            if key not in st.session_state:
+                st.session_state[key] = value
+
+        saved_views = {view["name"]: view["filters"] for view in list_task_views(owner, company_name)}
+        selected_view = st.selectbox("Saved views", ["None"] + list(saved_views.keys()), key="monitor_saved_view")
+        if selected_view != st.session_state.get("monitor_loaded_view"):
+            # Load the view into the filter widgets before they are drawn
+            st.session_state.monitor_loaded_view = selected_view
+            if selected_view != "None":
+                filters = saved_views[selected_view]
+                st.session_state.monitor_statuses = filters.get("statuses") or []
+                st.session_state.monitor_priorities = filters.get("priorities") or []
+                st.session_state.monitor_assignees = [email_to_key[email] for email in filters.get("assignees") or [] if email in email_to_key]
+                st.session_state.monitor_admins = [email_to_key[email] for email in filters.get("admins") or [] if email in email_to_key]
+                st.session_state.monitor_due_from = filters["due_from"].date() if filters.get("due_from") else None
+                st.session_state.monitor_due_to = filters["due_to"].date() if filters.get("due_to") else None
+                st.session_state.monitor_overdue_only = filters.get("overdue_only", False)
+                st.session_state.monitor_text = filters.get("text") or ""
+                st.session_state.monitor_newest_first = filters.get("newest_first", False)
+                st.session_state.monitor_include_archived = filters.get("include_archived", False)
+
+        with st.expander("Filters", expanded=True):
             col1, col2 = st.columns(2)
             with col1:
-                hide_completed_tasks = st.checkbox("Hide completed tasks", value=True)
+                st.multiselect("Status", TASK_STATUSES, key="monitor_statuses")
+                st.multiselect("Assigned to", list(user_mapping.keys()), key="monitor_assignees")
+                st.date_input("Due from", key="monitor_due_from")
+                st.text_input("Task name contains", key="monitor_text")
             with col2:
-                with st.container():
-                    sort_by_days_passed = st.checkbox("Sort tasks by days passed", value=False, key="sort_by_days_passed")
-
-            tasks = get_task_collection(st.session_state.company_name).find().sort("created_at", DESCENDING if sort_by_days_passed else None)
-
-            if hide_completed_tasks:
-                tasks = [task for task in tasks if "status" in task and task["status"] != "completed"]
-
-            if not tasks:
-                st.info("No tasks found.")
-            else:
-                st.write("---")
-                for idx, task in enumerate(tasks):
-                    display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=False, task_index=idx)
-                    st.write("---") 
-
-        elif selected_monitor_option == "Fetch Tasks by Status":
-            status_mapping = {"Pending": "pending", "In Progress": "in progress", "Completed": "completed", "Cancelled":"cancelled"}
-            status_keys = list(status_mapping.keys())
-            selected_status_key = st.selectbox("Select Status", status_keys)
-            status = status_mapping[selected_status_key]
-
-            tasks = find_tasks_by_status(status, st.session_state.company_name)
-            
-            if not tasks:
-                st.info("No tasks found with the selected status.")
-            else:
-                st.write("---")
-                for idx, task in enumerate(tasks):
-                    display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=False, task_index=idx)
-                    st.write("---") 
-
-        elif selected_monitor_option == "Fetch Tasks by Priority":
-            priority_mapping = {"High": "High", "Moderate": "Moderate", "Low": "Low"}
-            priority_keys = list(priority_mapping.keys())
-            selected_priority_key = st.selectbox("Select Priority", priority_keys)
-            priority = priority_mapping[selected_priority_key]
-
-            task_count = get_task_collection(st.session_state.company_name).count_documents({"priority": priority})
-
-            if task_count == 0:
-                st.info("No tasks found with the selected priority.")
-            else:
-                st.write("---")
-                tasks = get_task_collection(st.session_state.company_name).find({"priority": priority})
-                for idx, task in enumerate(tasks):
-                    display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=False, task_index=idx)
-                    st.write("---") 
+                st.multiselect("Priority", TASK_PRIORITIES, key="monitor_priorities")
+                st.multiselect("Task admin", list(user_mapping.keys()), key="monitor_admins")
+                st.date_input("Due to", key="monitor_due_to")
+                st.checkbox("Overdue only", key="monitor_overdue_only")
+                st.checkbox("Newest first", key="monitor_newest_first")
+                st.checkbox("Include archived", key="monitor_include_archived")
+
+        state = st.session_state
+        filters = {
+            "statuses": state.monitor_statuses,
+            "priorities": state.monitor_priorities,
+            "assignees": [user_mapping[key] for key in state.monitor_assignees],
+            "admins": [user_mapping[key] for key in state.monitor_admins],
+            "due_from": datetime.combine(state.monitor_due_from, datetime.min.time()) if state.monitor_due_from else None,
+            "due_to": datetime.combine(state.monitor_due_to, datetime.max.time()) if state.monitor_due_to else None,
+            "overdue_only": state.monitor_overdue_only,
+            "text": state.monitor_text.strip(),
+        }
+        newest_first = state.monitor_newest_first
+        include_archived = state.monitor_include_archived
+
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            view_name = st.text_input("Save these filters as", key="monitor_view_name", label_visibility="collapsed", placeholder="View name")
+        with col2:
+            if st.button("Save view", key="monitor_save_view") and view_name.strip():
+                save_task_view(view_name.strip(), {**filters, "newest_first": newest_first, "include_archived": include_archived}, owner, company_name)
+                st.success(f"Saved view '{view_name.strip()}'.")
+        with col3:
+            if selected_view != "None" and st.button("Delete view", key="monitor_delete_view"):
+                delete_task_view(selected_view, owner, company_name)
+                del st.session_state["monitor_saved_view"]
+                st.session_state.monitor_loaded_view = None
+                st.rerun()
+
+        query = build_task_query(**filters)
+        if include_archived:
+            # The archive has no incremental feed; it is re-read whenever the data version moves
+            tasks = session_cached(
+                ("monitor", company_name, repr(query), newest_first, include_archived, get_data_version(company_name)),
+                lambda: find_tasks_matching(query, company_name, newest_first=newest_first, include_archived=include_archived),
+            )
+        else:
+            tasks = snapshot_tasks("monitor", query, company_name)
+            if newest_first:
+                tasks = tasks[::-1]
 
-        elif selected_monitor_option == "Fetch Tasks by User":
-            users = list(get_users_collection().find({"company_name": st.session_state.company_name}))
-            user_mapping = {f"{user['name']} ({user['email']})": user['email'] for user in users}
-            user_keys = list(user_mapping.keys())
-            selected_user_key = st.selectbox("Select User", user_keys)
-            user_email = user_mapping[selected_user_key]
-    
-            task_count = get_task_collection(st.session_state.company_name).count_documents({"assigned_to": user_email})
-    
-            if task_count == 0:
-                st.info("No tasks found for the selected user.")
-            else:
-                tasks = get_task_collection(st.session_state.company_name).find({"assigned_to": user_email})
-                st.write("---")
-                for idx, task in enumerate(tasks):
-                    display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=False, task_index=idx)
-                    st.write("---") 
-    
-        elif selected_monitor_option == "Search Tasks by Name":
-            st.subheader("Search Tasks by Name")
-            search_query = st.text_input("Enter task name to search")
-            search_btn = st.button("Search")
-            if search_btn and search_query:
-                tasks = get_task_collection(st.session_state.company_name).find({"name": {"$regex": search_query, "$options": "i"}})
-                task_count = get_task_collection(st.session_state.company_name).count_documents({"name": {"$regex": search_query, "$options": "i"}})
-    
-                if task_count == 0:
-                    st.info("No tasks found matching your search query.")
-                else:
-                    st.write("---")
-                    for idx, task in enumerate(tasks):
-                        display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=False, task_index=idx)
-                        st.write("---") 
+        if not tasks:
+            st.info("No tasks match the selected filters.")
+        else:
+            st.caption(f"{len(tasks)} task(s)")
+            display_task_list(tasks, st.session_state.user.email, st.session_state.company_name, is_admin=True, allow_status_change=False, key="monitor-tasks", separators=True)
     elif selected_option == "User Management":
         st.subheader("User Management")
     
@@ -237,6 +251,8 @@ def display_admin_dashboard(name):
         if create_user_btn:
             st.session_state.show_create_user_form = not st.session_state.show_create_user_form  # Flip the boolean flag
     
+        display_bulk_user_import()
+
         # Display user creation form only when the session state flag is True
         st.write("Click on this button if you want to allow a new user to use this tool")
         if st.session_state.show_create_user_form:
@@ -263,8 +279,7 @@ def display_admin_dashboard(name):
                     if new_password == confirm_password:
                         try:
                             create_new_user({"name": new_name, "email": new_email.lower(), "password": new_password, "role": role}, st.session_state.company_name)
-                            st.success("User created successfully!")
-                            time.sleep(2)
+                            flash("User created successfully!")
                             st.experimental_rerun()
                         except ValueError as e:
                             st.error(str(e))
@@ -282,6 +297,8 @@ def display_admin_dashboard(name):
     
         # User Management table
         users = list(get_users_collection().find({"company_name": st.session_state.company_name}))
+
+        display_bulk_offboarding(users)
     
         # Create column headers
         col1, col2, col3, col4 = st.columns(4)
@@ -296,7 +313,7 @@ def display_admin_dashboard(name):
         else:
             for idx, user in enumerate(users):
     
-                if user["email"] != st.session_state.user["email"]:  # Admin cannot delete themselves
+                if user["email"] != st.session_state.user.email:  # Admin cannot delete themselves
                     st.write("---") 
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
@@ -308,12 +325,12 @@ def display_admin_dashboard(name):
                     with col4:
                         # Split the name by spaces and pick the first name
                         first_name = user["name"].split(' ')[0]
-                        delete_user_btn = st.button(f"Delete {first_name}")
+                        delete_user_btn = st.button(f"Delete {first_name}", key=f"delete-user-{user['email']}")
                         if delete_user_btn:
-                            get_users_collection().delete_one({"email": user["email"]})
-                            st.success(f"User {user['name']} deleted successfully!")
-                            time.sleep(1)
-                            st.experimental_rerun()
+                            # Also removes the user from their tasks so no raw emails are left behind
+                            offboard_users([user["email"]], None, st.session_state.company_name)
+                            flash(f"User {user['name']} deleted successfully!")
+                            st.rerun()
     
     
     
@@ -328,10 +345,10 @@ def display_admin_dashboard(name):
             st.write("")
             st.write("")
             st.write("")
-            st.write(f"**Name:** {st.session_state.user['name']}")
-            st.write(f"**Email:** {st.session_state.user['email']}")
+            st.write(f"**Name:** {st.session_state.user.name}")
+            st.write(f"**Email:** {st.session_state.user.email}")
             st.write(f"**Project Name:** {st.session_state.company_name}")
-            st.write(f"**Role:** {st.session_state.user['role'].capitalize()}")
+            st.write(f"**Role:** {st.session_state.user.role.capitalize()}")
     
             # Display password change section
             change_password_btn = st.button("Change Password")
@@ -347,7 +364,7 @@ def display_admin_dashboard(name):
                     reset_password_btn = st.form_submit_button(label='Reset Password')  # Use form submit button here
     
                     if reset_password_btn:  # This will only be True when the form submit button is clicked
-                        success, message = change_password(st.session_state.user['email'], current_password, new_password, confirm_password)
+                        success, message = change_password(st.session_state.user.email, current_password, new_password, confirm_password)
                         if success:
                             st.success(message)
                             st.session_state['show_change_password_form'] = False  # Hide the form after successful submission
@@ -362,79 +379,58 @@ def display_admin_dashboard(name):
     elif selected_option == "Task Statistics":
         st.subheader("Task Statistics")
 
-        # Get all tasks
-        tasks = list(get_task_collection(st.session_state.company_name).find())
+        col1, col2 = st.columns(2)
+        with col1:
+            include_archived = st.checkbox("Include archived tasks", value=False, key="stats_include_archived")
+        with col2:
+            time_unit = st.radio("Time buckets", list(TIME_UNITS.keys()), horizontal=True, key="stats_time_unit")
+
+        manifest = read_manifest(st.session_state.company_name)
+        if manifest is not None:
+            # Figures are rebuilt only when a new snapshot lands
+            figures = build_snapshot_figures(st.session_state.company_name, include_archived, TIME_UNITS[time_unit], tuple(manifest["parts"]))
+            age_minutes = int((datetime.utcnow() - manifest["snapshot_at"]).total_seconds() // 60)
+            freshness = f"Data as of {manifest['snapshot_at']:%Y-%m-%d %H:%M} UTC ({age_minutes} min ago)."
+            if ANALYTICS_INTERVAL_SECONDS and age_minutes * 60 > 2 * ANALYTICS_INTERVAL_SECONDS:
+                st.warning(f"{freshness} The analytics snapshot is overdue; recent changes are missing.")
+            else:
+                st.caption(f"{freshness} Changes made since then appear with the next snapshot.")
+        else:
+            # Figures are rebuilt only when the tenant's tasks change
+            with causal_session() as session:
+                data_version = get_data_version(st.session_state.company_name, session)
+                figures = build_statistics_figures(st.session_state.company_name, include_archived, TIME_UNITS[time_unit], data_version, session)
+            st.caption("No analytics snapshot yet: figures are computed from the live database.")
+
+        if st.button("Refresh snapshot now", key="stats_refresh_snapshot"):
+            submit_job("analytics_snapshot", st.session_state.company_name, st.session_state.user.email, coalesce=True)
+        for job in list_jobs(st.session_state.company_name, st.session_state.user.email, kind="analytics_snapshot", limit=1):
+            display_job(job, st.session_state.company_name)
         
         # Create columns
         col1, col2 = st.columns(2)
-        
-        # Task Status Pie chart
-        task_status = [task['status'] for task in tasks]
+        col1.plotly_chart(figures["status"], config={'displayModeBar': False})
+        col2.plotly_chart(figures["priority"], config={'displayModeBar': False})
+        col1.plotly_chart(figures["users"], config={'displayModeBar': False})
+        col2.plotly_chart(figures["time"], config={'displayModeBar': False})
+        if "time_logged" in figures:
+            col1.plotly_chart(figures["time_logged"], config={'displayModeBar': False})
+            col2.plotly_chart(figures["overdue"], config={'displayModeBar': False})
 
-        # Only include statuses that exist
-        all_statuses = ['pending', 'in progress', 'completed', 'cancelled']
-        task_status = [status for status in task_status if status in all_statuses]
-
-        df_status = pd.DataFrame(task_status, columns=['status'])
-        fig = px.pie(df_status, names='status', title='Task Status Distribution', color = 'status',
-                    color_discrete_map={'pending':'#FA6C5C', 'in progress':'#6C5CFA', 'completed':'#36F57F', 'cancelled':'#A2AD9C'})
-        col1.plotly_chart(fig, config={'displayModeBar': False})
-
-        # Task Priority Histogram
-        task_priorities = [task['priority'] for task in tasks]
-        df_priority = pd.DataFrame(task_priorities, columns=['priority'])
-        df_priority['count'] = 1  # adding a count column
-        df_priority_grouped = df_priority.groupby('priority').count().reset_index()  # grouping by priority and counting
-
-        fig = px.bar(df_priority_grouped, x='priority', y='count', color='priority', title='Task Priority Distribution', 
-                    color_discrete_map={'High':'#F62817', 'Moderate':'#157DEC', 'Low':'#36F57F'})
-        col2.plotly_chart(fig, config={'displayModeBar': False})
-
-
-        
-        # User-specific Task Distribution
-        user_task_counts = Counter(user for task in tasks for user in task['assigned_to'])
-        users = list(user_task_counts.keys())
-        user_task_nums = list(user_task_counts.values())
-        df_user = pd.DataFrame(list(zip(users, user_task_nums)), columns=['user', 'task_count'])
-        fig = px.bar(df_user, x='user', y='task_count', color='user', title='User-specific Task Distribution')
-        col1.plotly_chart(fig, config={'displayModeBar': False})
-
-        # Task Distribution over Time Line Chart
-        task_creation_times = [task['created_at'] for task in tasks]
-        task_creation_times.sort()
-        task_counts_over_time = list(range(1, len(task_creation_times) + 1))
-        df_time = pd.DataFrame({
-            'task_creation_times': task_creation_times,
-            'task_counts_over_time': task_counts_over_time
-        })
-
-        fig = px.line(df_time, x='task_creation_times', y='task_counts_over_time', title='Task Distribution Over Time')
-        col2.plotly_chart(fig, config={'displayModeBar': False})
-        
-
-        # Create a directed graph
-        G = nx.DiGraph()
+        with st.expander("See Task dependency graph"):
+            st.pyplot(figures["dependencies"])
+            
+    elif selected_option == "Workload":
+        display_workload(st.session_state.company_name)
 
-        # Add a node for each task
-        for task in tasks:
-            G.add_node(task["name"])
+    elif selected_option == "Portfolio":
+        display_portfolio(st.session_state.user.email)
 
-        # Add an edge for each dependency
-        for task in tasks:
-            for dependent_task in task["dependent_tasks"]:
-                G.add_edge(dependent_task, task["name"])  # Add an edge from the dependent task to the task
+    elif selected_option == "Profiler":
+        display_profiler_page()
+        st.write("---")
+        display_session_memory()
 
-        with st.expander("See Task dependency graph"):
-            # Draw the graph
-            fig, ax = plt.subplots(figsize=(10, 5))  # Create a figure and an axes.
-            # Compute a layout position for the graph
-            pos = nx.spring_layout(G)
-            # Draw the graph
-            nx.draw(G, pos, with_labels=True, node_color='skyblue', node_size=1500, edge_cmap=plt.cm.Blues, font_size=10, ax=ax)
-            # Display the figure in Streamlit
-            st.pyplot(fig)
-            
     st.sidebar.write("")  # Add some space before the logout button
     st.sidebar.write("")  # Add more space (repeat as needed)
     st.sidebar.write("")
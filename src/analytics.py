@@ -0,0 +1,388 @@
+# analytics.py
+"""Columnar analytics snapshots.
+
+A periodic job copies each tenant's tasks, subtasks and status-history events into Parquet files
+under ``ANALYTICS_DIR/<tenant>/``, so Task Statistics runs pandas over local, memory-mapped files
+instead of aggregating the live collection. Every run adds one part per table holding only the tasks
+written since the previous run (found through the ``updated_at`` index, read from a secondary), plus
+tasks archived or deleted since then (from the tombstones). The watermark and the tasks are read
+through one causal session, so the tasks are never older than the watermark recorded with them. A
+task's newest part wins. ``manifest.json`` lists the live parts and records when the snapshot was
+taken and the watermark it reached. It is replaced atomically, so readers never see a half-written
+run. Once there are more than ANALYTICS_MAX_PARTS parts they are compacted into one, and a snapshot
+older than the tombstone retention is rebuilt from scratch.
+
+Runs in-process when ``ANALYTICS_INTERVAL_SECONDS`` is non-zero, or from the command line:
+
+    python -m src.analytics --company My_Project
+    python -m src.analytics --all --loop
+"""
+import argparse
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import streamlit as st
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .database import causal_session, secondary_read_preference
+from .helpers import get_task_collection, get_archive_collection, get_tombstone_collection, latest_task_write, TOMBSTONE_RETENTION_DAYS
+from .scanner import list_tenants
+from .jobs import job_kind
+from .snapshots import REFRESH_OVERLAP_SECONDS
+
+ANALYTICS_DIR = st.secrets.get('ANALYTICS_DIR', 'data/analytics')
+# 0 disables the in-process job; the CLI can still be run
+ANALYTICS_INTERVAL_SECONDS = int(st.secrets.get('ANALYTICS_INTERVAL_SECONDS', 15 * 60))
+ANALYTICS_MAX_PARTS = 24
+ANALYTICS_BATCH_SIZE = 5000
+
+_strings = pa.list_(pa.string())
+SCHEMAS = {
+    "tasks": pa.schema([
+        ("task_id", pa.string()), ("name", pa.string()), ("status", pa.string()), ("priority", pa.string()),
+        ("assigned_to", _strings), ("task_admin", _strings),
+        ("created_at", pa.timestamp("ms")), ("due_date", pa.timestamp("ms")), ("closed_at", pa.timestamp("ms")),
+        ("depends_on", pa.string()), ("dependent_tasks", _strings),
+        ("minutes_worked", pa.int64()), ("archived", pa.bool_()), ("part", pa.int32()),
+    ]),
+    "subtasks": pa.schema([
+        ("task_id", pa.string()), ("name", pa.string()), ("status", pa.string()), ("priority", pa.string()),
+        ("assigned_to", _strings), ("due_date", pa.timestamp("ms")), ("minutes_worked", pa.int64()), ("part", pa.int32()),
+    ]),
+    "events": pa.schema([
+        ("task_id", pa.string()), ("status", pa.string()), ("timestamp", pa.timestamp("ms")),
+        ("minutes_worked", pa.int64()), ("updated_by", pa.string()), ("part", pa.int32()),
+    ]),
+    # Tasks deleted since an earlier part
+    "removed": pa.schema([("task_id", pa.string()), ("part", pa.int32())]),
+}
+# Descriptions are never analysed
+SNAPSHOT_PROJECTION = {"description": 0, "subtasks.description": 0}
+
+
+def _tenant_dir(company_name, directory=ANALYTICS_DIR):
+    return os.path.join(directory, re.sub(r"[^\w.-]", "_", company_name))
+
+
+def _part_path(tenant_dir, table, part):
+    return os.path.join(tenant_dir, table, f"part-{part:06d}.parquet")
+
+
+def _minutes(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _strs(values):
+    return [str(value) for value in values or []]
+
+
+def _rows(task, archived, part):
+    task_id = str(task["_id"])
+    updates = task.get("status_updates") or []
+    task_row = {
+        "task_id": task_id, "name": task.get("name"), "status": task.get("status"), "priority": task.get("priority"),
+        "assigned_to": _strs(task.get("assigned_to")), "task_admin": _strs(task.get("task_admin")),
+        "created_at": task.get("created_at"), "due_date": task.get("due_date"), "closed_at": task.get("closed_at"),
+        "depends_on": str(task["depends_on"]) if task.get("depends_on") else None,
+        "dependent_tasks": _strs(task.get("dependent_tasks")),
+        "minutes_worked": sum(_minutes(update.get("minutes_worked")) for update in updates),
+        "archived": archived, "part": part,
+    }
+    subtask_rows = [{
+        "task_id": task_id, "name": subtask.get("name"), "status": subtask.get("status"), "priority": subtask.get("priority"),
+        "assigned_to": _strs(subtask.get("assigned_to")), "due_date": subtask.get("due_date"),
+        "minutes_worked": _minutes(subtask.get("minutes_worked")), "part": part,
+    } for subtask in task.get("subtasks") or []]
+    event_rows = [{
+        "task_id": task_id, "status": update.get("status"), "timestamp": update.get("timestamp"),
+        "minutes_worked": _minutes(update.get("minutes_worked")), "updated_by": update.get("updated_by"), "part": part,
+    } for update in updates]
+    return task_row, subtask_rows, event_rows
+
+
+class _PartWriter:
+    """Streams rows into one Parquet file per table for a part, ANALYTICS_BATCH_SIZE rows at a time."""
+
+    def __init__(self, tenant_dir, part):
+        self.tenant_dir = tenant_dir
+        self.part = part
+        self.buffers = {table: [] for table in SCHEMAS}
+        self.writers = {}
+        self.rows = 0
+
+    def add_task(self, task, archived):
+        task_row, subtask_rows, event_rows = _rows(task, archived, self.part)
+        self._add("tasks", [task_row])
+        self._add("subtasks", subtask_rows)
+        self._add("events", event_rows)
+        self.rows += 1
+
+    def add_removed(self, task_id):
+        self._add("removed", [{"task_id": str(task_id), "part": self.part}])
+        self.rows += 1
+
+    def _add(self, table, rows):
+        buffer = self.buffers[table]
+        buffer.extend(rows)
+        if len(buffer) >= ANALYTICS_BATCH_SIZE:
+            self._flush(table)
+
+    def _flush(self, table):
+        if not self.buffers[table]:
+            return
+        if table not in self.writers:
+            path = _part_path(self.tenant_dir, table, self.part)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.writers[table] = pq.ParquetWriter(path, SCHEMAS[table])
+        self.writers[table].write_table(pa.Table.from_pylist(self.buffers[table], schema=SCHEMAS[table]))
+        self.buffers[table] = []
+
+    def close(self):
+        for table in SCHEMAS:
+            self._flush(table)
+        for writer in self.writers.values():
+            writer.close()
+
+
+def read_manifest(company_name, directory=ANALYTICS_DIR):
+    """The tenant's snapshot manifest, or None if no snapshot has been taken."""
+    try:
+        with open(os.path.join(_tenant_dir(company_name, directory), "manifest.json")) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    for key in ("snapshot_at", "watermark"):
+        manifest[key] = datetime.fromisoformat(manifest[key]) if manifest.get(key) else None
+    return manifest
+
+
+def _write_manifest(tenant_dir, manifest):
+    path = os.path.join(tenant_dir, "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({key: value.isoformat() if isinstance(value, datetime) else value for key, value in manifest.items()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def _remove_parts(tenant_dir, parts):
+    for part in parts:
+        for table in SCHEMAS:
+            path = _part_path(tenant_dir, table, part)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@contextmanager
+def _tenant_lock(tenant_dir):
+    """Yields False if another process is already snapshotting this tenant."""
+    os.makedirs(tenant_dir, exist_ok=True)
+    with open(os.path.join(tenant_dir, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write_full(company_name, writer, session):
+    read_preference = secondary_read_preference()
+    for collection, archived in ((get_task_collection(company_name, read_preference), False),
+                                 (get_archive_collection(company_name, read_preference), True)):
+        for task in collection.find({}, SNAPSHOT_PROJECTION, batch_size=ANALYTICS_BATCH_SIZE, session=session):
+            writer.add_task(task, archived)
+
+
+def _write_changes(company_name, since, writer, session):
+    """Write tasks changed, archived or deleted since ``since``; returns the newest timestamp seen."""
+    read_preference = secondary_read_preference()
+    newest = []
+    tasks = get_task_collection(company_name, read_preference)
+    for task in tasks.find({"updated_at": {"$gte": since}}, SNAPSHOT_PROJECTION, batch_size=ANALYTICS_BATCH_SIZE, session=session):
+        writer.add_task(task, False)
+        newest.append(task["updated_at"])
+    archived_ids = []
+    for tombstone in get_tombstone_collection(company_name, read_preference).find({"deleted_at": {"$gte": since}}, session=session):
+        newest.append(tombstone["deleted_at"])
+        if tombstone.get("reason") == "archived":
+            archived_ids.append(tombstone["_id"])
+        else:
+            writer.add_removed(tombstone["_id"])
+    archive = get_archive_collection(company_name, read_preference)
+    for start in range(0, len(archived_ids), ANALYTICS_BATCH_SIZE):
+        for task in archive.find({"_id": {"$in": archived_ids[start:start + ANALYTICS_BATCH_SIZE]}}, SNAPSHOT_PROJECTION, session=session):
+            writer.add_task(task, True)
+    return max(newest, default=None)
+
+
+def _compact(tenant_dir, parts, part):
+    """Rewrite the merged contents of every part as the single part ``part``."""
+    frames = _merge(_read_parts(tenant_dir, parts))
+    for table, frame in frames.items():
+        if len(frame):
+            frame = frame.assign(part=part)
+            path = _part_path(tenant_dir, table, part)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(frame, schema=SCHEMAS[table], preserve_index=False), path)
+
+
+def snapshot_tenant(company_name, directory=ANALYTICS_DIR, rebuild=False):
+    """Bring one tenant's snapshot up to date (or copy everything again with ``rebuild``).
+
+    Returns the new manifest, or None if another run holds the tenant's lock.
+    """
+    tenant_dir = _tenant_dir(company_name, directory)
+    with _tenant_lock(tenant_dir) as acquired:
+        if not acquired:
+            print(f"Analytics snapshot for {company_name} is already running elsewhere")
+            return None
+        manifest = read_manifest(company_name, directory)
+        started = datetime.utcnow()
+        part = manifest["next_part"] if manifest else 0
+        old_parts = list(manifest["parts"]) if manifest else []
+
+        rebuild = rebuild or manifest is None or started - manifest["snapshot_at"] > timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        writer = _PartWriter(tenant_dir, part)
+        # One causal session: reads that land on another secondary still see at least what earlier ones saw
+        with causal_session() as session:
+            if rebuild:
+                # Read the watermark first: anything written during the copy is newer and comes with the next run
+                watermark = latest_task_write(company_name, session)
+                _write_full(company_name, writer, session)
+            else:
+                since = datetime.min if manifest["watermark"] is None else manifest["watermark"] - timedelta(seconds=REFRESH_OVERLAP_SECONDS)
+                newest = _write_changes(company_name, since, writer, session)
+                watermark = max(filter(None, [manifest["watermark"], newest]), default=None)
+        writer.close()
+
+        if rebuild:
+            parts, obsolete = [part], old_parts
+        elif writer.rows:
+            parts, obsolete = old_parts + [part], []
+        else:
+            parts, obsolete = old_parts, []
+        next_part = part + 1 if rebuild or writer.rows else part
+        if len(parts) > ANALYTICS_MAX_PARTS:
+            _compact(tenant_dir, parts, next_part)
+            parts, obsolete = [next_part], parts
+            next_part += 1
+
+        manifest = {"company_name": company_name, "snapshot_at": started, "watermark": watermark,
+                    "parts": parts, "next_part": next_part}
+        _write_manifest(tenant_dir, manifest)
+        _remove_parts(tenant_dir, obsolete)
+
+    print(f"Analytics snapshot for {company_name}: {'rebuilt' if rebuild else 'updated'} with {writer.rows} task(s), {len(parts)} part(s)")
+    return manifest
+
+
+def _read_parts(tenant_dir, parts):
+    tables = {}
+    for table, schema in SCHEMAS.items():
+        paths = [_part_path(tenant_dir, table, part) for part in parts]
+        pieces = [pq.read_table(path, memory_map=True) for path in paths if os.path.exists(path)]
+        tables[table] = (pa.concat_tables(pieces) if pieces else schema.empty_table()).to_pandas()
+    return tables
+
+
+def _merge(tables):
+    """Keep each task's newest part, drop deleted tasks, and the subtasks and events of that part only."""
+    tasks = tables["tasks"].sort_values("part", kind="stable").drop_duplicates("task_id", keep="last")
+    removed = tables["removed"]
+    if len(removed):
+        removed_in = tasks["task_id"].map(removed.groupby("task_id")["part"].max())
+        tasks = tasks[~(removed_in >= tasks["part"])]
+    latest = tasks.set_index("task_id")["part"]
+    subtasks, events = tables["subtasks"], tables["events"]
+    return {
+        "tasks": tasks.reset_index(drop=True),
+        "subtasks": subtasks[subtasks["part"] == subtasks["task_id"].map(latest)].reset_index(drop=True),
+        "events": events[events["part"] == events["task_id"].map(latest)].reset_index(drop=True),
+        "removed": removed.iloc[0:0],
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _load_frames(tenant_dir, parts):
+    return _merge(_read_parts(tenant_dir, parts))
+
+
+def load_snapshot(company_name, directory=ANALYTICS_DIR):
+    """``(frames, manifest)`` for the tenant's latest snapshot, or ``(None, None)`` if there is none.
+
+    ``frames`` maps "tasks", "subtasks" and "events" to DataFrames shared across sessions: treat them as read-only.
+    """
+    for _ in range(2):
+        manifest = read_manifest(company_name, directory)
+        if manifest is None:
+            return None, None
+        try:
+            return _load_frames(_tenant_dir(company_name, directory), tuple(manifest["parts"])), manifest
+        except FileNotFoundError:
+            # Compacted between reading the manifest and the parts
+            continue
+    return None, None
+
+
+@job_kind("analytics_snapshot")
+def snapshot_job(context, rebuild=False):
+    """Task Statistics' "Refresh snapshot" button."""
+    context.progress(0, message="Copying changed tasks")
+    manifest = snapshot_tenant(context.company_name, rebuild=rebuild)
+    if manifest is None:
+        return {"skipped": True}
+    return {"snapshot_at": manifest["snapshot_at"], "parts": len(manifest["parts"])}
+
+
+def _snapshot_forever(company_name, interval):
+    while True:
+        try:
+            snapshot_tenant(company_name)
+        except Exception as e:
+            print(f"Analytics snapshot for {company_name} failed: {e}")
+        time.sleep(interval)
+
+
+@st.cache_resource(show_spinner=False)
+def start_analytics_snapshots(company_name, interval=ANALYTICS_INTERVAL_SECONDS):
+    """Start the snapshot thread for a tenant if enabled; one thread per tenant per process."""
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=_snapshot_forever, args=(company_name, interval), name=f"analytics-{company_name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write per-tenant Parquet snapshots of tasks, subtasks and status history.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--company", action="append", help="Tenant (project) name; may be repeated")
+    target.add_argument("--all", action="store_true", help="Snapshot every tenant found in global_users")
+    parser.add_argument("--dir", default=ANALYTICS_DIR, help="Snapshot directory")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing snapshot and copy everything again")
+    parser.add_argument("--loop", action="store_true", help="Keep snapshotting every --interval seconds")
+    parser.add_argument("--interval", type=int, default=ANALYTICS_INTERVAL_SECONDS or 15 * 60)
+    args = parser.parse_args()
+
+    rebuild = args.rebuild
+    while True:
+        for company_name in (list_tenants() if args.all else args.company):
+            snapshot_tenant(company_name, args.dir, rebuild=rebuild)
+        if not args.loop:
+            break
+        rebuild = False
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
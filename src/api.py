@@ -0,0 +1,508 @@
+# api.py
+"""Headless JSON API over the helpers layer.
+
+Exposes login, task CRUD, status updates, subtasks and statistics over HTTP so integrations don't have
+to drive the Streamlit UI. Requests carry a bearer token from ``POST /api/login``; tokens are signed
+with API_TOKEN_SECRET and hold the user's email, project and role, so any worker can check them
+without a database round trip. Everything a token can reach is scoped to its project.
+
+The listening socket is opened once and shared by API_WORKERS spawned processes, each with its own
+MongoClient (and so its own connection pool) and a thread per connection:
+
+    python -m src.api --port 8600 --workers 4
+
+Endpoints:
+
+    POST   /api/login                                   {"email", "password"}
+    GET    /api/me
+    GET    /api/tasks                                   ?status=&priority=&assigned_to=&task_admin=&due_from=&due_to=
+                                                        &overdue=1&q=&include_archived=1&newest_first=1&skip=&limit=
+    POST   /api/tasks                                   admin only
+    GET    /api/tasks/<id>
+    PATCH  /api/tasks/<id>                              admin only
+    DELETE /api/tasks/<id>                              admin only
+    POST   /api/tasks/<id>/status                       {"status", "comment", "minutes_worked", "version"}
+    GET    /api/tasks/<id>/subtasks
+    POST   /api/tasks/<id>/subtasks
+    POST   /api/tasks/<id>/subtasks/<name>/status       {"status", "comment", "minutes_worked", "version"}
+    GET    /api/statistics                              admin only; ?include_archived=1
+
+As in the UI, the status and subtask endpoints are open to admins and to the task's assignees and task
+admins (for a subtask's status, the subtask's too); others get 403. Archived tasks answer 409.
+
+PATCH and the status endpoints accept an optional ``version``: the task's (or subtask's) ``version``
+as last read. The write then only applies if nobody has changed it since, and otherwise answers 409.
+
+Bodies go through the same checks as the forms (``check_task_fields`` and ``check_status_update`` in
+``helpers.py``): a malformed field answers 400, and reporting minutes worked needs a comment.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import re
+import socket
+import time
+from collections.abc import Mapping
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import streamlit as st
+from bson import ObjectId
+from bson.errors import InvalidId
+from .helpers import (login, get_task, create_task, update_task_fields, delete_task, update_task_status, add_subtask,
+                      update_subtask_status, WriteConflict, InvalidInput, TaskNotFound, status_author, build_task_query, find_tasks_matching,
+                      ensure_task_indexes)
+from .models import User, Task, Subtask, StatusUpdate
+from .task_statistics import task_counts
+
+API_TOKEN_SECRET = st.secrets.get('API_TOKEN_SECRET', '')
+API_TOKEN_TTL_SECONDS = int(st.secrets.get('API_TOKEN_TTL_SECONDS', 60 * 60))
+API_WORKERS = int(st.secrets.get('API_WORKERS', multiprocessing.cpu_count()))
+API_MAX_PAGE_SIZE = 500
+MAX_BODY_BYTES = 1024 * 1024
+# Not the name: dependent tasks refer to the tasks they depend on by name
+EDITABLE_TASK_FIELDS = ("description", "assigned_to", "task_admin", "priority", "due_date")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Tokens
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(body):
+    return _b64encode(hmac.new(API_TOKEN_SECRET.encode(), body.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user):
+    """A signed ``<payload>.<signature>`` token for ``user``, valid for API_TOKEN_TTL_SECONDS."""
+    expires_at = int(time.time()) + API_TOKEN_TTL_SECONDS
+    payload = {"sub": user.email, "name": user.name, "role": user.role, "company": user.company_name, "exp": expires_at}
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}", expires_at
+
+
+def read_token(token):
+    """The User a token was issued to, or None if it is malformed, forged or expired."""
+    body, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(body)):
+        return None
+    try:
+        payload = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    if payload.get("exp", 0) < time.time():
+        return None
+    return User(id=None, email=payload["sub"], name=payload["name"], role=payload["role"], company_name=payload["company"])
+
+
+# Serialization
+
+def to_json(value):
+    """Plain JSON-ready data from documents, models, ObjectIds and datetimes."""
+    if isinstance(value, (Task, Subtask, StatusUpdate)):
+        value = value.raw
+    if isinstance(value, Mapping):
+        return {key: to_json(item) for key, item in value.items() if key != "password"}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _object_id(text):
+    try:
+        return ObjectId(text)
+    except (InvalidId, TypeError):
+        raise ApiError(HTTPStatus.NOT_FOUND, "Task not found")
+
+
+def _require(body, *fields):
+    missing = [field for field in fields if body.get(field) in (None, "")]
+    if missing:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Missing field(s): {', '.join(missing)}")
+
+
+def _minutes_worked(body):
+    try:
+        return int(body.get("minutes_worked") or 0)
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "minutes_worked must be an integer")
+
+
+def _expected_version(body):
+    """The ``version`` the client last read, if it sent one; the write then only applies to that version."""
+    if body.get("version") is None:
+        return None
+    try:
+        return int(body["version"])
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "version must be an integer")
+
+
+def _conflict(what):
+    return ApiError(HTTPStatus.CONFLICT, f"{what} was changed since the given version; fetch it again and retry")
+
+
+def _require_admin(user):
+    if user.role != "admin":
+        raise ApiError(HTTPStatus.FORBIDDEN, "Admin role required")
+
+
+def _existing_task(task_id, user):
+    task = get_task(_object_id(task_id), user.company_name)
+    if task is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Task not found")
+    return task
+
+
+def _editable_task(task_id, user):
+    task = _existing_task(task_id, user)
+    if task.archived:
+        raise ApiError(HTTPStatus.CONFLICT, "Archived tasks can't be updated")
+    return task
+
+
+def _require_task_access(user, task, subtask=None):
+    """As in the UI: admins may update any task, other users only the tasks (or subtasks) they are assigned to or administer."""
+    people = task.assigned_to + task.task_admin
+    if subtask is not None:
+        people += subtask.assigned_to + subtask.task_admin
+    if user.role != "admin" and user.email not in people:
+        raise ApiError(HTTPStatus.FORBIDDEN, "Only the task's assignees and admins can update it")
+
+
+# Handlers: (user, params, body, *path groups) -> (status, payload)
+
+def handle_me(user, params, body):
+    return HTTPStatus.OK, {"email": user.email, "name": user.name, "role": user.role, "company_name": user.company_name}
+
+
+def handle_list_tasks(user, params, body):
+    def values(name):
+        return [value for item in params.get(name, []) for value in item.split(",") if value]
+
+    def flag(name):
+        return params.get(name, ["0"])[-1].lower() in ("1", "true", "yes")
+
+    def number(name, default):
+        try:
+            return int(params.get(name, [default])[-1])
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+    def day(name):
+        if name not in params:
+            return None
+        try:
+            return datetime.strptime(params[name][-1], '%Y-%m-%d')
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be YYYY-MM-DD")
+
+    limit = number("limit", 100)
+    if not 0 < limit <= API_MAX_PAGE_SIZE:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+    skip = max(0, number("skip", 0))
+    query = build_task_query(
+        statuses=values("status"), priorities=values("priority"), assignees=values("assigned_to"), admins=values("task_admin"),
+        due_from=day("due_from"), due_to=day("due_to"), overdue_only=flag("overdue"), text=params.get("q", [None])[-1],
+    )
+    tasks = find_tasks_matching(query, user.company_name, newest_first=flag("newest_first"),
+                                include_archived=flag("include_archived"), skip=skip, limit=limit)
+    return HTTPStatus.OK, {"tasks": to_json(tasks), "skip": skip, "limit": limit}
+
+
+def handle_create_task(user, params, body):
+    _require_admin(user)
+    _require(body, "name", "assigned_to")
+    if body.get("depends_on"):
+        _existing_task(body["depends_on"], user)
+    try:
+        task_id = create_task({
+            "name": body["name"],
+            "description": body.get("description", ""),
+            "assigned_to": body["assigned_to"],
+            "task_admin": body.get("task_admin") or [user.email],
+            "status": body.get("status", "pending"),
+            "priority": body.get("priority", "Low"),
+            "due_date": body.get("due_date"),
+            "depends_on": body.get("depends_on"),
+        }, user.company_name)
+    except InvalidInput as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    return HTTPStatus.CREATED, to_json(get_task(task_id, user.company_name))
+
+
+def handle_get_task(user, params, body, task_id):
+    return HTTPStatus.OK, to_json(_existing_task(task_id, user))
+
+
+def handle_update_task(user, params, body, task_id):
+    _require_admin(user)
+    changes = {field: body[field] for field in EDITABLE_TASK_FIELDS if field in body}
+    if not changes:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Nothing to update; editable fields: {', '.join(EDITABLE_TASK_FIELDS)}")
+    try:
+        found = update_task_fields(_object_id(task_id), changes, user.company_name, expected_version=_expected_version(body))
+    except WriteConflict:
+        raise _conflict("Task")
+    except InvalidInput as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    if not found:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Task not found")
+    return HTTPStatus.OK, to_json(get_task(task_id, user.company_name))
+
+
+def handle_delete_task(user, params, body, task_id):
+    _require_admin(user)
+    if not delete_task(_object_id(task_id), user.company_name):
+        raise ApiError(HTTPStatus.NOT_FOUND, "Task not found")
+    return HTTPStatus.OK, {"deleted": task_id}
+
+
+def handle_update_status(user, params, body, task_id):
+    _require(body, "status")
+    task = _editable_task(task_id, user)
+    _require_task_access(user, task)
+    try:
+        message = update_task_status(task.id, body["status"], user.company_name, body.get("comment"), _minutes_worked(body),
+                                     status_author(user.name, user.email), expected_version=_expected_version(body))
+    except WriteConflict:
+        raise _conflict("Task")
+    except InvalidInput as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    except TaskNotFound:
+        # Deleted or archived since it was read
+        raise ApiError(HTTPStatus.NOT_FOUND, "Task not found")
+    if message.startswith("Cannot"):
+        raise ApiError(HTTPStatus.CONFLICT, message)
+    return HTTPStatus.OK, to_json(get_task(task.id, user.company_name))
+
+
+def handle_list_subtasks(user, params, body, task_id):
+    return HTTPStatus.OK, {"subtasks": to_json(_existing_task(task_id, user).subtasks)}
+
+
+def handle_create_subtask(user, params, body, task_id):
+    _require(body, "name")
+    task = _editable_task(task_id, user)
+    _require_task_access(user, task)
+    try:
+        found = add_subtask(task.id, body, user.company_name)
+    except InvalidInput as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    if not found:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Task not found")
+    return HTTPStatus.CREATED, {"subtasks": to_json(get_task(task_id, user.company_name).subtasks)}
+
+
+def handle_update_subtask_status(user, params, body, task_id, subtask_name):
+    _require(body, "status")
+    task = _editable_task(task_id, user)
+    subtask_name = unquote(subtask_name)
+    subtask = next((subtask for subtask in task.subtasks if subtask.name == subtask_name), None)
+    if subtask is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Subtask not found")
+    _require_task_access(user, task, subtask)
+    try:
+        found = update_subtask_status(task.id, subtask_name, body["status"], user.company_name, body.get("comment"),
+                                      _minutes_worked(body), subtask_id=subtask.id, expected_version=_expected_version(body))
+    except WriteConflict:
+        raise _conflict("Subtask")
+    except InvalidInput as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    if not found:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Subtask not found")
+    return HTTPStatus.OK, {"subtasks": to_json(get_task(task_id, user.company_name).subtasks)}
+
+
+def handle_statistics(user, params, body):
+    _require_admin(user)
+    include_archived = params.get("include_archived", ["0"])[-1].lower() in ("1", "true", "yes")
+    counts = task_counts(user.company_name, include_archived)
+    span = counts["span"][0] if counts["span"] else {}
+    return HTTPStatus.OK, {
+        "status": {row["_id"]: row["count"] for row in counts["status"] if row["_id"] is not None},
+        "priority": {row["_id"]: row["count"] for row in counts["priority"] if row["_id"] is not None},
+        "assigned_to": {row["_id"]: row["count"] for row in counts["users"]},
+        "first_created_at": to_json(span.get("first")),
+        "last_created_at": to_json(span.get("last")),
+        "dependencies": to_json(counts["dependencies"]),
+    }
+
+
+ROUTES = [
+    ("GET", r"/api/me", handle_me),
+    ("GET", r"/api/tasks", handle_list_tasks),
+    ("POST", r"/api/tasks", handle_create_task),
+    ("GET", r"/api/tasks/([^/]+)", handle_get_task),
+    ("PATCH", r"/api/tasks/([^/]+)", handle_update_task),
+    ("DELETE", r"/api/tasks/([^/]+)", handle_delete_task),
+    ("POST", r"/api/tasks/([^/]+)/status", handle_update_status),
+    ("GET", r"/api/tasks/([^/]+)/subtasks", handle_list_subtasks),
+    ("POST", r"/api/tasks/([^/]+)/subtasks", handle_create_subtask),
+    ("POST", r"/api/tasks/([^/]+)/subtasks/([^/]+)/status", handle_update_subtask_status),
+    ("GET", r"/api/statistics", handle_statistics),
+]
+ROUTES = [(method, re.compile(pattern + r"/?"), handler) for method, pattern, handler in ROUTES]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so load tests and integrations reuse connections
+    protocol_version = "HTTP/1.1"
+    access_log = False
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        return body
+
+    def _authenticate(self):
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        user = read_token(token.strip()) if scheme.lower() == "bearer" else None
+        if user is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing, invalid or expired token")
+        return user
+
+    def _login(self, body):
+        _require(body, "email", "password")
+        user = login(body["email"].lower(), body["password"])
+        if user is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid email or password")
+        ensure_task_indexes(user.company_name)
+        token, expires_at = issue_token(user)
+        return HTTPStatus.OK, {"token": token, "expires_at": expires_at,
+                               "user": {"email": user.email, "name": user.name, "role": user.role, "company_name": user.company_name}}
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        try:
+            body = self._read_body()
+            if method == "POST" and url.path.rstrip("/") == "/api/login":
+                status, payload = self._login(body)
+            else:
+                status, payload = self._route(method, url, body)
+        except ApiError as e:
+            status, payload = e.status, {"error": e.message}
+        except Exception as e:
+            print(f"API error on {method} {url.path}: {e}")
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+        self._send(status, payload)
+
+    def _route(self, method, url, body):
+        allowed = False
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            user = self._authenticate()
+            return handler(user, parse_qs(url.query), body, *match.groups())
+        if allowed:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {url.path}")
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {url.path}")
+
+
+class ApiServer(ThreadingHTTPServer):
+    """Threaded server accepting on a listening socket opened by the parent process."""
+
+    daemon_threads = True
+
+    def __init__(self, listener):
+        super().__init__(listener.getsockname()[:2], ApiHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.server_name, self.server_port = listener.getsockname()[:2]
+
+
+def serve(listener, access_log=False):
+    """Worker entry point. Spawned workers import this module afresh, so each has its own MongoClient."""
+    ApiHandler.access_log = access_log
+    ApiServer(listener).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the task API as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Worker processes sharing the listening socket")
+    parser.add_argument("--access-log", action="store_true", help="Log every request to stderr")
+    args = parser.parse_args()
+    if not API_TOKEN_SECRET:
+        parser.error("set API_TOKEN_SECRET in .streamlit/secrets.toml before starting the API")
+
+    listener = socket.create_server((args.host, args.port), backlog=1024)
+    # spawn, not fork: this process already holds a MongoClient, which must not be shared across a fork
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=serve, args=(listener, args.access_log), name=f"api-worker-{i}", daemon=True)
+        for i in range(max(1, args.workers))
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"Task API listening on http://{args.host}:{args.port} with {len(workers)} worker(s)")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    main()
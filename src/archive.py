@@ -0,0 +1,117 @@
+# archive.py
+"""Archival of closed tasks.
+
+Moves tasks that were completed or cancelled more than N days ago from a tenant's ``tasks`` collection
+into its ``tasks_archive`` collection, in batches. Documents keep their ``_id``, so ``depends_on`` and
+``dependent_tasks`` references stay valid and ``get_task`` finds archived tasks by id.
+
+Runs in-process when ``ARCHIVE_AFTER_DAYS`` is set, or from the command line:
+
+    python -m src.archive --company My_Project --days 90
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+import streamlit as st
+from pymongo.errors import BulkWriteError
+from .helpers import get_task_collection, get_archive_collection, ensure_task_indexes, bump_data_version, record_tombstones, CLOSED_STATUSES
+from .scanner import list_tenants
+
+# 0 disables the in-process archiver; the CLI can still be run with --days
+ARCHIVE_AFTER_DAYS = int(st.secrets.get('ARCHIVE_AFTER_DAYS', 0))
+ARCHIVE_INTERVAL_SECONDS = int(st.secrets.get('ARCHIVE_INTERVAL_SECONDS', 24 * 60 * 60))
+ARCHIVE_BATCH_SIZE = 500
+
+
+def _closed_at(task):
+    # Tasks closed before closed_at existed: use the last status update, then the creation time
+    if task.get("closed_at"):
+        return task["closed_at"]
+    timestamps = [update["timestamp"] for update in task.get("status_updates", []) if update.get("timestamp")]
+    return max(timestamps) if timestamps else task["created_at"]
+
+
+def _move_batch(tasks, archive, batch, company_name):
+    try:
+        archive.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        # A previous run may have copied some of these before being interrupted
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+    ids = [task["_id"] for task in batch]
+    result = tasks.delete_many({"_id": {"$in": ids}, "status": {"$in": CLOSED_STATUSES}})
+    reopened = []
+    if result.deleted_count != len(ids):
+        # Reopened since we read it: it stays hot, so drop the archive copy
+        reopened = [task["_id"] for task in tasks.find({"_id": {"$in": ids}}, {"_id": 1})]
+        archive.delete_many({"_id": {"$in": reopened}})
+    # Incremental list refreshes drop tasks that left the hot collection
+    record_tombstones([task_id for task_id in ids if task_id not in reopened], company_name, "archived")
+    return len(ids) - len(reopened)
+
+
+def archive_closed_tasks(company_name, older_than_days, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move tasks closed more than ``older_than_days`` ago into the archive. Returns how many moved."""
+    ensure_task_indexes(company_name)
+    tasks = get_task_collection(company_name)
+    archive = get_archive_collection(company_name)
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    # closed_at is missing on tasks closed before it was recorded, so those are checked in Python
+    cursor = tasks.find(
+        {"status": {"$in": CLOSED_STATUSES}, "$or": [{"closed_at": {"$lt": cutoff}}, {"closed_at": None}]},
+        batch_size=batch_size,
+    )
+    moved = 0
+    batch = []
+    for task in cursor:
+        if _closed_at(task) >= cutoff:
+            continue
+        batch.append(task)
+        if len(batch) >= batch_size:
+            moved += _move_batch(tasks, archive, batch, company_name)
+            batch = []
+    if batch:
+        moved += _move_batch(tasks, archive, batch, company_name)
+    if moved:
+        bump_data_version(company_name)
+
+    print(f"Archived {moved} tasks for {company_name} closed before {cutoff:%Y-%m-%d}")
+    return moved
+
+
+def _archive_forever(company_name, older_than_days, interval):
+    while True:
+        try:
+            archive_closed_tasks(company_name, older_than_days)
+        except Exception as e:
+            print(f"Archiving for {company_name} failed: {e}")
+        time.sleep(interval)
+
+
+@st.cache_resource(show_spinner=False)
+def start_archiver(company_name, older_than_days=ARCHIVE_AFTER_DAYS, interval=ARCHIVE_INTERVAL_SECONDS):
+    """Start the archival thread for a tenant if archiving is enabled; one thread per tenant per process."""
+    if older_than_days <= 0:
+        return None
+    thread = threading.Thread(target=_archive_forever, args=(company_name, older_than_days, interval), name=f"archive-{company_name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move long-closed tasks into the per-tenant archive collection.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--company", action="append", help="Tenant (project) name; may be repeated")
+    target.add_argument("--all", action="store_true", help="Archive every tenant found in global_users")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS or 90, help="Archive tasks closed more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    for company_name in (list_tenants() if args.all else args.company):
+        archive_closed_tasks(company_name, args.days, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 import streamlit as st
 # from .database import db
-from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, change_password, admin_user_exists
+from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, authenticated_companies, change_password, admin_user_exists, flash
 # from .session_state import SessionState, get_state
 from datetime import datetime
 from pymongo import DESCENDING
-import time
 from email_validator import validate_email, EmailNotValidError
 
 
@@ -36,7 +35,8 @@ def display_login_page():
                 if user:
                     st.session_state['logged_in'] = True
                     st.session_state['user'] = user
-                    st.session_state['company_name'] = user['company_name']
+                    st.session_state['company_name'] = user.company_name
+                    st.session_state['authenticated_companies'] = authenticated_companies(user.email, password_login)
                     st.session_state['is_first_login'] = 'is_first_login' in st.session_state
                     st.rerun()
                 else:
@@ -84,8 +84,6 @@ def display_login_page():
                                 st.error("An admin account already exists for this company.")
                             else:
                                 create_new_user({"email": email_signup.lower(), "password": password_signup, "name": name_signup, "role": "admin"}, company_name, is_initial_admin=True)
-                                st.success("Signup was successful! You can now log in.")
+                                flash("Signup was successful! You can now log in.")
                                 st.session_state['signup_redirect'] = False  # Reset the signup redirect flag
-
-                            time.sleep(2)
-                            st.rerun()
+                                st.rerun()
@@ -1,19 +1,45 @@
 # database.py
 
 from pymongo import MongoClient
+from pymongo.read_preferences import SecondaryPreferred
 from bson import ObjectId
 import sys
 import streamlit as st
 
-MONGO_URI = st.secrets['MONGO_URI']
+# "mongo" (default) or "sqlite": an embedded database file, for small deployments, CI and benchmarks
+STORAGE_BACKEND = st.secrets.get('STORAGE_BACKEND', 'mongo')
+SQLITE_PATH = st.secrets.get('SQLITE_PATH', 'data/project_management.sqlite3')
 
-client = MongoClient(MONGO_URI)
+# Analytics and list views may read from secondaries that lag the primary by at most this many seconds
+# (MongoDB requires at least 90). After a session writes, its reads stay on the primary for
+# READ_YOUR_WRITES_SECONDS so people always see their own updates.
+MAX_STALENESS_SECONDS = int(st.secrets.get('MAX_STALENESS_SECONDS', 90))
+READ_YOUR_WRITES_SECONDS = int(st.secrets.get('READ_YOUR_WRITES_SECONDS', MAX_STALENESS_SECONDS))
 
-def get_db(company_name):
+if STORAGE_BACKEND == 'sqlite':
+    from .sqlite_backend import SQLiteClient
+    client = SQLiteClient(SQLITE_PATH)
+else:
+    client = MongoClient(st.secrets['MONGO_URI'])
+
+def get_db(company_name, read_preference=None):
     # client = MongoClient(config("MONGO_URI"))
     db = client[company_name]
+    if read_preference is not None:
+        db = db.with_options(read_preference=read_preference)
     return db
 
+def secondary_read_preference():
+    return SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)
+
+def causal_session():
+    """A causally consistent session, used as a context manager.
+
+    Reads through it see at least what its earlier reads saw, even when they land on a different
+    secondary, so a version or watermark read first is never newer than the data read after it.
+    """
+    return client.start_session(causal_consistency=True)
+
 def get_users_collection():  # Add this function
     # client = MongoClient(config("MONGO_URI"))
     db = client['global_users']  # Name of the global users collection
@@ -1,17 +1,180 @@
 # helpers.py
 import streamlit as st
-from .database import get_db, get_users_collection, ObjectId
+from .database import get_db, get_users_collection, ObjectId, secondary_read_preference, READ_YOUR_WRITES_SECONDS
+from .models import Task, User, RAW_CODEC_OPTIONS
+from .passwords import hash_password
+from .jobs import job_kind
+from pymongo import UpdateOne
 from datetime import datetime
 import bcrypt
 from streamlit_lottie import st_lottie
 import json
+import re
 import time
 
 
-def get_task_collection(company_name):
-    db = get_db(company_name)
+# Deleted and archived task ids are remembered this long for incremental refreshes (TTL index on MongoDB)
+TOMBSTONE_RETENTION_DAYS = int(st.secrets.get('TOMBSTONE_RETENTION_DAYS', 7))
+
+def get_task_collection(company_name, read_preference=None):
+    db = get_db(company_name, read_preference)
     return db.tasks
 
+def get_tombstone_collection(company_name, read_preference=None):
+    """Ids of tasks that left the ``tasks`` collection (deleted or archived), with ``deleted_at``."""
+    return get_db(company_name, read_preference).task_tombstones
+
+def touched(update):
+    """``update`` plus an ``updated_at`` stamp from the server clock; every task write goes through this."""
+    return {**update, "$currentDate": {"updated_at": True}}
+
+class WriteConflict(Exception):
+    """The task or subtask changed since the caller read it; ``current`` is the task as it is now (None if deleted)."""
+
+    def __init__(self, current):
+        super().__init__("The task was changed by someone else")
+        self.current = current
+
+class InvalidInput(ValueError):
+    """Task or status update data that can't be stored; the message says which field and why."""
+
+class TaskNotFound(LookupError):
+    """The task is not in the hot collection: it was deleted, or archived."""
+
+def _emails_field(value, field):
+    if not isinstance(value, list) or not all(isinstance(email, str) for email in value):
+        raise InvalidInput(f"{field} must be a list of emails")
+    return value
+
+def check_task_fields(fields, partial=False):
+    """Validated copy of the task or subtask fields in ``fields``, with ``due_date`` parsed.
+
+    Shared by the forms and the API. Fields not listed below pass through untouched; with ``partial``
+    (an edit) ``name`` isn't required.
+    """
+    checked = dict(fields)
+    if not partial or "name" in fields:
+        if not isinstance(fields.get("name"), str) or not fields["name"].strip():
+            raise InvalidInput("name is required and must be text")
+    if not isinstance(fields.get("description", ""), str):
+        raise InvalidInput("description must be text")
+    for field in ("assigned_to", "task_admin"):
+        if fields.get(field) is not None:
+            _emails_field(fields[field], field)
+    if fields.get("status") is not None and fields["status"] not in TASK_STATUSES:
+        raise InvalidInput(f"status must be one of: {', '.join(TASK_STATUSES)}")
+    if fields.get("priority") is not None and fields["priority"] not in TASK_PRIORITIES:
+        raise InvalidInput(f"priority must be one of: {', '.join(TASK_PRIORITIES)}")
+    due_date = fields.get("due_date")
+    if isinstance(due_date, str) and due_date:
+        try:
+            checked["due_date"] = datetime.strptime(due_date, '%Y-%m-%d')
+        except ValueError:
+            raise InvalidInput("due_date must be YYYY-MM-DD")
+    elif due_date not in (None, "") and not isinstance(due_date, datetime):
+        raise InvalidInput("due_date must be YYYY-MM-DD")
+    depends_on = fields.get("depends_on")
+    if depends_on and not ObjectId.is_valid(depends_on):
+        raise InvalidInput("depends_on must be a task id")
+    return checked
+
+def check_status_update(status, comment, minutes_worked):
+    """``(status, comment, minutes_worked)`` validated the same way for the forms and the API.
+
+    Reporting minutes worked needs a comment saying what they were spent on.
+    """
+    if status not in TASK_STATUSES:
+        raise InvalidInput(f"status must be one of: {', '.join(TASK_STATUSES)}")
+    if comment is not None and not isinstance(comment, str):
+        raise InvalidInput("comment must be text")
+    if isinstance(minutes_worked, bool) or not isinstance(minutes_worked, int) or minutes_worked < 0:
+        raise InvalidInput("minutes_worked must be a whole number of minutes, 0 or more")
+    comment = comment.strip() if comment else None
+    if minutes_worked and not comment:
+        raise InvalidInput("Please provide a reason for updating the minutes worked.")
+    return status, comment, minutes_worked
+
+def status_author(name, email):
+    """How status updates record who made them: "First (email)"."""
+    return f"{(name or '').split(' ')[0]} ({email})"
+
+def versioned(update, field="version"):
+    """``update`` plus a bump of the edit counter at ``field`` (e.g. ``subtasks.$.version``).
+
+    User edits compare-and-set on it. Writes to fields users don't edit (rollups, attention flags,
+    dependent task lists) leave it alone, so they never make an open form stale.
+    """
+    return {**update, "$inc": {**update.get("$inc", {}), field: 1}}
+
+def version_filter(version):
+    # Documents written before versions existed have none; they count as version 0
+    return version if version else {"$in": [0, None]}
+
+def record_tombstones(task_ids, company_name, reason):
+    """Note that ``task_ids`` left the tasks collection, so incremental refreshes drop them."""
+    updates = [UpdateOne({"_id": task_id}, {"$set": {"reason": reason}, "$currentDate": {"deleted_at": True}}, upsert=True)
+               for task_id in task_ids]
+    for start in range(0, len(updates), 500):
+        get_tombstone_collection(company_name).bulk_write(updates[start:start + 500], ordered=False)
+
+def mark_session_write():
+    """Remember that this session just wrote, so its next reads go to the primary."""
+    try:
+        st.session_state['last_write_at'] = time.time()
+    except Exception:
+        pass
+
+def bump_data_version(company_name):
+    """Advance the tenant's task data version; caches keyed on it (e.g. statistics charts) go stale."""
+    get_db(company_name).meta.update_one({"_id": "data_version"}, {"$inc": {"value": 1}}, upsert=True)
+
+def get_data_version(company_name, session=None):
+    """The tenant's data version. Read it through the same ``causal_session()`` as the data cached under it,
+    so the data is at least as new as the version."""
+    read_preference = None if session_wrote_recently() else secondary_read_preference()
+    version = get_db(company_name, read_preference).meta.find_one({"_id": "data_version"}, session=session)
+    return version["value"] if version else 0
+
+def record_task_write(company_name):
+    """Call after changing a tenant's tasks: keeps this session on the primary and bumps the data version."""
+    mark_session_write()
+    bump_data_version(company_name)
+
+def session_wrote_recently():
+    try:
+        last_write_at = st.session_state.get('last_write_at')
+    except Exception:
+        return False
+    return last_write_at is not None and time.time() - last_write_at < READ_YOUR_WRITES_SECONDS
+
+def get_read_task_collection(company_name):
+    """Task collection for analytics and list views.
+
+    Reads go to a secondary (bounded by MAX_STALENESS_SECONDS) unless this session wrote recently,
+    in which case they stay on the primary so the user sees their own updates.
+    """
+    if session_wrote_recently():
+        return get_task_collection(company_name)
+    return get_task_collection(company_name, secondary_read_preference())
+
+def get_archive_collection(company_name, read_preference=None):
+    """Completed and cancelled tasks moved out of the hot collection by the archival job."""
+    db = get_db(company_name, read_preference)
+    return db.tasks_archive
+
+def get_task(task_id, company_name):
+    """Fetch one task from the primary as a lazily decoded Task, falling back to the archive, or None.
+
+    Archived tasks are marked ``archived``, as in ``find_tasks_matching``, so callers can refuse edits to them.
+    """
+    task = get_task_collection(company_name).with_options(codec_options=RAW_CODEC_OPTIONS).find_one({"_id": ObjectId(task_id)})
+    if task is None:
+        task = next(get_archive_collection(company_name).with_options(codec_options=RAW_CODEC_OPTIONS).aggregate([
+            {"$match": {"_id": ObjectId(task_id)}},
+            {"$addFields": {"archived": True}},
+        ]), None)
+    return Task(task) if task is not None else None
+
 def find_user_by_email(email):  # Remove company_name parameter
     users = get_users_collection()  # Call the function without arguments
     return users.find_one({"email": email})
@@ -22,7 +185,7 @@ def login(email, password):
         user = users.find_one({"email": email})
         if user:
             if bcrypt.checkpw(password.encode(), user["password"]):
-                return user
+                return User.from_document(user)
             else:
                 print("Password check failed")
         else:
@@ -31,6 +194,12 @@ def login(email, password):
         print(f"An error occurred: {e}")
     return None
 
+def authenticated_companies(email, password):
+    """The projects whose account for ``email`` accepts ``password``: the ones the Portfolio page may show."""
+    users = get_users_collection().find({"email": email}, {"company_name": 1, "password": 1})
+    return sorted(user["company_name"] for user in users
+                  if user.get("company_name") and bcrypt.checkpw(password.encode(), user["password"]))
+
 def create_new_user(user_data, company_name, is_initial_admin=False):  
     users = get_users_collection()  
 
@@ -41,64 +210,314 @@ def create_new_user(user_data, company_name, is_initial_admin=False):
     if existing_user:
         raise ValueError("User with this email and company name already exists!")
 
-    hashed_password = bcrypt.hashpw(user_data['password'].encode(), bcrypt.gensalt())
+    hashed_password = hash_password(user_data['password'])
     user_data['password'] = hashed_password
     user_data['company_name'] = company_name
     user_data['is_first_login'] = False  
     user_data['is_initial_admin'] = is_initial_admin  
+    user_data['search_name'] = search_key(user_data.get('name'))
 
     users.insert_one(user_data)
 
 def create_task(task_data, company_name):
+    """Insert a task and return its id. Raises InvalidInput for malformed fields."""
+    task_data = check_task_fields(task_data)
+    _emails_field(task_data.get("assigned_to"), "assigned_to")
     tasks = get_task_collection(company_name)
 
     if "depends_on" in task_data and task_data["depends_on"]:
         tasks.update_one(
             {"_id": ObjectId(task_data["depends_on"])},
-            {"$push": {"dependent_tasks": task_data["name"]}}
+            touched({"$push": {"dependent_tasks": task_data["name"]}})
         )
 
-    due_date = task_data.get("due_date")
-    if due_date:
-        due_date = datetime.strptime(due_date, '%Y-%m-%d') if isinstance(due_date, str) else due_date
+    due_date = task_data.get("due_date") or None
 
     task = {
         "name": task_data["name"],
-        "description": task_data["description"],
+        "search_name": search_key(task_data["name"]),
+        "description": task_data.get("description", ""),
         "assigned_to": task_data["assigned_to"],
         "task_admin": task_data.get("task_admin"),
         "status": task_data.get("status", "pending"),
         "priority": task_data.get("priority", "Low"),
         "created_at": datetime.utcnow(),
+        # Restamped from the server clock by the rollup refresh below
+        "updated_at": datetime.utcnow(),
         "due_date": due_date,
-        "depends_on": task_data.get("depends_on"),
+        "depends_on": ObjectId(task_data["depends_on"]) if task_data.get("depends_on") else None,
         "dependent_tasks": [],
-        "subtasks": []
+        "subtasks": [],
+        "version": 0,
     }
-    tasks.insert_one(task)
+    task_id = tasks.insert_one(task).inserted_id
+    refresh_task_rollups([task_id], company_name)
+    record_task_write(company_name)
+    return task_id
 
-def find_tasks_by_status(status, company_name):
+def search_key(text):
+    """Normalized form of a name for case-insensitive prefix search (the ``search_name`` field)."""
+    return (text or "").strip().lower()
+
+def backfill_search_names(collection, query=None):
+    """Set ``search_name`` on documents created before it existed."""
+    query = {**(query or {}), "search_name": {"$exists": False}}
+    updates = [UpdateOne({"_id": doc["_id"]}, {"$set": {"search_name": search_key(doc.get("name"))}})
+               for doc in collection.find(query, {"name": 1})]
+    for start in range(0, len(updates), 500):
+        collection.bulk_write(updates[start:start + 500], ordered=False)
+
+@st.cache_resource(show_spinner=False)
+def ensure_user_indexes():
+    users = get_users_collection()
+    users.create_index([("company_name", 1), ("search_name", 1)])
+    users.create_index([("company_name", 1), ("email", 1)])
+    return True
+
+@st.cache_resource(show_spinner=False)
+def ensure_task_indexes(company_name):
+    """Create the indexes the task queries rely on; cached so it runs once per tenant per process."""
     tasks = get_task_collection(company_name)
-    task_list = list(tasks.find({"status": status}))
+    tasks.create_index([("assigned_to", 1), ("status", 1), ("created_at", 1)])
+    tasks.create_index([("task_admin", 1), ("status", 1), ("created_at", 1)])
+    tasks.create_index([("status", 1), ("due_date", 1)])
+    tasks.create_index([("subtasks.status", 1), ("subtasks.due_date", 1)])
+    tasks.create_index([("attention_scan", 1)], sparse=True)
+    tasks.create_index([("priority", 1), ("status", 1), ("created_at", 1)])
+    tasks.create_index([("created_at", 1), ("_id", 1)])
+    tasks.create_index([("status", 1), ("closed_at", 1)])
+    tasks.create_index([("depends_on", 1)])
+    tasks.create_index([("updated_at", 1)])
+    get_tombstone_collection(company_name).create_index([("deleted_at", 1)], expireAfterSeconds=TOMBSTONE_RETENTION_DAYS * 24 * 60 * 60)
+    archive = get_archive_collection(company_name)
+    archive.create_index([("created_at", 1), ("_id", 1)])
+    archive.create_index([("status", 1), ("due_date", 1)])
+    archive.create_index([("assigned_to", 1), ("status", 1), ("created_at", 1)])
+    get_db(company_name).saved_views.create_index([("owner", 1), ("name", 1)], unique=True)
+    # Typeahead pickers: open tasks and users by name prefix
+    tasks.create_index([("status", 1), ("search_name", 1)])
+    ensure_user_indexes()
+    backfill_search_names(tasks)
+    backfill_search_names(get_users_collection(), {"company_name": company_name})
+    return True
+
+# Most results a typeahead picker shows at once
+PICKER_LIMIT = 20
+
+def _prefix_range(prefix):
+    return {"$gte": prefix, "$lt": prefix + "\uffff"}
+
+def search_users(text, company_name, limit=PICKER_LIMIT):
+    """Up to ``limit`` users whose name or email starts with ``text`` (case-insensitive), by name.
+
+    Two index range scans, on (company_name, search_name) and (company_name, email), projected to name and email.
+    """
+    users = get_users_collection()
+    prefix = search_key(text)
+    projection = {"_id": 0, "name": 1, "email": 1}
+    if not prefix:
+        return list(users.find({"company_name": company_name}, projection).sort("search_name", 1).limit(limit))
+    by_name = users.find({"company_name": company_name, "search_name": _prefix_range(prefix)}, projection).sort("search_name", 1).limit(limit)
+    by_email = users.find({"company_name": company_name, "email": _prefix_range(prefix)}, projection).sort("email", 1).limit(limit)
+    found = {user["email"]: user for user in list(by_name) + list(by_email)}
+    return sorted(found.values(), key=lambda user: search_key(user.get("name")))[:limit]
+
+def search_open_tasks(text, company_name, limit=PICKER_LIMIT):
+    """Up to ``limit`` pending or in-progress tasks whose name starts with ``text``, as ``{_id, name}``."""
+    query = {"status": {"$in": OPEN_STATUSES}}
+    prefix = search_key(text)
+    if prefix:
+        query["search_name"] = _prefix_range(prefix)
+    return list(get_task_collection(company_name).find(query, {"name": 1}).sort("search_name", 1).limit(limit))
+
+# Fields the task list rows need; keeps descriptions, histories and subtasks off the wire
+TASK_SUMMARY_PROJECTION = {
+    "name": 1, "assigned_to": 1, "task_admin": 1, "status": 1,
+    "priority": 1, "created_at": 1, "due_date": 1, "attention": 1, "rollup": 1,
+}
+
+def my_work_query(email, hide_completed_assigned=True, hide_completed_admin=True):
+    """Query for a user's assigned and admin tasks; completed tasks are filtered on the server per tab."""
+    assigned_filter = {"assigned_to": email}
+    admin_filter = {"task_admin": email}
+    if hide_completed_assigned:
+        assigned_filter["status"] = {"$ne": "completed"}
+    if hide_completed_admin:
+        admin_filter["status"] = {"$ne": "completed"}
+    return {"$or": [assigned_filter, admin_filter]}
+
+def split_my_work(tasks, email, hide_completed_assigned=True, hide_completed_admin=True):
+    """Split rows matching ``my_work_query`` into ``(assigned_tasks, admin_tasks)``."""
+    assigned_tasks, admin_tasks = [], []
+    for task in tasks:
+        completed = task.status == "completed"
+        if email in task.assigned_to and not (hide_completed_assigned and completed):
+            assigned_tasks.append(task)
+        if email in task.task_admin and not (hide_completed_admin and completed):
+            admin_tasks.append(task)
+    return assigned_tasks, admin_tasks
+
+def find_my_work(email, company_name, hide_completed_assigned=True, hide_completed_admin=True):
+    """Fetch a user's assigned and admin tasks in one query.
+
+    Returns ``(assigned_tasks, admin_tasks)``; a task can appear in both when the user is assignee and admin.
+    """
+    tasks = get_read_task_collection(company_name).with_options(codec_options=RAW_CODEC_OPTIONS).find(
+        my_work_query(email, hide_completed_assigned, hide_completed_admin),
+        TASK_SUMMARY_PROJECTION,
+    ).sort([("created_at", 1), ("_id", 1)])
+    return split_my_work(map(Task, tasks), email, hide_completed_assigned, hide_completed_admin)
+
+def latest_task_write(company_name, session=None):
+    """The newest ``updated_at`` in the tenant's tasks (None if no task has one); one index lookup.
+
+    Read it through the same ``causal_session()`` as the rows it is a watermark for."""
+    latest = get_read_task_collection(company_name).find_one(
+        {"updated_at": {"$ne": None}}, {"updated_at": 1}, sort=[("updated_at", -1)], session=session)
+    return latest["updated_at"] if latest else None
+
+def find_task_changes(since, company_name, session=None):
+    """Task rows written at or after ``since`` and ids removed since then, for incremental refreshes.
+
+    Returns ``(changed_tasks, removed_ids)``. Both queries are range scans on the ``updated_at`` and
+    ``deleted_at`` indexes, so they cost in proportion to what changed, not to the tenant's size. The
+    rows carry ``updated_at`` and removals are tombstone documents with ``deleted_at``. Pass a
+    ``causal_session()`` so the tombstones are read from at least the point the rows were.
+    """
+    read_preference = None if session_wrote_recently() else secondary_read_preference()
+    tasks = get_task_collection(company_name, read_preference).with_options(codec_options=RAW_CODEC_OPTIONS)
+    changed = [Task(task) for task in tasks.find({"updated_at": {"$gte": since}}, {**TASK_SUMMARY_PROJECTION, "updated_at": 1}, session=session)]
+    removed = list(get_tombstone_collection(company_name, read_preference).find({"deleted_at": {"$gte": since}}, session=session))
+    return changed, removed
+
+TASK_STATUSES = ["pending", "in progress", "completed", "cancelled"]
+TASK_PRIORITIES = ["High", "Moderate", "Low"]
+OPEN_STATUSES = ["pending", "in progress"]
+CLOSED_STATUSES = ["completed", "cancelled"]
+
+def start_of_today():
+    # Due dates are stored as midnight UTC of the due day, so a task is overdue once that day has passed
+    return datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+def build_task_query(statuses=None, priorities=None, assignees=None, admins=None,
+                     due_from=None, due_to=None, overdue_only=False, text=None):
+    """Compile the Monitor Tasks filters into a single Mongo query. Empty filters are ignored."""
+    conditions = []
+    if statuses:
+        conditions.append({"status": {"$in": list(statuses)}})
+    if priorities:
+        conditions.append({"priority": {"$in": list(priorities)}})
+    if assignees:
+        conditions.append({"assigned_to": {"$in": list(assignees)}})
+    if admins:
+        conditions.append({"task_admin": {"$in": list(admins)}})
+    due_range = {}
+    if due_from:
+        due_range["$gte"] = due_from
+    if due_to:
+        due_range["$lte"] = due_to
+    if due_range:
+        conditions.append({"due_date": due_range})
+    if overdue_only:
+        conditions.append({"status": {"$in": OPEN_STATUSES}, "due_date": {"$lt": start_of_today()}})
+    if text:
+        conditions.append({"name": {"$regex": re.escape(text), "$options": "i"}})
+
+    if not conditions:
+        return {}
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+def find_tasks_matching(query, company_name, newest_first=False, include_archived=False, skip=0, limit=0, session=None):
+    """Run a task query with a stable sort (created_at, then _id to break ties).
+
+    With ``include_archived`` the archive collection is searched in the same round trip via $unionWith.
+    ``skip`` and ``limit`` page through the sorted results (0 means no limit).
+    """
+    direction = -1 if newest_first else 1
+    tasks = get_read_task_collection(company_name).with_options(codec_options=RAW_CODEC_OPTIONS)
+    if not include_archived:
+        cursor = tasks.find(query, TASK_SUMMARY_PROJECTION, session=session).sort([("created_at", direction), ("_id", direction)])
+        return [Task(task) for task in cursor.skip(skip).limit(limit)]
+    pipeline = [
+        {"$match": query},
+        {"$project": TASK_SUMMARY_PROJECTION},
+        {"$unionWith": {"coll": "tasks_archive", "pipeline": [
+            {"$match": query},
+            {"$project": TASK_SUMMARY_PROJECTION},
+            {"$addFields": {"archived": True}},
+        ]}},
+        {"$sort": {"created_at": direction, "_id": direction}},
+    ]
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
+    return [Task(task) for task in tasks.aggregate(pipeline, session=session)]
+
+def save_task_view(name, filters, owner, company_name):
+    """Store a named filter combination for a user, replacing any view with the same name."""
+    get_db(company_name).saved_views.replace_one(
+        {"owner": owner, "name": name},
+        {"owner": owner, "name": name, "filters": filters, "saved_at": datetime.utcnow()},
+        upsert=True,
+    )
+    mark_session_write()
+
+def list_task_views(owner, company_name):
+    return list(get_db(company_name).saved_views.find({"owner": owner}).sort("name", 1))
+
+def delete_task_view(name, owner, company_name):
+    get_db(company_name).saved_views.delete_one({"owner": owner, "name": name})
+    mark_session_write()
+
+def get_attention_summary(email, company_name):
+    """The user's overdue / due-soon summary written by the background scanner, or None."""
+    return get_db(company_name, secondary_read_preference()).attention.find_one({"_id": email})
+
+def find_tasks_by_status(status, company_name):
+    tasks = get_read_task_collection(company_name).with_options(codec_options=RAW_CODEC_OPTIONS)
+    task_list = [Task(task) for task in tasks.find({"status": status})]
     return task_list
 
-def update_task_status(task_id, new_status, company_name, comment, minutes_worked, updated_by):
+def update_task_status(task_id, new_status, company_name, comment, minutes_worked, updated_by, expected_version=None):
+    """Change a task's status, checking first that the task it depends on is completed.
+
+    The write only applies if the task is still at the version the decision was based on:
+    ``expected_version`` (the version the caller showed the user) or, without one, the version read
+    here, in which case a concurrent edit just means deciding again. Raises WriteConflict when the
+    caller's version is stale, InvalidInput for a malformed update (see ``check_status_update``) and
+    TaskNotFound when the task is gone. Returns a message, starting with "Cannot" if the task is blocked.
+    """
+    new_status, comment, minutes_worked = check_status_update(new_status, comment, minutes_worked)
     tasks = get_task_collection(company_name)
-    task = tasks.find_one({"_id": ObjectId(task_id)})
+    while True:
+        task = tasks.find_one({"_id": ObjectId(task_id)})
+        if task is None:
+            raise TaskNotFound(task_id)
+        version = task.get("version", 0)
+        if expected_version is not None and version != expected_version:
+            raise WriteConflict(get_task(task_id, company_name))
 
-    # Check if task is dependent on another task
-    if 'depends_on' in task and task['depends_on'] is not None:
-        dependent_task = tasks.find_one({"_id": ObjectId(task['depends_on'])})
-        if dependent_task['status'] != 'completed':
-            assigned_to_user = get_users_collection().find_one({"email": dependent_task['assigned_to']})
-            assigned_to_name = assigned_to_user['name'] if assigned_to_user else 'Unknown'
-            return f"Cannot complete task. Dependent task '{dependent_task['name']}' is not completed yet. It is assigned to {assigned_to_name}."
+        # Check if task is dependent on another task
+        if 'depends_on' in task and task['depends_on'] is not None:
+            dependent_task = tasks.find_one({"_id": ObjectId(task['depends_on'])})
+            if dependent_task is None:
+                dependent_task = get_archive_collection(company_name).find_one({"_id": ObjectId(task['depends_on'])})
+            if dependent_task is not None and dependent_task['status'] != 'completed':
+                assigned_to_user = get_users_collection().find_one({"email": dependent_task['assigned_to']})
+                assigned_to_name = assigned_to_user['name'] if assigned_to_user else 'Unknown'
+                return f"Cannot complete task. Dependent task '{dependent_task['name']}' is not completed yet. It is assigned to {assigned_to_name}."
 
-    if task:
-        tasks.update_one(
-            {"_id": ObjectId(task_id)},
-            {
-                "$set": {"status": new_status},
+        result = tasks.update_one(
+            {"_id": ObjectId(task_id), "version": version_filter(version)},
+            touched(versioned({
+                "$set": {
+                    "status": new_status,
+                    # When the task was closed; the archival job moves tasks closed long enough ago
+                    "closed_at": datetime.utcnow() if new_status in CLOSED_STATUSES else None,
+                },
                 "$push": {
                     "status_updates": {
                         "status": new_status,
@@ -108,11 +527,179 @@ def update_task_status(task_id, new_status, company_name, comment, minutes_worke
                         "updated_by": updated_by
                     }
                 },
-            },
+            })),
         )
+        if result.matched_count:
+            break
+        if expected_version is not None:
+            raise WriteConflict(get_task(task_id, company_name))
 
+    # Opening or closing a task changes what it blocks downstream
+    refresh_task_rollups([task["_id"]], company_name, include_dependents=True)
+    record_task_write(company_name)
     return "Task status updated successfully."
 
+# Longest depends_on chain followed when looking for blocking tasks
+ROLLUP_MAX_DEPTH = 20
+
+def find_dependent_task_ids(task_ids, company_name):
+    """Ids of every task that depends on ``task_ids``, directly or further down the chain."""
+    tasks = get_task_collection(company_name)
+    seen, frontier = set(), list(task_ids)
+    for _ in range(ROLLUP_MAX_DEPTH):
+        if not frontier:
+            break
+        frontier = [task["_id"] for task in tasks.find({"depends_on": {"$in": frontier}}, {"_id": 1}) if task["_id"] not in seen]
+        seen.update(frontier)
+    return list(seen)
+
+def refresh_task_rollups(task_ids, company_name, include_dependents=False, missing_only=False):
+    """Recompute the cached ``rollup`` of the given tasks (all tasks when ``task_ids`` is None).
+
+    A rollup holds subtask progress, minutes worked on the task and its subtasks, and the earliest
+    due date among the open tasks up its ``depends_on`` chain (found with $graphLookup). List views
+    read it with the task, so progress costs nothing per row.
+    """
+    task_ids = list(task_ids) if task_ids is not None else None
+    if include_dependents and task_ids:
+        task_ids += find_dependent_task_ids(task_ids, company_name)
+    if task_ids is not None and not task_ids:
+        return 0
+    match = {} if task_ids is None else {"_id": {"$in": task_ids}}
+    if missing_only:
+        match["rollup"] = {"$exists": False}
+
+    tasks = get_task_collection(company_name)
+    rows = tasks.aggregate([
+        {"$match": match},
+        {"$graphLookup": {
+            "from": "tasks",
+            "startWith": "$depends_on",
+            "connectFromField": "depends_on",
+            "connectToField": "_id",
+            "as": "upstream",
+            "maxDepth": ROLLUP_MAX_DEPTH,
+            # A closed task no longer blocks, and neither does anything only it was waiting on
+            "restrictSearchWithMatch": {"status": {"$in": OPEN_STATUSES}},
+        }},
+        {"$project": {
+            "subtask_statuses": "$subtasks.status",
+            "task_minutes": {"$sum": "$status_updates.minutes_worked"},
+            "subtask_minutes": {"$sum": "$subtasks.minutes_worked"},
+            "blocking_due_date": {"$min": "$upstream.due_date"},
+            "blocking_tasks": {"$size": "$upstream"},
+        }},
+    ])
+    updates = []
+    for row in rows:
+        statuses = [status for status in row.get("subtask_statuses") or [] if status != "cancelled"]
+        completed = statuses.count("completed")
+        updates.append(UpdateOne({"_id": row["_id"]}, touched({"$set": {"rollup": {
+            "subtasks_total": len(statuses),
+            "subtasks_completed": completed,
+            "progress": round(100 * completed / len(statuses)) if statuses else None,
+            "minutes_worked": (row.get("task_minutes") or 0) + (row.get("subtask_minutes") or 0),
+            "blocking_due_date": row.get("blocking_due_date"),
+            "blocking_tasks": row.get("blocking_tasks", 0),
+            "refreshed_at": datetime.utcnow(),
+        }}})))
+    for start in range(0, len(updates), 500):
+        tasks.bulk_write(updates[start:start + 500], ordered=False)
+    return len(updates)
+
+def update_task_fields(task_id, changes, company_name, expected_version=None):
+    """Set editable fields on a task. Returns True if the task exists.
+
+    With ``expected_version`` the change only applies to that version of the task; otherwise WriteConflict is raised.
+    Raises InvalidInput for malformed fields.
+    """
+    changes = check_task_fields(changes, partial=True)
+    if changes.get("due_date") == "":
+        changes["due_date"] = None
+    query = {"_id": ObjectId(task_id)}
+    if expected_version is not None:
+        query["version"] = version_filter(expected_version)
+    tasks = get_task_collection(company_name)
+    result = tasks.update_one(query, touched(versioned({"$set": changes})))
+    if not result.matched_count and expected_version is not None and tasks.find_one({"_id": ObjectId(task_id)}, {"_id": 1}):
+        raise WriteConflict(get_task(task_id, company_name))
+    if result.modified_count:
+        if "due_date" in changes:
+            refresh_task_rollups([ObjectId(task_id)], company_name, include_dependents=True)
+        record_task_write(company_name)
+    return result.matched_count == 1
+
+def delete_task(task_id, company_name):
+    """Delete a task (hot or archived) and drop its name from the dependents of the task it depended on."""
+    task_id = ObjectId(task_id)
+    for collection in (get_task_collection(company_name), get_archive_collection(company_name)):
+        task = collection.find_one_and_delete({"_id": task_id}, projection={"name": 1, "depends_on": 1})
+        if task is not None:
+            if task.get("depends_on"):
+                get_task_collection(company_name).update_one(
+                    {"_id": ObjectId(task["depends_on"])},
+                    touched({"$pull": {"dependent_tasks": task["name"]}})
+                )
+            record_tombstones([task_id], company_name, "deleted")
+            refresh_task_rollups(find_dependent_task_ids([task_id], company_name), company_name)
+            record_task_write(company_name)
+            return True
+    return False
+
+def add_subtask(task_id, subtask_data, company_name):
+    """Append a subtask to a task. Returns True if the task exists. Raises InvalidInput for malformed fields."""
+    subtask_data = check_task_fields(subtask_data)
+    due_date = subtask_data.get("due_date") or None
+    subtask = {
+        # Subtasks are addressed by id, with their own edit counter
+        "_id": ObjectId(),
+        "version": 0,
+        "name": subtask_data["name"],
+        "description": subtask_data.get("description", ""),
+        "assigned_to": subtask_data.get("assigned_to", []),
+        "task_admin": subtask_data.get("task_admin", []),
+        "status": subtask_data.get("status", "pending"),
+        "priority": subtask_data.get("priority", "Low"),
+        "created_at": datetime.utcnow(),
+        "due_date": due_date,
+        "parent_task_id": ObjectId(task_id),
+        "dependent_tasks": []
+    }
+    result = get_task_collection(company_name).update_one(
+        {"_id": ObjectId(task_id)},
+        touched({"$push": {"subtasks": subtask}})
+    )
+    if result.matched_count:
+        refresh_task_rollups([ObjectId(task_id)], company_name)
+        record_task_write(company_name)
+    return result.matched_count == 1
+
+def update_subtask_status(task_id, subtask_name, new_status, company_name, comment, minutes_worked, subtask_id=None, expected_version=None):
+    """Update a subtask's status, minutes and comment. Returns True if the subtask exists.
+
+    The subtask is found by ``subtask_id`` when given (older subtasks have none), else by name. With
+    ``expected_version`` the change only applies to that version of the subtask; otherwise WriteConflict is raised.
+    Raises InvalidInput for a malformed update (see ``check_status_update``).
+    """
+    new_status, comment, minutes_worked = check_status_update(new_status, comment, minutes_worked)
+    subtask = {"_id": subtask_id} if subtask_id is not None else {"name": subtask_name}
+    match = {**subtask, "version": version_filter(expected_version)} if expected_version is not None else subtask
+    tasks = get_task_collection(company_name)
+    result = tasks.update_one(
+        {"_id": ObjectId(task_id), "subtasks": {"$elemMatch": match}},
+        touched(versioned({"$set": {
+            "subtasks.$.status": new_status,
+            "subtasks.$.minutes_worked": minutes_worked,
+            "subtasks.$.comment": comment
+        }}, "subtasks.$.version"))
+    )
+    if not result.matched_count and expected_version is not None and tasks.find_one({"_id": ObjectId(task_id), "subtasks": {"$elemMatch": subtask}}, {"_id": 1}):
+        raise WriteConflict(get_task(task_id, company_name))
+    if result.matched_count:
+        refresh_task_rollups([ObjectId(task_id)], company_name)
+        record_task_write(company_name)
+    return result.matched_count == 1
+
 def update_password(email, new_password):
     user = find_user_by_email(email)
     if user:
@@ -166,25 +753,55 @@ def display_password_change_section(email, company_name):
             st.error(message)
 
 def update_task_priority_based_on_dependencies(company_name):
+    """Raise tasks with two or more dependents to High priority, noting why in their history."""
     tasks = get_task_collection(company_name)
-    
-    for task in tasks.find():
-        if len(task.get("dependent_tasks", [])) >= 2 and task["priority"] != "High":
-            tasks.update_one(
-                {"_id": task["_id"]},
-                {
-                    "$set": {"priority": "High"},
-                    "$push": {
-                        "status_updates": {
-                            "status": task["status"],
-                            "comment": "2+ tasks dependent on this task, raising priority",
-                            "timestamp": datetime.utcnow(),
-                            "minutes_worked": 0,
-                            "updated_by": "System"
-                        }
-                    },
+    updates = [
+        UpdateOne(
+            # Re-checked in the filter, so an edit made since the read is not overwritten
+            {"_id": task["_id"], "priority": {"$ne": "High"}},
+            touched(versioned({
+                "$set": {"priority": "High"},
+                "$push": {
+                    "status_updates": {
+                        "status": task["status"],
+                        "comment": "2+ tasks dependent on this task, raising priority",
+                        "timestamp": datetime.utcnow(),
+                        "minutes_worked": 0,
+                        "updated_by": "System"
+                    }
                 },
-            )
+            })),
+        )
+        for task in tasks.find({"dependent_tasks.1": {"$exists": True}, "priority": {"$ne": "High"}}, {"status": 1})
+    ]
+    modified = 0
+    for start in range(0, len(updates), 500):
+        modified += tasks.bulk_write(updates[start:start + 500], ordered=False).modified_count
+    # Tasks edited to High since the read were skipped by the filter; nothing to refresh then
+    if modified:
+        record_task_write(company_name)
+
+@job_kind("priority_rescan")
+def priority_rescan_job(context):
+    update_task_priority_based_on_dependencies(context.company_name)
+
+def flash(message, level="success"):
+    """Show ``message`` at the top of the next run, e.g. after a write followed by ``st.rerun()``."""
+    st.session_state["_flash"] = (level, message)
+
+def show_flash():
+    flashed = st.session_state.pop("_flash", None)
+    if flashed:
+        level, message = flashed
+        getattr(st, level)(message)
+
+def get_user_name_map(emails, company_name):
+    """Map emails to names with a single query; unknown emails map to themselves."""
+    emails = list(set(emails))
+    users = get_users_collection().find({"email": {"$in": emails}, "company_name": company_name}, {"email": 1, "name": 1})
+    email_to_name = {email: email for email in emails}
+    email_to_name.update({user['email']: user['name'] for user in users})
+    return email_to_name
 
 def get_user_names_from_emails(emails, company_name):
     users = get_users_collection().find({"email": {"$in": emails}, "company_name": company_name})
@@ -0,0 +1,357 @@
+# jobs.py
+"""Background jobs for long operations started from the UI.
+
+A view submits a job with ``submit_job`` and gets its id back straight away. The job is a document in the
+tenant's ``jobs`` collection, so it outlives the rerun, the session and the process. Each process runs
+a dispatcher thread per tenant. The dispatcher claims queued jobs while one of the process's JOB_WORKERS
+slots is free and runs them on a thread pool. Every poll it also stamps ``heartbeat_at`` on the jobs it
+is running, and passes on cancellation requests. Dispatchers are started by ``submit_job`` and, every
+JOB_DISCOVERY_SECONDS, by a process-wide thread (``start_job_runners``) for each tenant with queued or
+running jobs, so jobs left by a stopped process resume whether or not anyone from the tenant logs in.
+
+A job whose heartbeat is older than JOB_STALE_SECONDS belonged to a process that stopped. Any dispatcher
+claims it again and the job function runs once more with the job's last ``checkpoint``, so job kinds
+must be safe to re-run. After JOB_MAX_ATTEMPTS such attempts the job is marked failed. Cancellation is
+cooperative: the job sees it the next time it reports progress. Finished jobs expire after
+JOB_RETENTION_DAYS.
+
+A job kind is a function registered with ``@job_kind("name")``, called as ``function(context, **params)``.
+Its params and return value must be BSON-encodable. A process only claims the kinds it has registered.
+A job submitted with an ``upload_dir`` (see ``job_upload_dir``) owns that directory, which is removed
+when the job ends, whether it completes, fails or is cancelled before it ran.
+
+Views draw a job with ``display_job``. ``poll_jobs``, called after the page, then redraws only the
+progress bars of the active jobs every JOB_POLL_SECONDS, and reruns the page once one of them ends.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import streamlit as st
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from .database import get_db, get_users_collection
+
+JOB_WORKERS = int(st.secrets.get('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = 2
+JOB_STALE_SECONDS = 60
+JOB_MAX_ATTEMPTS = 3
+JOB_RETENTION_DAYS = 7
+# How often each process looks for tenants with jobs to run
+JOB_DISCOVERY_SECONDS = JOB_STALE_SECONDS
+# Uploads a job reads later, e.g. bulk imports
+JOBS_DIR = st.secrets.get('JOBS_DIR', 'data/jobs')
+# Progress is written at most this often, plus once at the end
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+ACTIVE_STATUSES = ["queued", "running"]
+# Identifies this process in the jobs it claims
+RUNNER_ID = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+JOB_KINDS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_kind(name):
+    """Register the decorated function as the job kind ``name``."""
+    def register(function):
+        JOB_KINDS[name] = function
+        return function
+    return register
+
+
+def get_job_collection(company_name):
+    return get_db(company_name).jobs
+
+
+@st.cache_resource(show_spinner=False)
+def ensure_job_indexes(company_name):
+    jobs = get_job_collection(company_name)
+    jobs.create_index([("status", 1), ("created_at", 1)])
+    jobs.create_index([("owner", 1), ("created_at", 1)])
+    jobs.create_index([("finished_at", 1)], expireAfterSeconds=JOB_RETENTION_DAYS * 24 * 60 * 60)
+    return True
+
+
+def job_upload_dir(company_name):
+    """A new directory under JOBS_DIR for files a job reads after the run that submitted it has ended."""
+    directory = os.path.join(JOBS_DIR, company_name, uuid.uuid4().hex)
+    os.makedirs(directory)
+    return directory
+
+
+def _remove_upload(job):
+    if job and job.get("upload_dir"):
+        shutil.rmtree(job["upload_dir"], ignore_errors=True)
+
+
+def job_seed(job_id, index):
+    """A stable ObjectId for item ``index`` of a job, so a re-run after a restart writes the same documents."""
+    return ObjectId(hashlib.sha1(str(job_id).encode()).digest()[:8] + index.to_bytes(4, "big"))
+
+
+class JobContext:
+    """What a running job sees: its params and checkpoint, plus progress reporting and cancellation."""
+
+    def __init__(self, job, company_name, cancel_event):
+        self.job_id = job["_id"]
+        self.company_name = company_name
+        self.attempt = job.get("attempts", 1)
+        self.checkpoint = job.get("checkpoint")
+        self._cancel = cancel_event
+        self._last_write = 0.0
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def progress(self, done, total=None, message=None, force=False):
+        """Record progress (throttled); raises JobCancelled if the job was cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        now = time.monotonic()
+        if force or now - self._last_write >= PROGRESS_INTERVAL_SECONDS or (total is not None and done >= total):
+            self._last_write = now
+            get_job_collection(self.company_name).update_one(
+                {"_id": self.job_id}, {"$set": {"progress": {"done": done, "total": total, "message": message}}})
+
+    def save_checkpoint(self, checkpoint):
+        """Persist where the job got to; a re-run after a restart starts from here."""
+        self.checkpoint = checkpoint
+        get_job_collection(self.company_name).update_one({"_id": self.job_id}, {"$set": {"checkpoint": checkpoint}})
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+
+@st.cache_resource(show_spinner=False)
+def _worker_pool():
+    """Process-wide: the pool that runs jobs and the slots that bound how many are claimed at once."""
+    return ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job"), threading.BoundedSemaphore(JOB_WORKERS)
+
+
+class _Dispatcher:
+    def __init__(self, company_name):
+        self.company_name = company_name
+        self.wake = threading.Event()
+        self.running = {}  # job _id -> cancel Event
+        self.lock = threading.Lock()
+
+    def _claim(self):
+        """Claim the oldest runnable job, or return None."""
+        jobs = get_job_collection(self.company_name)
+        kinds = list(JOB_KINDS)
+        while True:
+            now = datetime.utcnow()
+            candidate = jobs.find_one(
+                {"kind": {"$in": kinds}, "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=JOB_STALE_SECONDS)}},
+                ]},
+                sort=[("created_at", ASCENDING)],
+            )
+            if candidate is None:
+                return None
+            if candidate["status"] == "running" and (candidate.get("cancel_requested") or candidate.get("attempts", 0) >= JOB_MAX_ATTEMPTS):
+                # Orphaned, and not to be run again
+                ending = {"status": "cancelled"} if candidate.get("cancel_requested") else {
+                    "status": "failed", "error": f"Interrupted {JOB_MAX_ATTEMPTS} times"}
+                result = jobs.update_one({"_id": candidate["_id"], "heartbeat_at": candidate["heartbeat_at"]}, {"$set": {**ending, "finished_at": now}})
+                if result.modified_count:
+                    _remove_upload(candidate)
+                continue
+            # Only one dispatcher wins: the filter fails once another has changed the status or heartbeat
+            result = jobs.update_one(
+                {"_id": candidate["_id"], "status": candidate["status"], "heartbeat_at": candidate.get("heartbeat_at")},
+                {"$set": {"status": "running", "runner": RUNNER_ID, "heartbeat_at": now, "started_at": candidate.get("started_at") or now},
+                 "$inc": {"attempts": 1}},
+            )
+            if result.modified_count:
+                return jobs.find_one({"_id": candidate["_id"]})
+
+    def _heartbeat(self):
+        with self.lock:
+            running = dict(self.running)
+        if not running:
+            return
+        jobs = get_job_collection(self.company_name)
+        jobs.update_many({"_id": {"$in": list(running)}, "runner": RUNNER_ID}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+        for job in jobs.find({"_id": {"$in": list(running)}, "cancel_requested": True}, {"_id": 1}):
+            running[job["_id"]].set()
+
+    def _finish(self, job, ending):
+        # Only the runner that owns the job may finish it, and remove its upload
+        result = get_job_collection(self.company_name).update_one(
+            {"_id": job["_id"], "runner": RUNNER_ID}, {"$set": {**ending, "finished_at": datetime.utcnow()}})
+        if result.modified_count:
+            _remove_upload(job)
+
+    def _run(self, job, slots):
+        cancel = self.running[job["_id"]]
+        try:
+            result = JOB_KINDS[job["kind"]](JobContext(job, self.company_name, cancel), **job.get("params", {}))
+            self._finish(job, {"status": "completed", "result": result})
+        except JobCancelled:
+            self._finish(job, {"status": "cancelled"})
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job, {"status": "failed", "error": str(e)})
+        finally:
+            with self.lock:
+                del self.running[job["_id"]]
+            slots.release()
+            self.wake.set()
+
+    def run_forever(self):
+        executor, slots = _worker_pool()
+        while True:
+            try:
+                self._heartbeat()
+                while slots.acquire(blocking=False):
+                    job = self._claim()
+                    if job is None:
+                        slots.release()
+                        break
+                    with self.lock:
+                        self.running[job["_id"]] = threading.Event()
+                    executor.submit(self._run, job, slots)
+            except Exception as e:
+                print(f"Job dispatcher for {self.company_name} failed: {e}")
+            self.wake.wait(JOB_POLL_SECONDS)
+            self.wake.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def start_job_runner(company_name):
+    """Start the tenant's job dispatcher; one per tenant per process. Picks up jobs left by a previous process."""
+    ensure_job_indexes(company_name)
+    dispatcher = _Dispatcher(company_name)
+    threading.Thread(target=dispatcher.run_forever, name=f"jobs-{company_name}", daemon=True).start()
+    return dispatcher
+
+
+def _tenants_with_jobs():
+    for company_name in get_users_collection().distinct("company_name"):
+        if company_name and get_job_collection(company_name).find_one({"status": {"$in": ACTIVE_STATUSES}}, {"_id": 1}):
+            yield company_name
+
+
+def _discover_forever():
+    while True:
+        try:
+            for company_name in _tenants_with_jobs():
+                start_job_runner(company_name)
+        except Exception as e:
+            print(f"Job discovery failed: {e}")
+        time.sleep(JOB_DISCOVERY_SECONDS)
+
+
+@st.cache_resource(show_spinner=False)
+def start_job_runners():
+    """Start the process's discovery thread, which starts the dispatcher of every tenant with queued or running jobs."""
+    thread = threading.Thread(target=_discover_forever, name="jobs-discovery", daemon=True)
+    thread.start()
+    return thread
+
+
+def submit_job(kind, company_name, owner, params=None, coalesce=False, upload_dir=None):
+    """Queue a job and return its id. With ``coalesce``, an identical job still queued is reused instead.
+    ``upload_dir`` is removed when the job ends."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    params = params or {}
+    jobs = get_job_collection(company_name)
+    existing = jobs.find_one({"kind": kind, "params": params, "status": "queued"}, {"_id": 1}) if coalesce else None
+    if existing:
+        job_id = existing["_id"]
+    else:
+        job_id = jobs.insert_one({
+            "kind": kind, "params": params, "owner": owner, "status": "queued", "created_at": datetime.utcnow(),
+            "attempts": 0, "heartbeat_at": None, "progress": {"done": 0, "total": None, "message": None},
+            **({"upload_dir": upload_dir} if upload_dir else {}),
+        }).inserted_id
+    start_job_runner(company_name).wake.set()
+    return job_id
+
+
+def get_job(job_id, company_name):
+    return get_job_collection(company_name).find_one({"_id": job_id})
+
+
+def list_jobs(company_name, owner, kind=None, limit=5):
+    """The owner's most recent jobs, newest first."""
+    query = {"owner": owner, **({"kind": kind} if kind else {})}
+    return list(get_job_collection(company_name).find(query, {"params": 0}).sort("created_at", DESCENDING).limit(limit))
+
+
+def cancel_job(job_id, company_name):
+    """Cancel a queued job outright, or ask a running one to stop."""
+    jobs = get_job_collection(company_name)
+    result = jobs.update_one({"_id": job_id, "status": "queued"}, {"$set": {"status": "cancelled", "finished_at": datetime.utcnow()}})
+    if result.modified_count:
+        # It never ran, so no runner will remove its upload
+        _remove_upload(jobs.find_one({"_id": job_id}, {"upload_dir": 1}))
+    else:
+        jobs.update_one({"_id": job_id, "status": "running"}, {"$set": {"cancel_requested": True}})
+        start_job_runner(company_name).wake.set()
+
+
+def _job_label(job):
+    return f"{job['kind'].replace('_', ' ').capitalize()} ({job['created_at']:%Y-%m-%d %H:%M} UTC): {job['status']}"
+
+
+def _draw_progress(placeholder, job):
+    progress = job.get("progress") or {}
+    done, total = progress.get("done") or 0, progress.get("total")
+    label = _job_label(job) + (", cancelling" if job.get("cancel_requested") else "")
+    detail = f"{done}/{total}" if total else (str(done) if done else "")
+    message = " ".join(part for part in (detail, progress.get("message") or "") if part)
+    placeholder.progress(min(done / total, 1.0) if total else 0.0, text=f"{label} {message}".strip())
+
+
+def display_job(job, company_name, describe_result=None):
+    """Status, progress bar and cancel button for one job."""
+    label = _job_label(job)
+    if job["status"] in ACTIVE_STATUSES:
+        placeholder = st.empty()
+        _draw_progress(placeholder, job)
+        # poll_jobs redraws the bar in place; only this run's bars are kept
+        st.session_state.setdefault("_poll_jobs", []).append((job["_id"], company_name, placeholder))
+        if not job.get("cancel_requested") and st.button("Cancel", key=f"cancel-job-{job['_id']}"):
+            cancel_job(job["_id"], company_name)
+            st.rerun()
+    elif job["status"] == "completed":
+        st.success(f"{label}. {describe_result(job['result']) if describe_result else ''}".strip())
+    elif job["status"] == "failed":
+        st.error(f"{label}: {job.get('error')}")
+    else:
+        st.info(label)
+
+
+def reset_job_polling():
+    """Forget the progress bars of the previous run; called before the page draws."""
+    st.session_state["_poll_jobs"] = []
+
+
+def poll_jobs():
+    """Redraw this run's progress bars every JOB_POLL_SECONDS until a job ends, then rerun the page to show how
+    it ended. Called once the whole page has been drawn. Only the bars are redrawn, and a click interrupts the
+    wait and starts the next run straight away."""
+    watched = st.session_state.pop("_poll_jobs", None)
+    while watched:
+        time.sleep(JOB_POLL_SECONDS)
+        latest = {}
+        for company_name in {company_name for _, company_name, _ in watched}:
+            ids = [job_id for job_id, company, _ in watched if company == company_name]
+            latest.update((job["_id"], job) for job in get_job_collection(company_name).find({"_id": {"$in": ids}}, {"params": 0, "result": 0}))
+        for job_id, _, placeholder in watched:
+            job = latest.get(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                st.rerun()
+            _draw_progress(placeholder, job)
@@ -0,0 +1,149 @@
+# matching.py
+"""MongoDB query semantics evaluated in Python.
+
+``matches(document, query)`` decides whether a decoded document satisfies a filter, with the operators
+the app uses. The SQLite backend runs it on the rows its SQL prefilter returns, and the incremental
+task snapshots run it to re-check changed tasks, whichever storage backend is in use.
+"""
+import re
+from collections.abc import Mapping
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+
+def _resolve(value, parts):
+    """Every value reachable at a dotted path, descending into arrays the way MongoDB does."""
+    if not parts:
+        return [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, Mapping):
+        return _resolve(value[head], rest) if head in value else []
+    if isinstance(value, list):
+        if head.isdigit():
+            index = int(head)
+            return _resolve(value[index], rest) if index < len(value) else []
+        found = []
+        for item in value:
+            if isinstance(item, Mapping):
+                found.extend(_resolve(item, parts))
+        return found
+    return []
+
+
+def _bracket(value):
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, Mapping):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, (bytes, bytearray)):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _is_operator_dict(value):
+    return isinstance(value, Mapping) and value and all(str(key).startswith("$") for key in value)
+
+
+def _equals(candidates, target):
+    for value in candidates:
+        if value == target and _bracket(value) == _bracket(target):
+            return True
+        if isinstance(value, list) and not isinstance(target, list) and any(
+                item == target and _bracket(item) == _bracket(target) for item in value):
+            return True
+    return False
+
+
+def _expand(candidates):
+    expanded = []
+    for value in candidates:
+        expanded.append(value)
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+
+def _compare(candidates, operator, target):
+    checks = {"$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b, "$lt": lambda a, b: a < b, "$lte": lambda a, b: a <= b}
+    check = checks[operator]
+    return any(_bracket(value) == _bracket(target) and check(value, target) for value in _expand(candidates))
+
+
+def _match_condition(candidates, condition):
+    """Whether the values found at a path (empty when the path is missing) satisfy a condition."""
+    if not _is_operator_dict(condition):
+        if condition is None:
+            return not candidates or _equals(candidates, None)
+        return _equals(candidates, condition)
+
+    for operator, target in condition.items():
+        if operator == "$eq":
+            ok = _match_condition(candidates, target) if target is not None else (not candidates or _equals(candidates, None))
+        elif operator == "$ne":
+            ok = not _match_condition(candidates, {"$eq": target})
+        elif operator == "$in":
+            ok = any(_match_condition(candidates, {"$eq": item}) for item in target)
+        elif operator == "$nin":
+            ok = not any(_match_condition(candidates, {"$eq": item}) for item in target)
+        elif operator in ("$gt", "$gte", "$lt", "$lte"):
+            ok = _compare(candidates, operator, target)
+        elif operator == "$exists":
+            ok = bool(candidates) == bool(target)
+        elif operator == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            pattern = re.compile(target, flags) if isinstance(target, str) else target
+            ok = any(isinstance(value, str) and pattern.search(value) for value in _expand(candidates))
+        elif operator == "$options":
+            continue
+        elif operator == "$elemMatch":
+            ok = any(isinstance(value, list) and any(_element_matches(item, target) for item in value) for value in candidates)
+        elif operator == "$size":
+            ok = any(isinstance(value, list) and len(value) == target for value in candidates)
+        elif operator == "$all":
+            ok = all(_match_condition(candidates, {"$eq": item}) for item in target)
+        elif operator == "$not":
+            ok = not _match_condition(candidates, target)
+        else:
+            raise OperationFailure(f"unknown operator: {operator}", code=2)
+        if not ok:
+            return False
+    return True
+
+
+def _element_matches(element, condition):
+    if _is_operator_dict(condition) and not any(key in ("$or", "$and", "$nor") for key in condition):
+        return _match_condition([element], condition)
+    return isinstance(element, Mapping) and matches(element, condition)
+
+
+def matches(document, query):
+    """MongoDB query semantics for the operators the app uses."""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            ok = all(matches(document, sub) for sub in condition)
+        elif key == "$or":
+            ok = any(matches(document, sub) for sub in condition)
+        elif key == "$nor":
+            ok = not any(matches(document, sub) for sub in condition)
+        elif key == "":
+            # Array filter condition on the element itself
+            ok = _match_condition([document], condition)
+        else:
+            ok = _match_condition(_resolve(document, key.split(".")), condition)
+        if not ok:
+            return False
+    return True
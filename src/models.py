@@ -0,0 +1,179 @@
+# models.py
+"""Typed, slotted views over task and user documents.
+
+Task queries return ``RawBSONDocument``s, which the models below wrap. Reading any field makes pymongo
+decode all of the document's top-level fields at once, descriptions included, but embedded documents
+stay raw: subtasks and status updates are lists of raw sub-documents, decoded only when read, so a list
+view that shows names and statuses never decodes status histories or subtask fields.
+
+The models also support ``model["field"]`` and ``model.get("field")`` so code written against plain
+dicts keeps working.
+"""
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+class _field:
+    """Read-only attribute that looks up ``key`` in the wrapped document on access.
+
+    A missing key reads as ``default``, or as a fresh ``default_factory()`` for mutable defaults.
+    """
+
+    __slots__ = ("key", "default", "default_factory")
+
+    def __init__(self, key, default=None, default_factory=None):
+        self.key = key
+        self.default = default
+        self.default_factory = default_factory
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.key in instance._doc:
+            return instance._doc[self.key]
+        return self.default_factory() if self.default_factory is not None else self.default
+
+
+class _DocumentModel:
+    __slots__ = ("_doc",)
+
+    def __init__(self, doc):
+        self._doc = doc
+
+    def __getitem__(self, key):
+        return self._doc[key]
+
+    def __contains__(self, key):
+        return key in self._doc
+
+    def get(self, key, default=None):
+        return self._doc.get(key, default)
+
+    @property
+    def raw(self):
+        return self._doc
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._doc.get('name', self._doc.get('_id'))!r})"
+
+
+class StatusUpdate(_DocumentModel):
+    __slots__ = ()
+
+    status = _field("status")
+    comment = _field("comment")
+    timestamp = _field("timestamp")
+    minutes_worked = _field("minutes_worked", 0)
+    updated_by = _field("updated_by")
+
+
+class Subtask(_DocumentModel):
+    __slots__ = ()
+
+    # Subtasks created before ids and versions existed have no _id and count as version 0
+    id = _field("_id")
+    version = _field("version", 0)
+    name = _field("name")
+    description = _field("description", "")
+    assigned_to = _field("assigned_to", default_factory=list)
+    task_admin = _field("task_admin", default_factory=list)
+    status = _field("status")
+    priority = _field("priority")
+    created_at = _field("created_at")
+    due_date = _field("due_date")
+    minutes_worked = _field("minutes_worked", 0)
+    comment = _field("comment")
+    attention = _field("attention")
+    parent_task_id = _field("parent_task_id")
+
+
+class Task(_DocumentModel):
+    __slots__ = ()
+
+    id = _field("_id")
+    name = _field("name")
+    description = _field("description", "")
+    assigned_to = _field("assigned_to", default_factory=list)
+    status = _field("status")
+    priority = _field("priority")
+    created_at = _field("created_at")
+    due_date = _field("due_date")
+    depends_on = _field("depends_on")
+    dependent_tasks = _field("dependent_tasks", default_factory=list)
+    attention = _field("attention")
+    closed_at = _field("closed_at")
+    updated_at = _field("updated_at")
+    # Bumped by every user edit; edits compare-and-set on it (see helpers.versioned)
+    version = _field("version", 0)
+    archived = _field("archived", False)
+    # Cached subtask progress, minutes worked and blocking due date; see helpers.refresh_task_rollups
+    rollup = _field("rollup")
+
+    @property
+    def task_admin(self):
+        # Older tasks store None rather than an empty list
+        return self._doc.get("task_admin") or []
+
+    @property
+    def subtasks(self):
+        return [Subtask(subtask) for subtask in self._doc.get("subtasks", [])]
+
+    @property
+    def status_updates(self):
+        return [StatusUpdate(update) for update in self._doc.get("status_updates", [])]
+
+
+class User:
+    """The logged-in user as kept in session state: immutable, and without the password hash."""
+
+    __slots__ = ("id", "email", "name", "role", "company_name")
+
+    def __init__(self, id, email, name, role, company_name):
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "email", email)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "role", role)
+        object.__setattr__(self, "company_name", company_name)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            id=doc.get("_id"),
+            email=doc["email"],
+            name=doc.get("name", doc["email"]),
+            role=doc.get("role", "user"),
+            company_name=doc.get("company_name", ""),
+        )
+
+    def __getitem__(self, key):
+        if key == "_id":
+            key = "id"
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key == "_id" or key in self.__slots__
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        return isinstance(other, User) and (self.id, self.email, self.company_name) == (other.id, other.email, other.company_name)
+
+    def __hash__(self):
+        return hash((self.id, self.email, self.company_name))
+
+    def __repr__(self):
+        return f"User({self.email!r}, role={self.role!r}, company_name={self.company_name!r})"
@@ -0,0 +1,94 @@
+# offboarding.py
+"""Removing users from a project.
+
+``offboard_users`` deletes the users from the tenant's directory and rewrites every reference to them
+in the tenant's tasks, archived ones included (``assigned_to``, ``task_admin`` and the same fields on
+subtasks), handing their work to a reassignment target if one is given. The rewrites are a handful of
+``update_many`` calls sent as one bulk write per collection, run in a transaction together with the
+directory change when the deployment supports transactions (replica sets and sharded clusters).
+"""
+import streamlit as st
+from pymongo import UpdateMany
+from pymongo.errors import OperationFailure
+from .database import client, get_db, get_users_collection
+from .helpers import get_task_collection, get_archive_collection, record_task_write, touched, versioned, flash
+
+# Raised by standalone servers, which have no transactions
+ILLEGAL_OPERATION = 20
+
+
+def _reference_updates(emails, target):
+    """The task updates that move references from ``emails`` to ``target`` (or just drop them).
+
+    They bump the edit versions, so a form opened before the offboarding can't write the old references back.
+    """
+    updates = []
+    for field in ("assigned_to", "task_admin"):
+        if target:
+            updates.append(UpdateMany({field: {"$in": emails}}, touched(versioned({"$addToSet": {field: target}}))))
+            updates.append(UpdateMany(
+                {"subtasks": {"$elemMatch": {field: {"$in": emails}}}},
+                touched(versioned({"$addToSet": {f"subtasks.$[sub].{field}": target}}, "subtasks.$[sub].version")),
+                array_filters=[{f"sub.{field}": {"$in": emails}}],
+            ))
+        updates.append(UpdateMany({field: {"$in": emails}}, touched(versioned({"$pull": {field: {"$in": emails}}}))))
+        updates.append(UpdateMany(
+            {"subtasks": {"$elemMatch": {field: {"$in": emails}}}},
+            touched(versioned({"$pull": {f"subtasks.$[sub].{field}": {"$in": emails}}}, "subtasks.$[sub].version")),
+            array_filters=[{f"sub.{field}": {"$in": emails}}],
+        ))
+    return updates
+
+
+def _references(emails):
+    return {"$or": [{path: {"$in": emails}} for path in ("assigned_to", "task_admin", "subtasks.assigned_to", "subtasks.task_admin")]}
+
+
+def _offboard(emails, target, company_name, session=None):
+    tasks_updated = 0
+    for tasks in (get_task_collection(company_name), get_archive_collection(company_name)):
+        # The updates overlap, so their modified counts would count a task several times
+        tasks_updated += len(tasks.distinct("_id", _references(emails), session=session))
+        tasks.bulk_write(_reference_updates(emails, target), ordered=True, session=session)
+    db = get_db(company_name)
+    db.saved_views.delete_many({"owner": {"$in": emails}}, session=session)
+    db.attention.delete_many({"_id": {"$in": emails}}, session=session)
+    deleted = get_users_collection().delete_many({"email": {"$in": emails}, "company_name": company_name}, session=session)
+    return {"users_deleted": deleted.deleted_count, "tasks_updated": tasks_updated}
+
+
+def offboard_users(emails, target, company_name):
+    """Delete ``emails`` from the project and reassign their task references to ``target`` (None to drop them)."""
+    emails = [email for email in emails if email != target]
+    if not emails:
+        return {"users_deleted": 0, "tasks_updated": 0}
+    try:
+        with client.start_session() as session:
+            summary = session.with_transaction(lambda s: _offboard(emails, target, company_name, session=s))
+    except OperationFailure as e:
+        if e.code != ILLEGAL_OPERATION:
+            raise
+        # Standalone server: same writes without a transaction, directory change last
+        summary = _offboard(emails, target, company_name)
+    record_task_write(company_name)
+    return summary
+
+
+def display_bulk_offboarding(users):
+    with st.expander("Offboard users", expanded=False):
+        st.write("Remove several users at once. Their tasks and subtasks are handed to the selected user, or left without them.")
+        user_mapping = {f"{user['name']} ({user['email']})": user['email'] for user in users if user['email'] != st.session_state.user.email}
+        selected_keys = st.multiselect("Users to remove", list(user_mapping.keys()), key="offboard_users")
+        selected_emails = [user_mapping[key] for key in selected_keys]
+
+        target_mapping = {f"{user['name']} ({user['email']})": user['email'] for user in users if user['email'] not in selected_emails}
+        target_key = st.selectbox("Reassign their work to", ["Nobody (remove from tasks)"] + list(target_mapping.keys()), key="offboard_target")
+        target = target_mapping.get(target_key)
+
+        if st.button("Offboard selected users", key="offboard_submit", disabled=not selected_emails):
+            summary = offboard_users(selected_emails, target, st.session_state.company_name)
+            flash(f"Removed {summary['users_deleted']} user(s) and updated {summary['tasks_updated']} task(s).")
+            # Redraw the user table without them, and start the next selection empty
+            for key in ("offboard_users", "offboard_target"):
+                st.session_state.pop(key, None)
+            st.rerun()
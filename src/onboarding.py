@@ -0,0 +1,149 @@
+# onboarding.py
+"""Bulk user import from CSV or JSONL.
+
+Rows are validated first, checked against existing ``(email, company_name)`` users with one query,
+hashed in a process pool (bcrypt is CPU bound and would otherwise run row by row on the script
+thread) and inserted with one unordered ``insert_many``. Every row gets a result in the report,
+including malformed JSONL lines and fields of the wrong type, which are rejected on their own.
+"""
+import csv
+import io
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import streamlit as st
+from email_validator import validate_email, EmailNotValidError
+from pymongo.errors import BulkWriteError
+from .database import get_users_collection
+from .passwords import hash_password
+from .helpers import search_key
+
+HASH_WORKERS = int(st.secrets.get('PASSWORD_HASH_WORKERS', max(1, multiprocessing.cpu_count() - 1)))
+ROLES = ["admin", "user"]
+
+
+@st.cache_resource(show_spinner=False)
+def _hash_pool():
+    # spawn, not fork: the app process runs background threads and holds a MongoClient
+    return ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+def read_user_rows(uploaded_file):
+    """Yield dicts from a CSV (with a header row) or JSONL upload.
+
+    A JSONL line that doesn't parse is yielded as its ``JSONDecodeError``, so it is reported as its row.
+    """
+    text = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig")
+    if uploaded_file.name.lower().endswith((".jsonl", ".json")):
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield e
+    else:
+        yield from csv.DictReader(text)
+
+
+def _text(row, column, strip=True):
+    value = row.get(column)
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"{column} must be text.")
+    return str(value).strip() if strip else str(value)
+
+
+def _parse_row(row, default_password):
+    """``(name, email, role, password)`` from one row; raises ValueError for a malformed row."""
+    if isinstance(row, json.JSONDecodeError):
+        raise ValueError(f"Invalid JSON: {row.msg} (column {row.colno}).")
+    if not isinstance(row, dict):
+        raise ValueError("Each line must be a JSON object.")
+    return (_text(row, "name"), _text(row, "email").lower(), (_text(row, "role") or "user").lower(),
+            _text(row, "password", strip=False) or default_password)
+
+
+def bulk_create_users(rows, company_name, default_password):
+    """Create users from ``rows`` (dicts with name, email, optional role and password).
+
+    Returns one report entry per row: ``{"row", "email", "status", "error"}``.
+    """
+    report = []
+    valid = []
+    seen = set()
+    for row_number, row in enumerate(rows, start=1):
+        entry = {"row": row_number, "email": None, "status": "error", "error": None}
+        report.append(entry)
+        try:
+            name, email, role, password = _parse_row(row, default_password)
+        except ValueError as e:
+            entry["error"] = str(e)
+            continue
+        entry["email"] = email
+        try:
+            # Deliverability checks do a DNS lookup per row; syntax is enough for a bulk import
+            validate_email(email, check_deliverability=False)
+        except EmailNotValidError as e:
+            entry["error"] = f"Invalid email: {e}"
+            continue
+        if not name:
+            entry["error"] = "Name is required."
+        elif role not in ROLES:
+            entry["error"] = f"Role must be one of {', '.join(ROLES)}."
+        elif not password:
+            entry["error"] = "No password given and no default password set."
+        elif email in seen:
+            entry["error"] = "Duplicate email in file."
+        if entry["error"]:
+            continue
+        seen.add(email)
+        valid.append((entry, {"name": name, "email": email, "role": role, "password": password}))
+
+    users = get_users_collection()
+    existing = {user["email"] for user in users.find({"company_name": company_name, "email": {"$in": list(seen)}}, {"email": 1})}
+    to_insert = []
+    for entry, user_data in valid:
+        if user_data["email"] in existing:
+            entry["error"] = "User with this email and company name already exists!"
+        else:
+            to_insert.append((entry, user_data))
+
+    hashes = _hash_pool().map(hash_password, [user_data["password"] for _, user_data in to_insert], chunksize=8)
+    documents = []
+    for (entry, user_data), hashed_password in zip(to_insert, hashes):
+        documents.append({
+            **user_data,
+            "password": hashed_password,
+            "company_name": company_name,
+            "is_first_login": False,
+            "is_initial_admin": False,
+            "search_name": search_key(user_data.get("name")),
+        })
+        entry["status"] = "created"
+
+    if documents:
+        try:
+            users.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                entry = to_insert[error["index"]][0]
+                entry["status"] = "error"
+                entry["error"] = error["errmsg"]
+    return report
+
+
+def display_bulk_user_import():
+    with st.expander("Bulk import users from CSV / JSONL", expanded=False):
+        st.write("Columns: `name`, `email`, optional `role` (admin/user) and `password`. Rows without a password get the default below.")
+        uploaded_file = st.file_uploader("Users file", type=["csv", "jsonl", "json"], key="bulk_users_file")
+        default_password = st.text_input("Default password", type="password", value="hannahchair@123", key="bulk_users_default_password")
+        if st.button("Import users", key="bulk_users_import") and uploaded_file is not None:
+            with st.spinner("Importing users..."):
+                report = bulk_create_users(read_user_rows(uploaded_file), st.session_state.company_name, default_password)
+            created = sum(1 for entry in report if entry["status"] == "created")
+            if created:
+                st.success(f"Created {created} of {len(report)} users.")
+            if created < len(report):
+                st.warning(f"{len(report) - created} rows were not imported.")
+            st.dataframe(report, hide_index=True, use_container_width=True)
@@ -0,0 +1,7 @@
+# passwords.py
+# Kept free of Streamlit and database imports so process-pool workers can import it cheaply.
+import bcrypt
+
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
@@ -0,0 +1,43 @@
+# pickers.py
+"""Typeahead pickers for users and tasks.
+
+Instead of loading every user or open task into a multiselect, each picker shows a search box and
+offers the current selection plus the first PICKER_LIMIT prefix matches, fetched through the
+``search_name`` indexes with a name-only projection. Typing narrows the list on the next rerun, so the
+pickers must live outside ``st.form``.
+"""
+import streamlit as st
+from .helpers import get_task_collection, get_user_name_map, search_users, search_open_tasks, PICKER_LIMIT
+
+
+def user_picker(label, company_name, key, default=()):
+    """Multiselect of user emails with a search box; returns the selected emails."""
+    text = st.text_input(f"Search {label.lower()}", key=f"{key}-search", placeholder="Start typing a name or email")
+    selected = st.session_state.get(key, list(default))
+    results = search_users(text, company_name)
+    names = {user["email"]: user["name"] for user in results}
+    missing = [email for email in selected if email not in names]
+    if missing:
+        names.update(get_user_name_map(missing, company_name))
+    options = list(dict.fromkeys([*selected, *names]))
+    if len(results) == PICKER_LIMIT:
+        st.caption(f"Showing the first {PICKER_LIMIT} matches; type more to narrow the list.")
+    # Passing a default alongside a key that already holds a value makes Streamlit warn
+    kwargs = {} if key in st.session_state else {"default": list(default)}
+    return st.multiselect(label, options, format_func=lambda email: f"{names.get(email, email)} ({email})", key=key, **kwargs)
+
+
+def task_picker(label, company_name, key):
+    """Selectbox of open tasks with a search box; returns the chosen task's ``_id`` or None."""
+    text = st.text_input(f"Search {label.lower()}", key=f"{key}-search", placeholder="Start typing a task name")
+    selected = st.session_state.get(key)
+    names = {task["_id"]: task["name"] for task in search_open_tasks(text, company_name)}
+    if selected is not None and selected not in names:
+        task = get_task_collection(company_name).find_one({"_id": selected}, {"name": 1})
+        if task:
+            names[selected] = task["name"]
+        else:
+            # Deleted since it was picked
+            st.session_state[key] = None
+    options = [None] + list(names)
+    return st.selectbox(label, options, format_func=lambda task_id: "None" if task_id is None else names[task_id], key=key)
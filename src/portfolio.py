@@ -0,0 +1,108 @@
+# portfolio.py
+"""Cross-project portfolio view.
+
+Lists the projects (tenants) the logged-in email belongs to in ``global_users.users`` and that
+accepted the password at login, and gathers each project's task counts concurrently on a bounded
+thread pool shared by all sessions. A project's counts come from one ``$facet`` aggregate with a
+single ``maxTimeMS``, and the page waits at most PORTFOLIO_TENANT_TIMEOUT_SECONDS per round of
+workers, so a slow or unreachable project shows up as "timed out" instead of holding up the page.
+Work the page stopped waiting for doesn't hold on to the pool: a project still queued at that point
+is skipped, and a running aggregate is cut off by the server at the same deadline.
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import streamlit as st
+from .database import get_users_collection, secondary_read_preference
+from .helpers import get_task_collection, start_of_today, OPEN_STATUSES, TASK_STATUSES
+
+PORTFOLIO_WORKERS = int(st.secrets.get('PORTFOLIO_WORKERS', 8))
+PORTFOLIO_TENANT_TIMEOUT_SECONDS = float(st.secrets.get('PORTFOLIO_TENANT_TIMEOUT_SECONDS', 5))
+
+# Separate from the prefetch pool so a portfolio fan-out can't starve page queries
+_executor = ThreadPoolExecutor(max_workers=PORTFOLIO_WORKERS, thread_name_prefix="portfolio")
+
+
+def list_memberships(email, companies):
+    """The projects ``email`` belongs to among ``companies``, with the role held in each."""
+    users = get_users_collection().find({"email": email, "company_name": {"$in": list(companies)}}, {"company_name": 1, "role": 1})
+    return sorted(({"company_name": user["company_name"], "role": user.get("role", "user")} for user in users),
+                  key=lambda membership: membership["company_name"].lower())
+
+
+def tenant_summary(company_name, email, timeout=PORTFOLIO_TENANT_TIMEOUT_SECONDS):
+    """Task counts for one project, from a single aggregate bounded by ``timeout`` on the server."""
+    tasks = get_task_collection(company_name, secondary_read_preference())
+    open_statuses = {"$in": OPEN_STATUSES}
+    overdue = {"status": open_statuses, "due_date": {"$lt": start_of_today()}}
+    counts = {status: {"status": status} for status in TASK_STATUSES}
+    counts.update(overdue=overdue, mine_open={"assigned_to": email, "status": open_statuses}, mine_overdue={"assigned_to": email, **overdue})
+    result = next(tasks.aggregate([
+        {"$project": {"_id": 0, "status": 1, "due_date": 1, "assigned_to": 1}},
+        {"$facet": {key: [{"$match": query}, {"$count": "n"}] for key, query in counts.items()}},
+    ], maxTimeMS=max(1, int(timeout * 1000))))
+    return {key: result[key][0]["n"] if result[key] else 0 for key in counts}
+
+
+def _summarize(company_name, email, timeout, deadline):
+    """``tenant_summary`` and how long it took; skipped once the page has stopped waiting for it."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("the page stopped waiting before a worker was free")
+    start = time.perf_counter()
+    summary = tenant_summary(company_name, email, min(timeout, remaining))
+    return summary, time.perf_counter() - start
+
+
+def gather_portfolio(email, memberships, timeout=PORTFOLIO_TENANT_TIMEOUT_SECONDS):
+    """One row per project; projects that fail or exceed the timeout get a status instead of counts."""
+    # Projects queue behind each other once there are more of them than workers
+    rounds = max(1, math.ceil(len(memberships) / PORTFOLIO_WORKERS))
+    deadline = time.monotonic() + timeout * rounds
+    futures = {_executor.submit(_summarize, membership["company_name"], email, timeout, deadline): membership
+               for membership in memberships}
+    done, _ = wait(futures, timeout=timeout * rounds)
+
+    rows = []
+    for future, membership in futures.items():
+        row = {"Project": membership["company_name"], "Role": membership["role"].capitalize()}
+        if future not in done:
+            future.cancel()
+            row["Status"] = "timed out"
+        elif future.exception() is not None:
+            row["Status"] = f"error: {future.exception()}"
+        else:
+            summary, elapsed = future.result()
+            row.update({
+                "Status": "ok",
+                "Pending": summary["pending"],
+                "In progress": summary["in progress"],
+                "Completed": summary["completed"],
+                "Cancelled": summary["cancelled"],
+                "Overdue": summary["overdue"],
+                "Mine (open)": summary["mine_open"],
+                "Mine (overdue)": summary["mine_overdue"],
+                "Query ms": round(elapsed * 1000),
+            })
+        rows.append(row)
+    return rows
+
+
+def display_portfolio(email):
+    st.subheader("Portfolio")
+    # Sessions from before the login recorded its projects see only the project they logged in to
+    memberships = list_memberships(email, st.session_state.get("authenticated_companies", [st.session_state.company_name]))
+    if not memberships:
+        st.info("You are not a member of any project.")
+        return
+    st.caption(f"{len(memberships)} project(s) for {email}. Counts come from secondaries and may lag by up to a minute or two.")
+
+    with st.spinner("Collecting project statistics..."):
+        rows = gather_portfolio(email, memberships)
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    slow = [row["Project"] for row in rows if row["Status"] != "ok"]
+    if slow:
+        st.warning(f"No figures for {', '.join(slow)}: the project timed out or failed. The other projects are shown as usual.")
+    if st.button("Refresh", key="portfolio_refresh"):
+        st.rerun()
@@ -0,0 +1,37 @@
+# prefetch.py
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import streamlit as st
+from streamlit.runtime.scriptrunner.script_run_context import get_script_run_ctx, add_script_run_ctx, SCRIPT_RUN_CONTEXT_ATTR_NAME
+
+PREFETCH_WORKERS = int(st.secrets.get('PREFETCH_WORKERS', 8))
+
+# One pool shared by every session; pymongo clients are thread-safe so queries can run side by side.
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+def _with_script_ctx(ctx, fn):
+    def run():
+        # Attach the caller's script context so helpers that read st.session_state behave as on the script thread
+        thread = threading.current_thread()
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        try:
+            return fn()
+        finally:
+            # Pool threads are reused by other sessions and later runs: don't leave this run's context behind
+            if hasattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME):
+                delattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME)
+    return run
+
+
+def prefetch(**queries):
+    """Run independent queries concurrently and return their results by name.
+
+    Each keyword is a zero-argument callable, e.g. ``prefetch(task=lambda: tasks.find_one(...))``.
+    Blocks until all of them finish, so the wait is roughly the slowest query instead of the sum.
+    The first exception raised by a query is re-raised here.
+    """
+    ctx = get_script_run_ctx()
+    futures = {name: _executor.submit(_with_script_ctx(ctx, fn)) for name, fn in queries.items()}
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,199 @@
+# profiler.py
+"""On-demand profiling of script reruns.
+
+An admin asks for the next N reruns of their session to be profiled. Those reruns run under cProfile
+(wall-clock timer) and tracemalloc, and the results are aggregated per view (page / selected option)
+in a process-wide store that the "Profiler" admin page browses. When no capture is pending the only
+cost per rerun is one session-state lookup. tracemalloc is process-wide, so one rerun is captured at a
+time; a session whose rerun finds another capture running keeps its captures pending for later reruns.
+"""
+import cProfile
+import json
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+import streamlit as st
+
+TOP_ALLOCATIONS = 50
+
+
+@st.cache_resource(show_spinner=False)
+def _profile_store():
+    return {"lock": threading.Lock(), "capture": threading.Lock(), "views": {}}
+
+
+def current_view():
+    if not st.session_state.get("logged_in"):
+        return "Login"
+    page = st.session_state.get("page")
+    if page in ("Task Details", "Subtask Details"):
+        return page
+    # Anything else renders the dashboard; admins also pick a section in the sidebar
+    return f"Dashboard / {st.session_state.get('selected_option', 'My Tasks')}"
+
+
+def request_profile(reruns):
+    st.session_state.profile_reruns_remaining = int(reruns)
+
+
+def profiled_reruns_remaining():
+    return st.session_state.get("profile_reruns_remaining", 0)
+
+
+def profile_capture_busy():
+    """Whether this session's last pending capture was skipped because another session was capturing."""
+    return st.session_state.get("profile_capture_busy", False)
+
+
+def run_profiled(run):
+    """Call ``run()``, profiling it if this session has captures pending."""
+    if not st.session_state.get("profile_reruns_remaining"):
+        return run()
+
+    # Another session's capture would see this rerun's allocations, and stop tracemalloc under it
+    capture = _profile_store()["capture"]
+    if not capture.acquire(blocking=False):
+        st.session_state.profile_capture_busy = True
+        return run()
+    st.session_state.profile_capture_busy = False
+    st.session_state.profile_reruns_remaining -= 1
+    try:
+        view = current_view()
+        profile = cProfile.Profile(time.perf_counter)
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return run()
+        finally:
+            # st.rerun() leaves the script through an exception; the capture is recorded either way
+            profile.disable()
+            wall = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not already_tracing:
+                tracemalloc.stop()
+            _record(view, profile, wall, peak, snapshot)
+    finally:
+        capture.release()
+
+
+def _record(view, profile, wall, peak, snapshot):
+    allocations = Counter()
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        allocations[f"{frame.filename}:{frame.lineno}"] += stat.size
+
+    store = _profile_store()
+    with store["lock"]:
+        entry = store["views"].setdefault(view, {"runs": 0, "wall": 0.0, "max_wall": 0.0, "peak": 0, "stats": None, "allocations": Counter()})
+        entry["runs"] += 1
+        entry["wall"] += wall
+        entry["max_wall"] = max(entry["max_wall"], wall)
+        entry["peak"] = max(entry["peak"], peak)
+        entry["allocations"].update(allocations)
+        entry["last_run"] = datetime.utcnow()
+        if entry["stats"] is None:
+            entry["stats"] = pstats.Stats(profile)
+        else:
+            entry["stats"].add(profile)
+
+
+def view_summaries():
+    store = _profile_store()
+    with store["lock"]:
+        return [
+            {"view": view, "runs": entry["runs"], "avg_wall_ms": entry["wall"] / entry["runs"] * 1000,
+             "max_wall_ms": entry["max_wall"] * 1000, "peak_mib": entry["peak"] / 1024 / 1024, "last_run": entry["last_run"]}
+            for view, entry in sorted(store["views"].items())
+        ]
+
+
+def function_stats(view, limit=50):
+    """Top functions for a view by cumulative time, as plain rows."""
+    store = _profile_store()
+    with store["lock"]:
+        stats = store["views"][view]["stats"]
+        rows = [
+            {"function": f"{filename}:{lineno}({name})", "calls": nc, "tottime_ms": tt * 1000, "cumtime_ms": ct * 1000}
+            for (filename, lineno, name), (cc, nc, tt, ct, callers) in stats.stats.items()
+        ]
+    rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+    return rows[:limit]
+
+
+def allocation_stats(view, limit=TOP_ALLOCATIONS):
+    store = _profile_store()
+    with store["lock"]:
+        allocations = store["views"][view]["allocations"].most_common(limit)
+    return [{"line": line, "kib": size / 1024} for line, size in allocations]
+
+
+def export_pstats(view):
+    """The aggregated profile in the binary format read by ``pstats.Stats(path)`` and snakeviz."""
+    store = _profile_store()
+    with store["lock"]:
+        return marshal.dumps(store["views"][view]["stats"].stats)
+
+
+def export_json(view):
+    summary = next(row for row in view_summaries() if row["view"] == view)
+    return json.dumps({
+        "summary": summary,
+        "functions": function_stats(view, limit=500),
+        "allocations": allocation_stats(view),
+    }, default=str, indent=2)
+
+
+def clear_profiles():
+    store = _profile_store()
+    with store["lock"]:
+        store["views"].clear()
+
+
+def display_profiler_page():
+    st.subheader("Profiler")
+    st.write("Profile your next reruns to see where time and memory go. Navigate to the slow page after starting a capture.")
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        reruns = st.number_input("Reruns to profile", min_value=1, max_value=100, value=5, step=1, key="profile_reruns")
+    with col2:
+        st.write("")
+        st.write("")
+        if st.button("Start capture", key="start_profile_capture"):
+            request_profile(reruns)
+    remaining = profiled_reruns_remaining()
+    if remaining:
+        st.info(f"Profiling the next {remaining} rerun(s) of this session.")
+        if profile_capture_busy():
+            st.warning("Another session is capturing a profile right now; this session's reruns are profiled once it finishes.")
+
+    summaries = view_summaries()
+    if not summaries:
+        st.info("No captures yet.")
+        return
+
+    st.dataframe(summaries, hide_index=True, use_container_width=True)
+    view = st.selectbox("View", [row["view"] for row in summaries], key="profile_view")
+
+    tab_functions, tab_allocations = st.tabs(["Functions", "Allocations"])
+    with tab_functions:
+        st.dataframe(function_stats(view), hide_index=True, use_container_width=True)
+    with tab_allocations:
+        st.dataframe(allocation_stats(view), hide_index=True, use_container_width=True)
+
+    file_stem = view.replace(" / ", "-").replace(" ", "_")
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Download .pstats", export_pstats(view), file_name=f"{file_stem}.pstats", mime="application/octet-stream")
+    col2.download_button("Download JSON", export_json(view), file_name=f"{file_stem}.json", mime="application/json")
+    if col3.button("Clear captures", key="clear_profile_captures"):
+        clear_profiles()
+        st.rerun()
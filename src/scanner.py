@@ -0,0 +1,188 @@
+# scanner.py
+"""Background due-date scanner.
+
+Finds overdue and due-soon tasks and subtasks for a tenant, flags them with an ``attention`` field
+("overdue" / "due_soon") and writes one small summary document per user to the tenant's
+``attention`` collection, so dashboards read a single document instead of recomputing dates.
+
+Runs in-process on a scheduler thread (``start_attention_scanner``) or from the command line:
+
+    python -m src.scanner --company My_Project
+    python -m src.scanner --all --loop
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+import streamlit as st
+from pymongo import UpdateOne, ReplaceOne
+from .database import get_db, get_users_collection
+from .helpers import get_task_collection, ensure_task_indexes, start_of_today, bump_data_version, refresh_task_rollups, touched, OPEN_STATUSES
+
+DUE_SOON_DAYS = int(st.secrets.get('ATTENTION_DUE_SOON_DAYS', 3))
+SCAN_INTERVAL_SECONDS = int(st.secrets.get('ATTENTION_SCAN_INTERVAL_SECONDS', 300))
+SCAN_BATCH_SIZE = 500
+# Each summary keeps the counts plus at most this many items per bucket, so it stays small
+SUMMARY_ITEM_LIMIT = 20
+
+
+def _attention_for(due_date, today, horizon):
+    if due_date is None:
+        return None
+    if due_date < today:
+        return "overdue"
+    if due_date <= horizon:
+        return "due_soon"
+    return None
+
+
+def _add_to_summary(summaries, emails, attention, item):
+    for email in emails or []:
+        summary = summaries.setdefault(email, {"overdue": [], "due_soon": [], "overdue_count": 0, "due_soon_count": 0})
+        summary[f"{attention}_count"] += 1
+        if len(summary[attention]) < SUMMARY_ITEM_LIMIT:
+            summary[attention].append(item)
+
+
+def scan_tenant(company_name, due_soon_days=DUE_SOON_DAYS, batch_size=SCAN_BATCH_SIZE):
+    """Scan one tenant and rewrite its attention flags and per-user summaries. Returns the counts."""
+    ensure_task_indexes(company_name)
+    tasks = get_task_collection(company_name)
+    attention = get_db(company_name).attention
+    today = start_of_today()
+    horizon = today + timedelta(days=due_soon_days)
+    scan_id = datetime.utcnow()
+    summaries = {}
+    counts = {"overdue": 0, "due_soon": 0}
+    # Tasks whose flags or rollup actually changed; the data version only moves if there are any
+    changed_tasks = 0
+
+    # Tasks: served by the (status, due_date) index
+    cursor = tasks.find(
+        {"status": {"$in": OPEN_STATUSES}, "due_date": {"$lte": horizon}},
+        {"name": 1, "assigned_to": 1, "task_admin": 1, "due_date": 1, "attention": 1},
+        batch_size=batch_size,
+    )
+    updates = []
+    for task in cursor:
+        task_attention = _attention_for(task["due_date"], today, horizon)
+        counts[task_attention] += 1
+        item = {"task_id": task["_id"], "name": task["name"], "due_date": task["due_date"]}
+        _add_to_summary(summaries, set(task.get("assigned_to") or []) | set(task.get("task_admin") or []), task_attention, item)
+        update = {"$set": {"attention": task_attention, "attention_scan": scan_id}}
+        # Only a changed flag counts as a change for incremental refreshes
+        changed_tasks += task.get("attention") != task_attention
+        updates.append(UpdateOne({"_id": task["_id"]}, update if task.get("attention") == task_attention else touched(update)))
+        if len(updates) >= batch_size:
+            tasks.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        tasks.bulk_write(updates, ordered=False)
+    # Anything flagged by an earlier scan that didn't match this one is no longer due
+    changed_tasks += tasks.update_many(
+        {"attention_scan": {"$exists": True, "$ne": scan_id}},
+        touched({"$unset": {"attention": "", "attention_scan": ""}}),
+    ).modified_count
+
+    # Subtasks: served by the (subtasks.status, subtasks.due_date) multikey index
+    cursor = tasks.find(
+        {"$or": [
+            {"subtasks": {"$elemMatch": {"status": {"$in": OPEN_STATUSES}, "due_date": {"$lte": horizon}}}},
+            {"subtasks.attention": {"$in": ["overdue", "due_soon"]}},
+        ]},
+        {"name": 1, "subtasks.name": 1, "subtasks.status": 1, "subtasks.due_date": 1, "subtasks.assigned_to": 1, "subtasks.task_admin": 1, "subtasks.attention": 1},
+        batch_size=batch_size,
+    )
+    open_status = {"$in": OPEN_STATUSES}
+    updates = []
+    for task in cursor:
+        changed = False
+        for subtask in task.get("subtasks", []):
+            subtask_attention = _attention_for(subtask.get("due_date"), today, horizon) if subtask.get("status") in OPEN_STATUSES else None
+            changed = changed or subtask.get("attention") != subtask_attention
+            if subtask_attention is None:
+                continue
+            counts[subtask_attention] += 1
+            item = {"task_id": task["_id"], "name": subtask["name"], "parent_name": task["name"], "due_date": subtask["due_date"]}
+            _add_to_summary(summaries, set(subtask.get("assigned_to") or []) | set(subtask.get("task_admin") or []), subtask_attention, item)
+        changed_tasks += changed
+        update = {"$set": {
+            "subtasks.$[overdue].attention": "overdue",
+            "subtasks.$[soon].attention": "due_soon",
+            "subtasks.$[clear].attention": None,
+        }}
+        updates.append(UpdateOne(
+            {"_id": task["_id"]},
+            touched(update) if changed else update,
+            array_filters=[
+                {"overdue.status": open_status, "overdue.due_date": {"$lt": today}},
+                {"soon.status": open_status, "soon.due_date": {"$gte": today, "$lte": horizon}},
+                {"$or": [{"clear.status": {"$nin": OPEN_STATUSES}}, {"clear.due_date": {"$gt": horizon}}, {"clear.due_date": None}]},
+            ],
+        ))
+        if len(updates) >= batch_size:
+            tasks.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        tasks.bulk_write(updates, ordered=False)
+
+    # Per-user summaries, replaced wholesale; users with nothing due lose their summary
+    replacements = [
+        ReplaceOne({"_id": email}, {"_id": email, **summary, "scanned_at": scan_id}, upsert=True)
+        for email, summary in summaries.items()
+    ]
+    for start in range(0, len(replacements), batch_size):
+        attention.bulk_write(replacements[start:start + batch_size], ordered=False)
+    attention.delete_many({"scanned_at": {"$ne": scan_id}})
+    # Tasks written before rollups existed (or by other tools) get theirs here
+    changed_tasks += refresh_task_rollups(None, company_name, missing_only=True)
+    # Cached task lists carry the attention flags and rollups, so let them refresh, but only if one changed:
+    # every version-keyed cache of the tenant is invalidated by a bump
+    if changed_tasks:
+        bump_data_version(company_name)
+
+    print(f"Attention scan for {company_name}: {counts['overdue']} overdue, {counts['due_soon']} due soon, {len(summaries)} users")
+    return counts
+
+
+def list_tenants():
+    return [name for name in get_users_collection().distinct("company_name") if name]
+
+
+def _scan_forever(company_name, interval):
+    while True:
+        try:
+            scan_tenant(company_name)
+        except Exception as e:
+            print(f"Attention scan for {company_name} failed: {e}")
+        time.sleep(interval)
+
+
+@st.cache_resource(show_spinner=False)
+def start_attention_scanner(company_name, interval=SCAN_INTERVAL_SECONDS):
+    """Start the scanner thread for a tenant; cached so each process runs one thread per tenant."""
+    thread = threading.Thread(target=_scan_forever, args=(company_name, interval), name=f"attention-scan-{company_name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag overdue and due-soon tasks and write per-user attention summaries.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--company", action="append", help="Tenant (project) name; may be repeated")
+    target.add_argument("--all", action="store_true", help="Scan every tenant found in global_users")
+    parser.add_argument("--due-soon-days", type=int, default=DUE_SOON_DAYS)
+    parser.add_argument("--loop", action="store_true", help="Keep scanning every --interval seconds")
+    parser.add_argument("--interval", type=int, default=SCAN_INTERVAL_SECONDS)
+    args = parser.parse_args()
+
+    while True:
+        for company_name in (list_tenants() if args.all else args.company):
+            scan_tenant(company_name, due_soon_days=args.due_soon_days)
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# session_cache.py
+"""Per-session cache for query results with a memory budget.
+
+Each browser session gets one ``SessionCache`` in its session state. Entries are evicted least recently
+used first once their estimated size passes SESSION_CACHE_BUDGET_MB, so memory per connected session
+stays bounded no matter how large the tenant is. A process-wide registry of weak references lets
+admins see how much each live session holds; entries disappear when their session does.
+"""
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import streamlit as st
+from streamlit.runtime.scriptrunner.script_run_context import get_script_run_ctx
+
+SESSION_CACHE_BUDGET_BYTES = int(float(st.secrets.get('SESSION_CACHE_BUDGET_MB', 16)) * 1024 * 1024)
+
+
+def estimate_size(value, _depth=0):
+    """Rough size in bytes of a cached value. Raw BSON models count their encoded bytes."""
+    raw = getattr(value, "raw", None)
+    if raw is not None:
+        raw = getattr(raw, "raw", raw)
+        if isinstance(raw, (bytes, bytearray)):
+            return sys.getsizeof(value) + len(raw)
+    if _depth > 4:
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item, _depth + 1) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class SessionCache:
+    def __init__(self, budget_bytes=SESSION_CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.owner = None
+        self.last_used = time.time()
+
+    def get_or_load(self, key, loader):
+        self.last_used = time.time()
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = loader()
+        size = estimate_size(value)
+        if size <= self.budget_bytes:
+            self.entries[key] = (value, size)
+            self.size_bytes += size
+            self._evict()
+        return value
+
+    def resize(self, key):
+        """Re-measure an entry that changed in place, such as a refreshed task snapshot."""
+        if key not in self.entries:
+            return
+        value, size = self.entries[key]
+        new_size = estimate_size(value)
+        self.entries[key] = (value, new_size)
+        self.size_bytes += new_size - size
+        self._evict()
+
+    def _evict(self):
+        while self.size_bytes > self.budget_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size_bytes = 0
+
+
+@st.cache_resource(show_spinner=False)
+def _registry():
+    return {"lock": threading.Lock(), "caches": weakref.WeakValueDictionary()}
+
+
+def get_session_cache():
+    cache = st.session_state.get("_query_cache")
+    if cache is None:
+        cache = st.session_state["_query_cache"] = SessionCache()
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            registry = _registry()
+            with registry["lock"]:
+                registry["caches"][ctx.session_id] = cache
+    user = st.session_state.get("user")
+    cache.owner = user.email if user is not None else None
+    return cache
+
+
+def session_cached(key, loader):
+    """Return the cached result for ``key`` in this session, calling ``loader()`` on a miss.
+
+    Include anything the result depends on in ``key`` (for task queries, the tenant data version).
+    """
+    return get_session_cache().get_or_load(key, loader)
+
+
+def live_session_memory():
+    registry = _registry()
+    with registry["lock"]:
+        caches = list(registry["caches"].items())
+    return [
+        {"session": session_id[:8], "user": cache.owner or "(not logged in)", "entries": len(cache.entries),
+         "cache_mib": cache.size_bytes / 1024 / 1024, "budget_mib": cache.budget_bytes / 1024 / 1024,
+         "hits": cache.hits, "misses": cache.misses, "evictions": cache.evictions,
+         "idle_s": int(time.time() - cache.last_used)}
+        for session_id, cache in caches
+    ]
+
+
+def display_session_memory():
+    st.subheader("Live sessions")
+    sessions = live_session_memory()
+    if not sessions:
+        st.info("No live sessions with cached results.")
+        return
+    st.caption(f"{len(sessions)} session(s), {sum(row['cache_mib'] for row in sessions):.1f} MiB cached in this process")
+    st.dataframe(sessions, hide_index=True, use_container_width=True)
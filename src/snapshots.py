@@ -0,0 +1,101 @@
+# snapshots.py
+"""Session-local task list snapshots, refreshed incrementally.
+
+A ``TaskSnapshot`` keeps the summary rows matching one task query. The first load reads them all.
+After that, whenever the tenant's data version moves, it fetches only the tasks whose ``updated_at``
+is at or after its watermark, plus the tombstones of tasks deleted or archived since then, re-checks
+each changed task against the query and patches its rows, so a refresh costs in proportion to what
+changed rather than to the size of the tenant.
+
+The watermark is the newest timestamp the snapshot has read, not the local clock: a secondary that
+lags shows an older prefix of the writes, and whatever it had not applied yet is newer than the
+watermark and arrives with the next refresh. A refresh reads the data version, the watermark and the
+rows through one causal session, so even when its reads land on different secondaries the rows are
+at least as new as the watermark and the version they are recorded under. Refreshes reach back
+REFRESH_OVERLAP_SECONDS further to catch writes that committed slightly out of timestamp order. A
+snapshot that has not refreshed for TOMBSTONE_RETENTION_DAYS reloads in full, because the tombstones
+it would need may have expired.
+
+Snapshots live in the session's ``SessionCache`` and are re-measured after every refresh, so they
+count against the session's memory budget and are evicted with its other cached results.
+"""
+import sys
+from datetime import datetime, timedelta
+import bson
+from .database import causal_session
+from .helpers import find_tasks_matching, find_task_changes, get_data_version, latest_task_write, TOMBSTONE_RETENTION_DAYS
+from .matching import matches
+from .session_cache import estimate_size, get_session_cache
+
+REFRESH_OVERLAP_SECONDS = 5
+
+
+class TaskSnapshot:
+    def __init__(self, query, company_name):
+        self.query = query
+        self.company_name = company_name
+        self.rows = {}  # _id -> Task
+        self.watermark = None
+        self.data_version = None
+        self.refreshed_at = None
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self._sorted = None
+
+    def __sizeof__(self):
+        # What the session cache budget should see: the rows, not just this object
+        return object.__sizeof__(self) + estimate_size(self.rows) + sys.getsizeof(self._sorted)
+
+    def tasks(self, data_version, session=None):
+        """The matching rows ordered by (created_at, _id), refreshed first if ``data_version`` moved.
+
+        Pass the ``causal_session()`` ``data_version`` was read through."""
+        if data_version != self.data_version:
+            self.refresh(session)
+            self.data_version = data_version
+        if self._sorted is None:
+            self._sorted = sorted(self.rows.values(), key=lambda task: (task.created_at or datetime.min, task.id))
+        return self._sorted
+
+    def refresh(self, session=None):
+        started = datetime.utcnow()
+        if self.refreshed_at is None or started - self.refreshed_at > timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            self._load_all(session)
+        else:
+            self._apply_changes(session)
+        self.refreshed_at = started
+        self._sorted = None
+
+    def _load_all(self, session):
+        # Read the watermark first: anything written during the load is newer and gets fetched again
+        self.watermark = latest_task_write(self.company_name, session)
+        self.rows = {task.id: task for task in find_tasks_matching(self.query, self.company_name, session=session)}
+        self.full_loads += 1
+
+    def _apply_changes(self, session):
+        since = datetime.min if self.watermark is None else self.watermark - timedelta(seconds=REFRESH_OVERLAP_SECONDS)
+        changed, removed = find_task_changes(since, self.company_name, session)
+        for task in changed:
+            # Same query semantics as the server; a task that stopped matching leaves the snapshot
+            if matches(bson.decode(task.raw.raw), self.query):
+                self.rows[task.id] = task
+            else:
+                self.rows.pop(task.id, None)
+        for tombstone in removed:
+            self.rows.pop(tombstone["_id"], None)
+        stamps = [task.updated_at for task in changed if task.updated_at] + [tombstone["deleted_at"] for tombstone in removed]
+        if self.watermark is not None:
+            stamps.append(self.watermark)
+        self.watermark = max(stamps, default=None)
+        self.incremental_loads += 1
+
+
+def snapshot_tasks(key, query, company_name):
+    """This session's rows for ``query``, from its snapshot for ``key`` (created on first use)."""
+    cache = get_session_cache()
+    cache_key = ("task_snapshot", company_name, key, repr(query))
+    snapshot = cache.get_or_load(cache_key, lambda: TaskSnapshot(query, company_name))
+    with causal_session() as session:
+        tasks = snapshot.tasks(get_data_version(company_name, session), session)
+    cache.resize(cache_key)
+    return tasks
@@ -0,0 +1,1242 @@
+# sqlite_backend.py
+"""Embedded SQLite storage with the subset of the pymongo API the app uses.
+
+Selected with ``STORAGE_BACKEND = "sqlite"``: ``database.client`` is then a ``SQLiteClient`` and every
+``get_db(...)`` / ``get_users_collection()`` caller works unchanged, with no MongoDB server needed.
+
+Layout: one database file (WAL mode), one table per ``<db>.<collection>`` with the ``_id`` as primary
+key and the document as a JSON column, subtasks and status histories included. ObjectIds, datetimes
+and bytes are stored as tagged strings that sort correctly. ``create_index`` on top-level fields
+creates SQLite expression indexes on each field's BSON type bracket and value, and filters on those
+fields are compiled to SQL so the indexes are used and values of different types (``True`` and
+``1``) never compare equal. Top-level fields that have ever held an array are recorded as multikey;
+the values of indexed multikey fields and of indexed dotted paths (``subtasks.status``) are kept in
+the ``_index_values`` table, one row per element, so filters on them are index-served too.
+Everything else in a filter (``$elemMatch``, ``$regex``, unindexed dotted paths) is evaluated in
+Python by ``matching.matches`` on the rows SQL returns. ``index_information`` reads the indexes back
+from the ``_indexes`` registry.
+
+Supported: find/find_one (projection, sort, skip, limit), insert_one/many, update_one/many
+($set, $unset, $inc, $min, $max, $push, $pull, $addToSet, $setOnInsert, $currentDate; ``$``, ``$[]`` and
+``$[name]`` with array_filters; upserts), replace_one, delete_one/many, find_one_and_delete,
+count_documents, distinct, bulk_write, create_index, index_information, rename, aggregate ($match, $project, $addFields, $group,
+$unwind, $sort, $skip, $limit, $count, $facet, $unionWith, $graphLookup) and transactions via
+``start_session().with_transaction``. Read preferences are accepted and ignored.
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from .matching import matches, _bracket, _element_matches, _expand, _is_operator_dict, _match_condition, _resolve
+
+# Tagged-string prefixes; U+FDD0 is a Unicode noncharacter, so ordinary text never starts with it
+_TAG = "\ufdd0"
+_OBJECT_ID = _TAG + "O"
+_DATETIME = _TAG + "D"
+_BYTES = _TAG + "B"
+
+
+# Encoding
+
+def _encode(value):
+    if isinstance(value, Mapping):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, ObjectId):
+        return _OBJECT_ID + str(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        # Millisecond precision, like BSON dates
+        return _DATETIME + value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}"
+    if isinstance(value, (bytes, bytearray)):
+        return _BYTES + base64.b64encode(bytes(value)).decode()
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, str) and value.startswith(_TAG):
+        tag, text = value[:2], value[2:]
+        if tag == _OBJECT_ID:
+            return ObjectId(text)
+        if tag == _DATETIME:
+            return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S.%f")
+        if tag == _BYTES:
+            return base64.b64decode(text)
+    return value
+
+
+def _dumps(document):
+    return json.dumps(_encode(document), separators=(",", ":"))
+
+
+def _id_key(value):
+    return json.dumps(_encode(value))
+
+
+def _sql_value(value):
+    value = _encode(value)
+    return int(value) if isinstance(value, bool) else value
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _json_path(field):
+    return "'$." + '"' + field.replace("'", "''").replace('"', '\\"') + '"' + "'"
+
+
+def _field_sql(field):
+    return f"json_extract(doc, {_json_path(field)})"
+
+
+def _bracket_sql(field):
+    """SQL for ``_bracket`` of a top-level field; missing fields count as null, as in MongoDB."""
+    path = _json_path(field)
+    return (f"CASE coalesce(json_type(doc, {path}), 'null') WHEN 'null' THEN 1 WHEN 'integer' THEN 2 WHEN 'real' THEN 2 "
+            f"WHEN 'text' THEN CASE substr({_field_sql(field)}, 1, 2) WHEN '{_BYTES}' THEN 6 WHEN '{_OBJECT_ID}' THEN 7 "
+            f"WHEN '{_DATETIME}' THEN 9 ELSE 3 END WHEN 'object' THEN 4 WHEN 'array' THEN 5 ELSE 8 END")
+
+
+def _in_sql(bracket, value, targets):
+    """``value IN targets``, each target compared only within its type bracket."""
+    groups = {}
+    for target in targets:
+        groups.setdefault(_bracket(target), []).append(_sql_value(target))
+    clauses, params = [], []
+    for number, values in groups.items():
+        if number == 1:
+            clauses.append(f"{bracket} = 1")
+        else:
+            clauses.append(f"({bracket} = {number} AND {value} IN ({', '.join('?' * len(values))}))")
+            params.extend(values)
+    return ("(" + " OR ".join(clauses) + ")" if clauses else "0"), params
+
+
+# Values and sorting
+
+def _get_path(document, path, default=None):
+    values = _resolve(document, path.split("."))
+    if not values:
+        return default
+    # A path through an array of documents yields one value per element
+    return values[0] if len(values) == 1 and not _crosses_array(document, path) else values
+
+
+def _crosses_array(document, path):
+    value = document
+    for part in path.split(".")[:-1]:
+        if isinstance(value, Mapping):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return isinstance(value, list)
+    return isinstance(value, list)
+
+
+def _sort_key(value, descending=False):
+    # An array sorts by its smallest element ascending and by its largest descending
+    if isinstance(value, list):
+        value = (max if descending else min)(value, key=_sort_key) if value else None
+    bracket = _bracket(value)
+    if bracket in (4, 10):
+        return (bracket, _dumps(value) if bracket == 4 else repr(value))
+    return (bracket, value if value is not None else 0)
+
+
+def _sort_documents(documents, sort):
+    for field, direction in reversed(sort):
+        descending = (direction or 1) < 0
+        documents.sort(key=lambda doc: _sort_key(_get_path(doc, field), descending), reverse=descending)
+    return documents
+
+
+def _normalize_sort(key_or_list, direction=None):
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, Mapping):
+        return list(key_or_list.items())
+    return [(key, value or 1) for key, value in key_or_list]
+
+
+# Projection
+
+def _projection_tree(fields):
+    tree = {}
+    for path in fields:
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def _include(value, tree):
+    if isinstance(value, list):
+        return [_include(item, tree) for item in value if isinstance(item, (Mapping, list))]
+    if not isinstance(value, Mapping):
+        return value
+    result = {}
+    for key, sub in tree.items():
+        if key in value:
+            result[key] = value[key] if sub is True else _include(value[key], sub)
+    return result
+
+
+def _exclude(value, tree):
+    if isinstance(value, list):
+        return [_exclude(item, tree) for item in value]
+    if not isinstance(value, Mapping):
+        return value
+    result = {}
+    for key, item in value.items():
+        sub = tree.get(key)
+        if sub is True:
+            continue
+        result[key] = item if sub is None else _exclude(item, sub)
+    return result
+
+
+def project(document, projection):
+    if not projection:
+        return document
+    if not isinstance(projection, Mapping):
+        projection = {field: 1 for field in projection}
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    include_id = bool(projection.get("_id", 1))
+    if fields and all(bool(value) for value in fields.values()):
+        result = _include(document, _projection_tree(fields))
+        if include_id and "_id" in document:
+            result = {"_id": document["_id"], **result}
+        return result
+    result = _exclude(document, _projection_tree(key for key, value in fields.items() if not value))
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+# Updates
+
+def _element_filter(query, name):
+    """An array filter with its ``name.`` prefix stripped, so it can be matched against one element."""
+    stripped = {}
+    for key, condition in query.items():
+        if key in ("$or", "$and", "$nor"):
+            stripped[key] = [_element_filter(sub, name) for sub in condition]
+        elif key == name:
+            stripped[""] = condition
+        elif key.startswith(name + "."):
+            stripped[key[len(name) + 1:]] = condition
+        else:
+            stripped[key] = condition
+    return stripped
+
+
+def _positional_index(document, prefix, query):
+    """Index of the first element of the array at ``prefix`` that the query matched (for ``$``)."""
+    conditions = {}
+
+    def collect(sub_query):
+        for key, condition in sub_query.items():
+            if key == "$and":
+                for item in condition:
+                    collect(item)
+            elif key == prefix and isinstance(condition, Mapping) and "$elemMatch" in condition:
+                conditions.setdefault("$elemMatch", []).append(condition["$elemMatch"])
+            elif key.startswith(prefix + "."):
+                conditions.setdefault("fields", {})[key[len(prefix) + 1:]] = condition
+            elif key == prefix:
+                conditions.setdefault("self", []).append(condition)
+
+    collect(query)
+    array = _get_path(document, prefix)
+    if isinstance(array, list):
+        for index, element in enumerate(array):
+            if conditions.get("fields") and not _element_matches(element, conditions["fields"]):
+                continue
+            if not all(_element_matches(element, sub) for sub in conditions.get("$elemMatch", [])):
+                continue
+            if not all(_match_condition([element], sub) for sub in conditions.get("self", [])):
+                continue
+            if conditions:
+                return index
+    raise WriteError("The positional operator did not find the match needed from the query.", code=2)
+
+
+def _targets(container, parts, context, prefix=""):
+    """Yield (parent, key) pairs the update path addresses, creating intermediate documents."""
+    head, rest = parts[0], parts[1:]
+    if isinstance(container, list):
+        if head == "$":
+            keys = [context.positional(prefix)]
+        elif head == "$[]":
+            keys = range(len(container))
+        elif head.startswith("$[") and head.endswith("]"):
+            element_filter = context.array_filters[head[2:-1]]
+            keys = [index for index, item in enumerate(container) if matches(item, element_filter)]
+        elif head.isdigit():
+            keys = [int(head)]
+            while len(container) <= keys[0]:
+                container.append(None)
+        else:
+            raise WriteError(f"Cannot create field '{head}' in an array", code=28)
+    elif isinstance(container, dict):
+        keys = [head]
+    else:
+        return
+    for key in keys:
+        if not rest:
+            yield container, key
+            continue
+        child = container[key] if isinstance(container, list) else container.get(key)
+        if child is None:
+            child = container[key] = {}
+        yield from _targets(child, rest, context, f"{prefix}.{head}" if prefix else head)
+
+
+class _UpdateContext:
+    def __init__(self, document, query, array_filters):
+        self.document = document
+        self.query = query
+        self.array_filters = {}
+        for array_filter in array_filters or []:
+            name = next(iter(key.split(".")[0] for key in array_filter if not key.startswith("$")), None)
+            if name is None:
+                # {"$or": [{"name.field": ...}, ...]}: take the identifier from the first clause
+                clause = next(iter(array_filter.values()))[0]
+                name = next(iter(clause)).split(".")[0]
+            self.array_filters[name] = _element_filter(array_filter, name)
+
+    def positional(self, prefix):
+        return _positional_index(self.document, prefix, self.query)
+
+
+def _get(parent, key, default=None):
+    if isinstance(parent, list):
+        return parent[key] if key < len(parent) else default
+    return parent.get(key, default)
+
+
+def _each(value):
+    return value["$each"] if isinstance(value, Mapping) and "$each" in value else [value]
+
+
+def _pull_matches(item, condition):
+    if _is_operator_dict(condition):
+        return _match_condition([item], condition)
+    if isinstance(condition, Mapping):
+        return isinstance(item, Mapping) and matches(item, condition)
+    return item == condition
+
+
+def apply_update(document, update, query=None, array_filters=None, inserting=False):
+    """Apply update operators to ``document`` in place."""
+    context = _UpdateContext(document, query or {}, array_filters)
+    for operator, fields in update.items():
+        if operator == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            for parent, key in list(_targets(document, path.split("."), context)):
+                current = _get(parent, key)
+                if operator in ("$set", "$setOnInsert"):
+                    parent[key] = deepcopy(value)
+                elif operator == "$unset":
+                    if isinstance(parent, list):
+                        parent[key] = None
+                    else:
+                        parent.pop(key, None)
+                elif operator == "$inc":
+                    parent[key] = (current or 0) + value
+                elif operator == "$min":
+                    parent[key] = value if current is None or _sort_key(value) < _sort_key(current) else current
+                elif operator == "$max":
+                    parent[key] = value if current is None or _sort_key(value) > _sort_key(current) else current
+                elif operator == "$push":
+                    parent[key] = list(current or []) + deepcopy(_each(value))
+                elif operator == "$addToSet":
+                    items = list(current or [])
+                    for item in _each(value):
+                        if item not in items:
+                            items.append(deepcopy(item))
+                    parent[key] = items
+                elif operator == "$pull":
+                    if isinstance(current, list):
+                        parent[key] = [item for item in current if not _pull_matches(item, value)]
+                elif operator == "$currentDate":
+                    # Millisecond precision, like BSON dates
+                    now = datetime.utcnow()
+                    parent[key] = now.replace(microsecond=now.microsecond // 1000 * 1000)
+                else:
+                    raise WriteError(f"Unknown modifier: {operator}", code=9)
+    return document
+
+
+def _upsert_seed(query):
+    seed = {}
+    for key, condition in (query or {}).items():
+        if key.startswith("$") or "." in key:
+            continue
+        if _is_operator_dict(condition):
+            if "$eq" in condition:
+                seed[key] = condition["$eq"]
+        else:
+            seed[key] = condition
+    return seed
+
+
+# Aggregation
+
+def _evaluate(expression, document):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get_path(document, expression[1:])
+    if isinstance(expression, list):
+        return [_evaluate(item, document) for item in expression]
+    if not isinstance(expression, Mapping):
+        return expression
+    if len(expression) == 1 and next(iter(expression)).startswith("$"):
+        operator, argument = next(iter(expression.items()))
+        return _evaluate_operator(operator, argument, document)
+    return {key: _evaluate(value, document) for key, value in expression.items()}
+
+
+def _date_trunc(date, unit, bin_size=1):
+    if date is None:
+        return None
+    if unit == "month":
+        months = (date.year - 2000) * 12 + date.month - 1
+        months -= months % bin_size
+        return datetime(2000 + months // 12, months % 12 + 1, 1)
+    if unit == "year":
+        year = date.year - (date.year - 2000) % bin_size
+        return datetime(year, 1, 1)
+    # Days and weeks count from 2000-01-01 (weeks start on Sunday, 2000-01-02), like MongoDB
+    reference = datetime(2000, 1, 2) if unit == "week" else datetime(2000, 1, 1)
+    step = {"week": timedelta(weeks=bin_size), "day": timedelta(days=bin_size), "hour": timedelta(hours=bin_size),
+            "minute": timedelta(minutes=bin_size)}[unit]
+    return reference + step * ((date - reference) // step)
+
+
+def _evaluate_operator(operator, argument, document):
+    if operator == "$literal":
+        return argument
+    if operator == "$dateTrunc":
+        return _date_trunc(_evaluate(argument["date"], document), argument["unit"], _evaluate(argument.get("binSize", 1), document))
+    values = _evaluate(argument, document) if isinstance(argument, list) else [_evaluate(argument, document)]
+    if operator == "$ifNull":
+        return next((value for value in values if value is not None), None)
+    if operator == "$size":
+        return len(values[0] or [])
+    if operator in ("$add", "$sum"):
+        if operator == "$sum" and len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        if operator == "$add" and any(isinstance(value, datetime) for value in values):
+            base = next(value for value in values if isinstance(value, datetime))
+            return base + timedelta(milliseconds=sum(numbers))
+        return sum(numbers)
+    if operator == "$subtract":
+        first, second = values
+        if isinstance(first, datetime) and isinstance(second, datetime):
+            return int((first - second).total_seconds() * 1000)
+        if isinstance(first, datetime):
+            return first - timedelta(milliseconds=second)
+        return first - second
+    if operator == "$multiply":
+        result = 1
+        for value in values:
+            result *= value
+        return result
+    if operator == "$divide":
+        return values[0] / values[1]
+    if operator in ("$min", "$max"):
+        if len(values) == 1 and isinstance(values[0], list):
+            values = values[0]
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        return (min if operator == "$min" else max)(values, key=_sort_key)
+    if operator == "$in":
+        return values[0] in (values[1] or [])
+    if operator == "$cond":
+        if isinstance(argument, Mapping):
+            values = [_evaluate(argument[key], document) for key in ("if", "then", "else")]
+        return values[1] if values[0] else values[2]
+    if operator in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        first, second = (_sort_key(value) for value in values)
+        return {"$eq": first == second, "$ne": first != second, "$gt": first > second, "$gte": first >= second,
+                "$lt": first < second, "$lte": first <= second}[operator]
+    if operator == "$and":
+        return all(values)
+    if operator == "$or":
+        return any(values)
+    raise OperationFailure(f"Unrecognized expression '{operator}'", code=168)
+
+
+def _group(documents, spec):
+    groups = {}
+    for document in documents:
+        group_id = _evaluate(spec["_id"], document)
+        key = _dumps(group_id)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = {"_id": group_id}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            operator, argument = next(iter(accumulator.items()))
+            value = _evaluate(argument, document)
+            if operator == "$sum":
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    state[field] = state.get(field, 0) + value
+                else:
+                    state.setdefault(field, 0)
+            elif operator == "$avg":
+                total, count = state.get(field, (0, 0))
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total, count = total + value, count + 1
+                state[field] = (total, count)
+            elif operator in ("$min", "$max"):
+                current = state.get(field)
+                if value is not None and (current is None or (_sort_key(value) < _sort_key(current)) == (operator == "$min")):
+                    state[field] = value
+                else:
+                    state.setdefault(field, current)
+            elif operator == "$push":
+                state.setdefault(field, []).append(value)
+            elif operator == "$addToSet":
+                items = state.setdefault(field, [])
+                if value not in items:
+                    items.append(value)
+            elif operator == "$first":
+                state.setdefault(field, value)
+            elif operator == "$last":
+                state[field] = value
+            else:
+                raise OperationFailure(f"unknown group operator '{operator}'", code=15952)
+    results = list(groups.values())
+    for state in results:
+        for field, accumulator in spec.items():
+            if field != "_id" and "$avg" in accumulator:
+                total, count = state[field]
+                state[field] = total / count if count else None
+    return results
+
+
+def _unwind(documents, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep_empty = spec.get("preserveNullAndEmptyArrays", False)
+    for document in documents:
+        value = _get_path(document, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                unwound = deepcopy(document)
+                apply_update(unwound, {"$set": {path: item}})
+                yield unwound
+        elif keep_empty or (value is not None and not isinstance(value, list)):
+            yield document
+
+
+def _index_rows(table, key, document, paths):
+    """``_index_values`` rows for a document: every scalar at each path, array elements included."""
+    for path in paths:
+        for value in _expand(_resolve(document, path.split("."))):
+            if not isinstance(value, (Mapping, list)):
+                yield table, path, _bracket(value), _sql_value(value), key
+
+
+class _Cursor:
+    """Lazy result of ``find``; sort, skip and limit can be chained before iteration."""
+
+    def __init__(self, collection, query, projection, sort=None, skip=0, limit=0):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = _normalize_sort(sort)
+        self._skip = skip
+        self._limit = limit
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def close(self):
+        self._results = iter(())
+
+    def _execute(self):
+        documents = self._collection._select(self._query, self._sort, self._skip, self._limit)
+        return iter([self._collection._output(project(document, self._projection)) for document in documents])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            self._results = self._execute()
+        return next(self._results)
+
+    next = __next__
+
+
+class _CommandCursor:
+    def __init__(self, documents):
+        self._documents = iter(documents)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._documents)
+
+    next = __next__
+
+    def close(self):
+        self._documents = iter(())
+
+
+class Collection:
+    def __init__(self, database, name, raw=False):
+        self.database = database
+        self.name = name
+        self._raw = raw
+        self._client = database.client
+        self._table = f"{database.name}.{name}"
+        self._client._ensure_table(self._table)
+
+    def __repr__(self):
+        return f"Collection(SQLiteClient({self._client.path!r}), {self.database.name!r}, {self.name!r})"
+
+    def with_options(self, codec_options=None, read_preference=None, **kwargs):
+        raw = self._raw if codec_options is None else codec_options.document_class is RawBSONDocument
+        return Collection(self.database, self.name, raw=raw)
+
+    def _output(self, document):
+        return RawBSONDocument(bson.encode(document)) if self._raw else document
+
+    # SQL
+
+    def _compile(self, query, multikey, indexed):
+        """A WHERE clause for the parts of ``query`` SQL can check; ``complete`` says whether that is all of it."""
+        clauses, params, complete = [], [], True
+        for key, condition in (query or {}).items():
+            if key in ("$and", "$or"):
+                parts = [self._compile(sub, multikey, indexed) for sub in condition]
+                if key == "$or" and any(part[0] is None for part in parts):
+                    complete = False
+                    continue
+                sqls = [part[0] for part in parts if part[0] is not None]
+                if sqls:
+                    clauses.append("(" + (" AND " if key == "$and" else " OR ").join(sqls) + ")")
+                    for part in parts:
+                        params.extend(part[1])
+                complete = complete and all(part[2] for part in parts)
+            elif key.startswith("$") or ("." in key and key not in indexed):
+                complete = False
+            else:
+                sql, field_params, field_complete = self._compile_field(key, condition, key in multikey, key in indexed)
+                if sql is not None:
+                    clauses.append(sql)
+                    params.extend(field_params)
+                complete = complete and field_complete
+        return (" AND ".join(clauses) if clauses else None), params, complete
+
+    def _compile_field(self, field, condition, is_multikey, is_indexed):
+        if not _is_operator_dict(condition):
+            condition = {"$eq": condition}
+        scalar = lambda value: value is not None and not isinstance(value, (Mapping, list))
+        clauses, params, complete = [], [], True
+        if field == "_id":
+            for operator, target in condition.items():
+                if operator == "$eq" and scalar(target):
+                    clauses.append("id = ?")
+                    params.append(_id_key(target))
+                elif operator == "$in" and all(scalar(item) for item in target):
+                    clauses.append(f"id IN ({', '.join('?' * len(target))})" if target else "0")
+                    params.extend(_id_key(item) for item in target)
+                else:
+                    complete = False
+            return (" AND ".join(clauses) if clauses else None), params, complete
+
+        path = _json_path(field)
+        bracket, expression = _bracket_sql(field), _field_sql(field)
+        symbols = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+        for operator, target in condition.items():
+            targets = [target] if operator in ("$eq", "$ne") else target
+            if operator == "$exists" and "." not in field:
+                clauses.append(f"json_type(doc, {path}) IS {'NOT ' if target else ''}NULL")
+            elif is_indexed and operator in ("$eq", "$in", "$ne", "$nin") and all(scalar(item) for item in targets):
+                # One _index_values row per element: served by its (tbl, path, bracket, value) index
+                sql, values = _in_sql("bracket", "value", targets)
+                negate = "NOT " if operator in ("$ne", "$nin") else ""
+                clauses.append(f"id {negate}IN (SELECT id FROM _index_values WHERE tbl = ? AND path = ? AND {sql})")
+                params.extend([self._table, field, *values])
+            elif is_indexed and operator in symbols and scalar(target):
+                clauses.append(f"id IN (SELECT id FROM _index_values WHERE tbl = ? AND path = ? AND bracket = {_bracket(target)} "
+                               f"AND value {symbols[operator]} ?)")
+                params.extend([self._table, field, _sql_value(target)])
+            elif is_multikey and (operator in ("$eq", "$in") and all(scalar(item) for item in targets)
+                                  or operator in symbols and scalar(target)):
+                # Unindexed array field: a prefilter only, type brackets are checked in Python
+                if operator in symbols:
+                    clauses.append(f"EXISTS (SELECT 1 FROM json_each(doc, {path}) WHERE value {symbols[operator]} ?)")
+                    params.append(_sql_value(target))
+                elif targets:
+                    clauses.append(f"EXISTS (SELECT 1 FROM json_each(doc, {path}) WHERE value IN ({', '.join('?' * len(targets))}))")
+                    params.extend(_sql_value(item) for item in targets)
+                else:
+                    clauses.append("0")
+                complete = False
+            elif is_multikey or "." in field:
+                complete = False
+            elif operator in ("$eq", "$in", "$ne", "$nin") and all(item is None or scalar(item) for item in targets):
+                sql, values = _in_sql(bracket, expression, targets)
+                clauses.append(f"NOT {sql}" if operator in ("$ne", "$nin") else sql)
+                params.extend(values)
+            elif operator in symbols and scalar(target):
+                clauses.append(f"({bracket} = {_bracket(target)} AND {expression} {symbols[operator]} ?)")
+                params.append(_sql_value(target))
+            else:
+                complete = False
+        return (" AND ".join(clauses) if clauses else None), params, complete
+
+    def _select(self, query, sort=(), skip=0, limit=0):
+        """Matching documents, sorted and paged; SQL does as much of the work as it safely can."""
+        if query is not None and not isinstance(query, Mapping):
+            query = {"_id": query}
+        connection = self._client._connection()
+        multikey = self._client._multikey(self._table)
+        where, params, complete = self._compile(query, multikey, self._client._index_paths(self._table))
+        sql = f"SELECT doc FROM {_quote(self._table)}"
+        if where:
+            sql += f" WHERE {where}"
+        sort = list(sort or [])
+        sql_sort = all("." not in field and field not in multikey for field, _ in sort)
+        if complete and sql_sort:
+            if sort:
+                # Type bracket first, then value: the BSON sort order, and the order of the indexes
+                sql += " ORDER BY " + ", ".join(f"{column} {'DESC' if (direction or 1) < 0 else 'ASC'}" for field, direction in sort
+                                                for column in (_bracket_sql(field), _field_sql(field)))
+            if limit or skip:
+                sql += f" LIMIT {int(limit) if limit else -1} OFFSET {int(skip)}"
+        rows = connection.execute(sql, params).fetchall()
+        documents = [_decode(json.loads(row[0])) for row in rows]
+        if complete and sql_sort:
+            return documents
+        documents = [document for document in documents if matches(document, query)]
+        if sort:
+            _sort_documents(documents, sort)
+        if skip:
+            documents = documents[skip:]
+        if limit:
+            documents = documents[:limit]
+        return documents
+
+    def _write_document(self, connection, document, insert=False):
+        try:
+            if insert:
+                connection.execute(f"INSERT INTO {_quote(self._table)} (id, doc) VALUES (?, ?)", (_id_key(document["_id"]), _dumps(document)))
+            else:
+                connection.execute(f"UPDATE {_quote(self._table)} SET doc = ? WHERE id = ?", (_dumps(document), _id_key(document["_id"])))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.database.name}.{self.name} ({e})", code=11000)
+        self._client._index_document(connection, self._table, document, replace=not insert)
+        # A field that has just become multikey is backfilled for every document, this one included
+        self._client._mark_multikey(connection, self._table, document)
+
+    # Reads
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, batch_size=None, session=None, **kwargs):
+        return _Cursor(self, filter, projection, sort, skip, limit)
+
+    def find_one(self, filter=None, projection=None, *args, sort=None, session=None, **kwargs):
+        return next(self.find(filter, projection, sort=sort, limit=1), None)
+
+    def count_documents(self, filter, session=None, **kwargs):
+        where, params, complete = self._compile(filter, self._client._multikey(self._table), self._client._index_paths(self._table))
+        if not complete:
+            return len(self._select(filter))
+        sql = f"SELECT COUNT(*) FROM {_quote(self._table)}" + (f" WHERE {where}" if where else "")
+        return self._client._connection().execute(sql, params).fetchone()[0]
+
+    def estimated_document_count(self, **kwargs):
+        return self._client._connection().execute(f"SELECT COUNT(*) FROM {_quote(self._table)}").fetchone()[0]
+
+    def distinct(self, key, filter=None, session=None, **kwargs):
+        values = []
+        for document in self._select(filter):
+            for value in _expand(_resolve(document, key.split("."))):
+                if not isinstance(value, list) and value not in values:
+                    values.append(value)
+        return values
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        pipeline = list(pipeline)
+        query = pipeline.pop(0)["$match"] if pipeline and "$match" in pipeline[0] else None
+        documents = self._run_pipeline(self._select(query), pipeline)
+        return _CommandCursor([self._output(document) for document in documents])
+
+    def _run_pipeline(self, documents, pipeline):
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                documents = [document for document in documents if matches(document, spec)]
+            elif name == "$project":
+                computed = {key: value for key, value in spec.items() if isinstance(value, (str, Mapping, list))}
+                if not computed:
+                    documents = [project(document, spec) for document in documents]
+                    continue
+                # Computed fields imply inclusion of the plain fields alongside them
+                included = [key for key, value in spec.items() if key not in computed and key != "_id" and value]
+                projected = []
+                for document in documents:
+                    result = project(document, {key: 1 for key in included}) if included else {}
+                    if spec.get("_id", 1) and "_id" not in computed and "_id" in document:
+                        result = {"_id": document["_id"], **result}
+                    result.update({key: _evaluate(value, document) for key, value in computed.items()})
+                    projected.append(result)
+                documents = projected
+            elif name in ("$addFields", "$set"):
+                for document in documents:
+                    for key, value in spec.items():
+                        apply_update(document, {"$set": {key: _evaluate(value, document)}})
+            elif name == "$unset":
+                documents = [project(document, {field: 0 for field in ([spec] if isinstance(spec, str) else spec)}) for document in documents]
+            elif name == "$group":
+                documents = _group(documents, spec)
+            elif name == "$unwind":
+                documents = list(_unwind(documents, spec))
+            elif name == "$sort":
+                documents = _sort_documents(list(documents), list(spec.items()))
+            elif name == "$skip":
+                documents = documents[spec:]
+            elif name == "$limit":
+                documents = documents[:spec]
+            elif name == "$count":
+                documents = [{spec: len(documents)}] if documents else []
+            elif name == "$facet":
+                documents = [{key: self._run_pipeline(deepcopy(documents), sub) for key, sub in spec.items()}]
+            elif name == "$graphLookup":
+                documents = list(documents)
+                other = self.database[spec["from"]]
+                for document in documents:
+                    document[spec["as"]] = other._graph_lookup(spec, _evaluate(spec["startWith"], document))
+            elif name == "$unionWith":
+                if isinstance(spec, str):
+                    spec = {"coll": spec}
+                other = self.database[spec["coll"]]
+                documents = list(documents) + other._run_pipeline(other._select(None), list(spec.get("pipeline", [])))
+            else:
+                raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", code=40324)
+        return documents
+
+    def _graph_lookup(self, spec, start):
+        """Breadth-first search for ``$graphLookup``, one query per level."""
+        restrict = spec.get("restrictSearchWithMatch") or {}
+        max_depth = spec.get("maxDepth")
+        found = {}
+        frontier = [value for value in (start if isinstance(start, list) else [start]) if value is not None]
+        depth = 0
+        while frontier and (max_depth is None or depth <= max_depth):
+            next_frontier = []
+            for document in self._select({"$and": [{spec["connectToField"]: {"$in": frontier}}, restrict]}):
+                key = _id_key(document["_id"])
+                if key in found:
+                    continue
+                if spec.get("depthField"):
+                    document[spec["depthField"]] = depth
+                found[key] = document
+                value = _get_path(document, spec["connectFromField"])
+                next_frontier.extend(item for item in (value if isinstance(value, list) else [value]) if item is not None)
+            frontier = next_frontier
+            depth += 1
+        return list(found.values())
+
+    # Writes
+
+    def insert_one(self, document, session=None, **kwargs):
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        with self._client._write() as connection:
+            self._write_document(connection, dict(document), insert=True)
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents, ordered=True, session=None, **kwargs):
+        documents = list(documents)
+        inserted, errors = [], []
+        with self._client._write() as connection:
+            for index, document in enumerate(documents):
+                if "_id" not in document:
+                    document["_id"] = ObjectId()
+                try:
+                    connection.execute("SAVEPOINT insert_document")
+                    self._write_document(connection, dict(document), insert=True)
+                    connection.execute("RELEASE insert_document")
+                    inserted.append(document["_id"])
+                except DuplicateKeyError as e:
+                    connection.execute("ROLLBACK TO insert_document")
+                    connection.execute("RELEASE insert_document")
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted), "nUpserted": 0,
+                                  "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []})
+        return InsertManyResult(inserted, True)
+
+    def _update(self, query, update, upsert, many, array_filters=None, replacement=False):
+        with self._client._write() as connection:
+            documents = self._select(query, limit=0 if many else 1)
+            matched = modified = 0
+            for document in documents:
+                before = _dumps(document)
+                if replacement:
+                    updated = {"_id": document["_id"], **{key: value for key, value in update.items() if key != "_id"}}
+                else:
+                    updated = apply_update(document, update, query, array_filters)
+                matched += 1
+                if _dumps(updated) != before:
+                    self._write_document(connection, updated)
+                    modified += 1
+            upserted_id = None
+            if not documents and upsert:
+                document = _upsert_seed(query)
+                if replacement:
+                    document.update(update)
+                else:
+                    apply_update(document, update, query, array_filters, inserting=True)
+                document.setdefault("_id", ObjectId())
+                self._write_document(connection, document, insert=True)
+                upserted_id = document["_id"]
+        raw_result = {"n": matched or (1 if upserted_id is not None else 0), "nModified": modified}
+        if upserted_id is not None:
+            raw_result["upserted"] = upserted_id
+        return UpdateResult(raw_result, True)
+
+    def update_one(self, filter, update, upsert=False, array_filters=None, session=None, **kwargs):
+        return self._update(filter, update, upsert, many=False, array_filters=array_filters)
+
+    def update_many(self, filter, update, upsert=False, array_filters=None, session=None, **kwargs):
+        return self._update(filter, update, upsert, many=True, array_filters=array_filters)
+
+    def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        return self._update(filter, replacement, upsert, many=False, replacement=True)
+
+    def _delete(self, query, many):
+        with self._client._write() as connection:
+            documents = self._select(query, limit=0 if many else 1)
+            ids = [_id_key(document["_id"]) for document in documents]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                connection.execute(f"DELETE FROM {_quote(self._table)} WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+                connection.execute(f"DELETE FROM _index_values WHERE tbl = ? AND id IN ({', '.join('?' * len(chunk))})", [self._table, *chunk])
+        return DeleteResult({"n": len(ids)}, True)
+
+    def delete_one(self, filter, session=None, **kwargs):
+        return self._delete(filter, many=False)
+
+    def delete_many(self, filter, session=None, **kwargs):
+        return self._delete(filter, many=True)
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, session=None, **kwargs):
+        with self._client._write():
+            documents = self._select(filter, _normalize_sort(sort), limit=1)
+            if not documents:
+                return None
+            self._delete({"_id": documents[0]["_id"]}, many=False)
+        return self._output(project(documents[0], projection))
+
+    def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        totals = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0, "upserted": [],
+                  "writeErrors": [], "writeConcernErrors": []}
+        with self._client._write():
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self.insert_one(request._doc)
+                        totals["nInserted"] += 1
+                        continue
+                    if isinstance(request, (DeleteOne, DeleteMany)):
+                        totals["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany)).deleted_count
+                        continue
+                    if isinstance(request, ReplaceOne):
+                        result = self.replace_one(request._filter, request._doc, upsert=request._upsert)
+                    elif isinstance(request, (UpdateOne, UpdateMany)):
+                        result = self._update(request._filter, request._doc, request._upsert, many=isinstance(request, UpdateMany),
+                                              array_filters=request._array_filters)
+                    else:
+                        raise TypeError(f"{request!r} is not a valid request")
+                    totals["nMatched"] += result.matched_count
+                    totals["nModified"] += result.modified_count
+                    if result.upserted_id is not None:
+                        totals["nUpserted"] += 1
+                        totals["upserted"].append({"index": index, "_id": result.upserted_id})
+                except (DuplicateKeyError, WriteError) as e:
+                    totals["writeErrors"].append({"index": index, "code": e.code, "errmsg": str(e), "op": request})
+                    if ordered:
+                        break
+        if totals["writeErrors"]:
+            raise BulkWriteError(totals)
+        return BulkWriteResult(totals, True)
+
+    # Indexes
+
+    def create_index(self, keys, unique=False, name=None, session=None, **kwargs):
+        keys = _normalize_sort(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if unique and any("." in field for field, _ in keys):
+            raise OperationFailure(f"unique index {name} on a field inside an array is not supported", code=67)
+        info = {"key": [[field, direction] for field, direction in keys], **({"unique": True} if unique else {}),
+                **{option: kwargs[option] for option in ("sparse", "expireAfterSeconds", "partialFilterExpression") if option in kwargs}}
+        index = _quote(self._table + "$" + name)
+        columns = ", ".join(f"{column}{' DESC' if direction == -1 else ''}" for field, direction in keys if "." not in field
+                            for column in (_bracket_sql(field), _field_sql(field)))
+        with self._client._write() as connection:
+            if connection.execute("SELECT 1 FROM _indexes WHERE tbl = ? AND name = ?", (self._table, name)).fetchone() is None:
+                # Indexes from before the registry don't have the type bracket column
+                connection.execute(f"DROP INDEX IF EXISTS {index}")
+            if columns:
+                connection.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index} ON {_quote(self._table)} ({columns})")
+            connection.execute("INSERT OR REPLACE INTO _indexes (tbl, name, info) VALUES (?, ?, ?)", (self._table, name, json.dumps(info)))
+            multikey = self._client._multikey(self._table)
+            for field, _ in keys:
+                if "." in field or field in multikey:
+                    self._client._add_index_path(connection, self._table, field)
+        return name
+
+    def index_information(self, session=None):
+        """Indexes in pymongo's format, from the ``_indexes`` registry."""
+        indexes = {"_id_": {"key": [("_id", 1)]}}
+        rows = self._client._connection().execute("SELECT name, info FROM _indexes WHERE tbl = ? ORDER BY rowid", (self._table,))
+        for name, info in rows:
+            info = json.loads(info)
+            indexes[name] = {**info, "key": [tuple(key) for key in info["key"]]}
+        return indexes
+
+    def drop(self, session=None):
+        self.database.drop_collection(self.name)
+
+    def rename(self, new_name, session=None, dropTarget=False, **kwargs):
+        target = f"{self.database.name}.{new_name}"
+        with self._client._write() as connection:
+            if target in self._client._tables():
+                if not dropTarget:
+                    raise OperationFailure(f"target namespace {target} exists", code=48)
+                self.database.drop_collection(new_name)
+            indexes = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (self._table,))]
+            connection.execute(f"ALTER TABLE {_quote(self._table)} RENAME TO {_quote(target)}")
+            # Index names start with the table name and SQLite can't rename an index: recreate them
+            for index in indexes:
+                sql = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (index,)).fetchone()[0]
+                connection.execute(f"DROP INDEX {_quote(index)}")
+                connection.execute(sql.replace(_quote(index), _quote(target + index[len(self._table):]), 1))
+            for registry in ("_multikey", "_indexes", "_index_paths", "_index_values"):
+                connection.execute(f"UPDATE {registry} SET tbl = ? WHERE tbl = ?", (target, self._table))
+        self._client._known_tables.discard(self._table)
+        self._client._known_multikey.clear()
+
+
+class Database:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __getitem__(self, name):
+        return Collection(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return Collection(self, name)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def list_collection_names(self, session=None, **kwargs):
+        prefix = self.name + "."
+        return [table[len(prefix):] for table in self.client._tables() if table.startswith(prefix)]
+
+    def drop_collection(self, name, session=None, **kwargs):
+        table = f"{self.name}.{name}"
+        with self.client._write() as connection:
+            connection.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            for registry in ("_multikey", "_indexes", "_index_paths", "_index_values"):
+                connection.execute(f"DELETE FROM {registry} WHERE tbl = ?", (table,))
+        self.client._known_tables.discard(table)
+
+
+class _Session:
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end_session()
+
+    def end_session(self):
+        pass
+
+    def with_transaction(self, callback, **kwargs):
+        with self.client._write():
+            return callback(self)
+
+
+class SQLiteClient:
+    """Stands in for ``MongoClient``: ``client[db][collection]`` over one SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._known_tables = set()
+        self._known_multikey = set()
+        self._lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS _multikey (tbl TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (tbl, path))")
+        connection.execute("CREATE TABLE IF NOT EXISTS _indexes (tbl TEXT NOT NULL, name TEXT NOT NULL, info TEXT NOT NULL, PRIMARY KEY (tbl, name))")
+        # Indexed paths that hold arrays, and one row per value found at them
+        connection.execute("CREATE TABLE IF NOT EXISTS _index_paths (tbl TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (tbl, path))")
+        connection.execute("CREATE TABLE IF NOT EXISTS _index_values (tbl TEXT NOT NULL, path TEXT NOT NULL, bracket INTEGER NOT NULL, value, id TEXT NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS _index_values_lookup ON _index_values (tbl, path, bracket, value)")
+        connection.execute("CREATE INDEX IF NOT EXISTS _index_values_document ON _index_values (tbl, id)")
+
+    def __getitem__(self, name):
+        return Database(self, name)
+
+    def __repr__(self):
+        return f"SQLiteClient({self.path!r})"
+
+    def _connection(self):
+        # One connection per thread; WAL lets readers run alongside the single writer
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _write(self):
+        """A write transaction, or the enclosing one if this thread is already in a transaction."""
+        connection = self._connection()
+        if connection.in_transaction:
+            yield connection
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            # Multikey marks made in this transaction are gone too
+            self._known_multikey.clear()
+            raise
+        connection.execute("COMMIT")
+
+    def _tables(self):
+        rows = self._connection().execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%.%'").fetchall()
+        return [row[0] for row in rows]
+
+    def _ensure_table(self, table):
+        if table in self._known_tables:
+            return
+        with self._lock:
+            self._connection().execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} (id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+            self._known_tables.add(table)
+
+    def _multikey(self, table):
+        return {row[0] for row in self._connection().execute("SELECT path FROM _multikey WHERE tbl = ?", (table,))}
+
+    def _mark_multikey(self, connection, table, document):
+        for key, value in document.items():
+            if isinstance(value, list) and (table, key) not in self._known_multikey:
+                marked = connection.execute("INSERT OR IGNORE INTO _multikey (tbl, path) VALUES (?, ?)", (table, key)).rowcount
+                self._known_multikey.add((table, key))
+                if marked and key in self._indexed_fields(connection, table):
+                    self._add_index_path(connection, table, key)
+
+    def _indexed_fields(self, connection, table):
+        rows = connection.execute("SELECT info FROM _indexes WHERE tbl = ?", (table,))
+        return {field for row in rows for field, _ in json.loads(row[0])["key"]}
+
+    def _index_paths(self, table):
+        return {row[0] for row in self._connection().execute("SELECT path FROM _index_paths WHERE tbl = ?", (table,))}
+
+    def _add_index_path(self, connection, table, path):
+        """Start keeping ``_index_values`` rows for ``path``, for the documents already in ``table`` too."""
+        if not connection.execute("INSERT OR IGNORE INTO _index_paths (tbl, path) VALUES (?, ?)", (table, path)).rowcount:
+            return
+        for key, doc in connection.execute(f"SELECT id, doc FROM {_quote(table)}").fetchall():
+            connection.executemany("INSERT INTO _index_values (tbl, path, bracket, value, id) VALUES (?, ?, ?, ?, ?)",
+                                   _index_rows(table, key, _decode(json.loads(doc)), [path]))
+
+    def _index_document(self, connection, table, document, replace=False):
+        paths = [row[0] for row in connection.execute("SELECT path FROM _index_paths WHERE tbl = ?", (table,))]
+        if not paths:
+            return
+        key = _id_key(document["_id"])
+        if replace:
+            connection.execute("DELETE FROM _index_values WHERE tbl = ? AND id = ?", (table, key))
+        connection.executemany("INSERT INTO _index_values (tbl, path, bracket, value, id) VALUES (?, ?, ?, ?, ?)",
+                               _index_rows(table, key, document, paths))
+
+    def start_session(self, **kwargs):
+        return _Session(self)
+
+    def list_database_names(self, session=None, **kwargs):
+        return sorted({table.split(".", 1)[0] for table in self._tables()})
+
+    def drop_database(self, name, session=None, **kwargs):
+        database = self[name]
+        for collection in database.list_collection_names():
+            database.drop_collection(collection)
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
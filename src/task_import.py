@@ -0,0 +1,322 @@
+# task_import.py
+"""Bulk task import from CSV or JSONL.
+
+The file is streamed row by row three times. The first pass collects the emails it mentions, so
+assignees and admins are mapped to project users with a few batched queries. The second validates
+every row, gives each task its ``_id`` up front and resolves ``depends_on`` references
+to other rows of the file (by their ``key`` column, or by name when there is none), rejecting
+dependency cycles and rows that depend on a rejected row. Only a few small fields per row are kept,
+never the rows themselves. The last pass builds the documents, including each task's
+``dependent_tasks``, and inserts them with unordered ``insert_many`` batches. Rollups and the priority
+escalation pass run once at the end instead of once per task.
+
+The Create Task page saves the upload and runs the import as a background job (see ``jobs.py``). The
+job derives each row's ``_id`` from the job id, so a run resumed after a restart skips the rows an
+earlier attempt already inserted. Large migrations can also run from the command line:
+
+    python -m src.task_import --company My_Project tasks.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+from datetime import datetime
+import streamlit as st
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from .database import get_users_collection
+from .jobs import job_kind, job_seed, job_upload_dir, submit_job, list_jobs, display_job
+from .helpers import (get_task_collection, refresh_task_rollups, update_task_priority_based_on_dependencies, record_task_write,
+                      search_key, TASK_STATUSES, TASK_PRIORITIES, CLOSED_STATUSES)
+
+IMPORT_BATCH_SIZE = 1000
+# Rows reported individually; the rest are only counted
+REPORT_ERROR_LIMIT = 1000
+
+
+def read_task_rows(uploaded_file):
+    """Yield dicts from a CSV (with a header row) or JSONL file, from the start of the file each time.
+
+    A JSONL line that doesn't parse is yielded as its ``JSONDecodeError``, so it is reported as its row.
+    """
+    uploaded_file.seek(0)
+    text = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+    try:
+        if uploaded_file.name.lower().endswith((".jsonl", ".json")):
+            for line in text:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield e
+        else:
+            yield from csv.DictReader(text)
+    finally:
+        # Leave the file open for the next pass
+        text.detach()
+
+
+def _emails(row, column):
+    value = row.get(column)
+    if isinstance(value, list) and all(isinstance(email, str) for email in value):
+        return [email.strip().lower() for email in value if email.strip()]
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{column} must be a list of emails or emails separated by ';'.")
+    return [email.strip().lower() for email in (value or "").replace(",", ";").split(";") if email.strip()]
+
+
+def _text(row, column):
+    value = row.get(column)
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"{column} must be text.")
+    return str(value).strip()
+
+
+def _row_key(row):
+    """The key other rows' ``depends_on`` refer to; empty for a malformed row, which ``_parse_row`` reports."""
+    if not isinstance(row, dict):
+        return ""
+    try:
+        return _text(row, "key") or _text(row, "name")
+    except ValueError:
+        return ""
+
+
+def _parse_row(row, known_emails):
+    """Validate one row; returns ``(fields, error)``."""
+    if isinstance(row, json.JSONDecodeError):
+        return None, f"Invalid JSON: {row.msg} (column {row.colno})."
+    if not isinstance(row, dict):
+        return None, "Each line must be a JSON object."
+    try:
+        return _row_fields(row, known_emails)
+    except ValueError as e:
+        return None, str(e)
+
+
+def _row_fields(row, known_emails):
+    for column in ("key", "depends_on"):
+        # Checked here so the later passes can read them from any row that passed
+        _text(row, column)
+    name = _text(row, "name")
+    if not name:
+        return None, "Name is required."
+    assigned_to, task_admin = _emails(row, "assigned_to"), _emails(row, "task_admin")
+    unknown = [email for email in assigned_to + task_admin if email not in known_emails]
+    if unknown:
+        return None, f"Not a user of this project: {', '.join(unknown)}"
+    status = _text(row, "status").lower() or "pending"
+    if status not in TASK_STATUSES:
+        return None, f"Status must be one of {', '.join(TASK_STATUSES)}."
+    priority = _text(row, "priority").capitalize() or "Low"
+    if priority not in TASK_PRIORITIES:
+        return None, f"Priority must be one of {', '.join(TASK_PRIORITIES)}."
+    due_date = _text(row, "due_date")
+    try:
+        due_date = datetime.strptime(due_date[:10], '%Y-%m-%d') if due_date else None
+    except ValueError:
+        return None, "due_date must be YYYY-MM-DD."
+    return {"name": name, "description": _text(row, "description"), "assigned_to": assigned_to, "task_admin": task_admin,
+            "status": status, "priority": priority, "due_date": due_date}, None
+
+
+def _known_emails(open_rows, company_name):
+    """The project users among every email mentioned in the file, and the number of rows."""
+    mentioned = set()
+    rows = 0
+    for rows, row in enumerate(open_rows(), 1):
+        if not isinstance(row, dict):
+            continue
+        for column in ("assigned_to", "task_admin"):
+            try:
+                mentioned.update(_emails(row, column))
+            except ValueError:
+                # Reported when the row is validated
+                pass
+    mentioned = list(mentioned)
+    users = get_users_collection()
+    known = set()
+    for start in range(0, len(mentioned), IMPORT_BATCH_SIZE):
+        batch = mentioned[start:start + IMPORT_BATCH_SIZE]
+        known.update(user["email"] for user in users.find({"company_name": company_name, "email": {"$in": batch}}, {"email": 1}))
+    return known, rows
+
+
+def _reject_broken_dependencies(meta, index_by_key, errors):
+    """Mark rows in a dependency cycle, or depending on a missing or rejected row, as errors.
+
+    Each row depends on at most one other, so following ``depends_on`` from every row and remembering
+    each outcome visits every row a constant number of times.
+    """
+    importable = {}
+    for start in range(len(meta)):
+        path, position, index = [], {}, start
+        upstream_ok = True
+        while index not in importable and index not in position:
+            position[index] = len(path)
+            path.append(index)
+            entry = meta[index]
+            if entry is None or entry["depends_on"] is None:
+                break
+            if entry["depends_on"] not in index_by_key:
+                errors[index] = f"depends_on '{entry['depends_on']}' does not match a row in the file."
+                break
+            index = index_by_key[entry["depends_on"]]
+        else:
+            if index in position:
+                cycle = path[position[index]:]
+                description = " -> ".join(meta[member]["key"] for member in cycle + [index])
+                for member in cycle:
+                    errors.setdefault(member, f"Dependency cycle: {description}")
+                upstream_ok = False
+            else:
+                upstream_ok = importable[index]
+        # Back along the chain: a row is importable only if it is valid and what it depends on is
+        for member in reversed(path):
+            if meta[member] is not None and member not in errors and not upstream_ok:
+                errors[member] = f"Depends on '{meta[member]['depends_on']}', which was not imported."
+            importable[member] = upstream_ok = meta[member] is not None and member not in errors
+
+
+def import_tasks(open_rows, company_name, id_seed=None, progress=None):
+    """Import the rows yielded by ``open_rows()`` (called once per pass) as tasks of ``company_name``.
+
+    With ``id_seed``, row ids are derived from it and rows already present are counted as created.
+    ``progress(done, total, message)`` is called as the import goes. Returns ``{"rows", "created",
+    "errors", "report"}``, where ``report`` lists the rejected rows (at most REPORT_ERROR_LIMIT of them)
+    as ``{"row", "name", "error"}``.
+    """
+    progress = progress or (lambda done, total, message: None)
+    progress(0, None, "Checking users")
+    known_emails, total = _known_emails(open_rows, company_name)
+
+    # Validate, assign ids and index the keys
+    meta, index_by_key, errors = [], {}, {}
+    for index, row in enumerate(open_rows()):
+        if index % IMPORT_BATCH_SIZE == 0:
+            progress(index, total, "Validating")
+        fields, error = _parse_row(row, known_emails)
+        key = _row_key(row)
+        if key in index_by_key:
+            error = error or f"Duplicate key '{key}' in file."
+        elif key:
+            # Rejected rows are indexed too, so rows depending on them get a clear error
+            index_by_key[key] = index
+        if error:
+            errors[index] = error
+            meta.append(None)
+            continue
+        meta.append({"key": key, "_id": job_seed(id_seed, index) if id_seed else ObjectId(), "name": fields["name"], "depends_on": _text(row, "depends_on") or None})
+    _reject_broken_dependencies(meta, index_by_key, errors)
+
+    dependents = {}
+    for index, entry in enumerate(meta):
+        if entry is not None and index not in errors and entry["depends_on"] is not None:
+            dependents.setdefault(index_by_key[entry["depends_on"]], []).append(entry["name"])
+
+    # Build and insert in batches
+    tasks = get_task_collection(company_name)
+    created_ids = []
+    batch, batch_rows = [], []
+
+    def flush():
+        try:
+            tasks.insert_many(batch, ordered=False)
+            created_ids.extend(document["_id"] for document in batch)
+        except BulkWriteError as e:
+            # With seeded ids a duplicate _id is a row an interrupted earlier attempt inserted
+            failed = {error["index"]: error["errmsg"] for error in e.details["writeErrors"] if not (id_seed and error["code"] == 11000)}
+            for position, (document, index) in enumerate(zip(batch, batch_rows)):
+                if position in failed:
+                    errors[index] = failed[position]
+                else:
+                    created_ids.append(document["_id"])
+        progress(batch_rows[-1] + 1, total, "Inserting")
+        batch.clear()
+        batch_rows.clear()
+
+    for index, row in enumerate(open_rows()):
+        if index in errors or meta[index] is None:
+            continue
+        fields, _ = _parse_row(row, known_emails)
+        entry = meta[index]
+        now = datetime.utcnow()
+        batch.append({
+            "_id": entry["_id"],
+            **fields,
+            "search_name": search_key(fields["name"]),
+            "created_at": now,
+            "updated_at": now,
+            "closed_at": now if fields["status"] in CLOSED_STATUSES else None,
+            "depends_on": meta[index_by_key[entry["depends_on"]]]["_id"] if entry["depends_on"] else None,
+            "dependent_tasks": dependents.get(index, []),
+            "subtasks": [],
+            "version": 0,
+        })
+        batch_rows.append(index)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    if created_ids:
+        progress(total, total, "Updating rollups and priorities")
+        for start in range(0, len(created_ids), IMPORT_BATCH_SIZE):
+            refresh_task_rollups(created_ids[start:start + IMPORT_BATCH_SIZE], company_name)
+        update_task_priority_based_on_dependencies(company_name)
+        record_task_write(company_name)
+
+    report = [{"row": index + 1, "name": meta[index]["name"] if meta[index] else None, "error": error}
+              for index, error in sorted(errors.items())[:REPORT_ERROR_LIMIT]]
+    return {"rows": len(meta), "created": len(created_ids), "errors": len(errors), "report": report}
+
+
+@job_kind("task_import")
+def import_tasks_job(context, path):
+    # The upload is removed with the job's upload_dir once the job ends
+    with open(path, "rb") as f:
+        return import_tasks(lambda: read_task_rows(f), context.company_name, id_seed=context.job_id, progress=context.progress)
+
+
+def _describe_import(result):
+    return f"Created {result['created']} of {result['rows']} tasks; {result['errors']} rows not imported."
+
+
+def display_bulk_task_import():
+    company_name, owner = st.session_state.company_name, st.session_state.user.email
+    with st.expander("Bulk import tasks from CSV / JSONL", expanded=False):
+        st.write("Columns: `name`, optional `key`, `description`, `assigned_to` and `task_admin` (emails separated by `;`), "
+                 "`status`, `priority`, `due_date` (YYYY-MM-DD) and `depends_on` (the `key`, or name, of another row in the file).")
+        uploaded_file = st.file_uploader("Tasks file", type=["csv", "jsonl", "json"], key="bulk_tasks_file")
+        if st.button("Import tasks", key="bulk_tasks_import") and uploaded_file is not None:
+            # The job reads the file after this run has ended, possibly in a later process
+            directory = job_upload_dir(company_name)
+            path = os.path.join(directory, os.path.basename(uploaded_file.name))
+            with open(path, "wb") as f:
+                shutil.copyfileobj(uploaded_file, f)
+            submit_job("task_import", company_name, owner, {"path": path}, upload_dir=directory)
+        for job in list_jobs(company_name, owner, kind="task_import", limit=3):
+            display_job(job, company_name, describe_result=_describe_import)
+            if job["status"] == "completed" and job["result"]["report"]:
+                st.dataframe(job["result"]["report"], hide_index=True, use_container_width=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import tasks from a CSV or JSONL file into a tenant.")
+    parser.add_argument("--company", required=True, help="Tenant (project) name")
+    parser.add_argument("path", help="CSV (with a header row) or JSONL file")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        result = import_tasks(lambda: read_task_rows(f), args.company)
+    for entry in result["report"]:
+        print(f"row {entry['row']}: {entry['error']}")
+    print(f"Created {result['created']} of {result['rows']} tasks for {args.company}; {result['errors']} rows rejected")
+
+
+if __name__ == "__main__":
+    main()
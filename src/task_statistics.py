@@ -0,0 +1,177 @@
+# task_statistics.py
+"""Figures for the Task Statistics page.
+
+When the tenant has an analytics snapshot (see ``analytics.py``) the figures are computed with pandas
+over its Parquet files and cached per snapshot, so the page doesn't touch the database at all. Without
+one, counts and the creation time series come from aggregations on the live collection, cached per
+tenant data version. Either way the time series is bucketed by day, week or month, widening the bucket
+when needed to stay under MAX_TIME_POINTS.
+"""
+import math
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import networkx as nx
+import matplotlib.pyplot as plt
+from .helpers import get_read_task_collection, start_of_today, TASK_STATUSES, OPEN_STATUSES
+from .analytics import load_snapshot
+
+MAX_TIME_POINTS = 365
+TIME_UNITS = {"Day": "day", "Week": "week", "Month": "month"}
+UNIT_SECONDS = {"day": 24 * 60 * 60, "week": 7 * 24 * 60 * 60, "month": 30 * 24 * 60 * 60}
+
+
+def _with_archive(include_archived, stages):
+    if include_archived:
+        return [{"$unionWith": {"coll": "tasks_archive", "pipeline": [{"$project": {"status_updates": 0, "description": 0}}]}}] + stages
+    return stages
+
+
+def _bucket_size(first, last, unit):
+    if first is None or last is None:
+        return 1
+    buckets = (last - first).total_seconds() / UNIT_SECONDS[unit]
+    return max(1, math.ceil(buckets / MAX_TIME_POINTS))
+
+
+def task_counts(company_name, include_archived=False, session=None):
+    """Counts by status, priority and assignee, the creation time span and the dependency edges, in one aggregation."""
+    return get_read_task_collection(company_name).aggregate(_with_archive(include_archived, [{"$facet": {
+        "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        "priority": [{"$group": {"_id": "$priority", "count": {"$sum": 1}}}],
+        "users": [{"$unwind": "$assigned_to"}, {"$group": {"_id": "$assigned_to", "count": {"$sum": 1}}}],
+        "span": [{"$group": {"_id": None, "first": {"$min": "$created_at"}, "last": {"$max": "$created_at"}}}],
+        "dependencies": [
+            {"$match": {"dependent_tasks.0": {"$exists": True}}},
+            {"$project": {"_id": 0, "name": 1, "dependent_tasks": 1}},
+        ],
+    }}]), session=session).next()
+
+
+def _figures(df_status, df_priority, df_user, df_time, bin_size, unit, dependencies):
+    figures = {}
+
+    # Task Status Pie chart, only for statuses that exist
+    figures["status"] = px.pie(df_status, names='status', values='count', title='Task Status Distribution', color='status',
+                               color_discrete_map={'pending': '#FA6C5C', 'in progress': '#6C5CFA', 'completed': '#36F57F', 'cancelled': '#A2AD9C'})
+
+    # Task Priority Histogram
+    figures["priority"] = px.bar(df_priority, x='priority', y='count', color='priority', title='Task Priority Distribution',
+                                 color_discrete_map={'High': '#F62817', 'Moderate': '#157DEC', 'Low': '#36F57F'})
+
+    # User-specific Task Distribution
+    figures["users"] = px.bar(df_user, x='user', y='task_count', color='user', title='User-specific Task Distribution')
+
+    # Task Distribution over Time: running total of tasks per bucket
+    df_time["task_counts_over_time"] = df_time["task_count"].cumsum()
+    title = 'Task Distribution Over Time' if bin_size == 1 else f'Task Distribution Over Time ({bin_size}-{unit} buckets)'
+    figures["time"] = px.line(df_time, x='task_creation_times', y='task_counts_over_time', title=title)
+
+    # Dependency graph; only tasks that take part in a dependency are drawn
+    G = nx.DiGraph()
+    for name, dependent_tasks in dependencies:
+        for dependent_task in dependent_tasks:
+            G.add_edge(dependent_task, name)  # Add an edge from the dependent task to the task
+    fig, ax = plt.subplots(figsize=(10, 5))
+    pos = nx.spring_layout(G)
+    nx.draw(G, pos, with_labels=True, node_color='skyblue', node_size=1500, edge_cmap=plt.cm.Blues, font_size=10, ax=ax)
+    figures["dependencies"] = fig
+    plt.close(fig)
+
+    return figures
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_statistics_figures(company_name, include_archived, unit, data_version, _session=None):
+    """Return the page's figures from the live collection. ``data_version`` is only part of the cache key.
+
+    Pass the ``causal_session()`` ``data_version`` was read through as ``_session``, so the figures
+    cached under it are never older than it.
+    """
+    tasks = get_read_task_collection(company_name)
+    counts = task_counts(company_name, include_archived, _session)
+
+    df_status = pd.DataFrame(
+        [(row["_id"], row["count"]) for row in counts["status"] if row["_id"] in TASK_STATUSES],
+        columns=["status", "count"],
+    )
+    df_priority = pd.DataFrame([(row["_id"], row["count"]) for row in counts["priority"]], columns=["priority", "count"])
+    df_user = pd.DataFrame([(row["_id"], row["count"]) for row in counts["users"]], columns=["user", "task_count"])
+
+    # Bucketed on the server
+    span = counts["span"][0] if counts["span"] else {}
+    bin_size = _bucket_size(span.get("first"), span.get("last"), unit)
+    buckets = list(tasks.aggregate(_with_archive(include_archived, [
+        {"$group": {"_id": {"$dateTrunc": {"date": "$created_at", "unit": unit, "binSize": bin_size}}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]), session=_session))
+    df_time = pd.DataFrame([(row["_id"], row["count"]) for row in buckets], columns=["task_creation_times", "task_count"])
+
+    dependencies = [(task["name"], task["dependent_tasks"]) for task in counts["dependencies"]]
+    return _figures(df_status, df_priority, df_user, df_time, bin_size, unit, dependencies)
+
+
+# Bins count from the same reference dates as $dateTrunc: 2000-01-01, and 2000-01-02 for weeks (which start on Sunday)
+_REFERENCE_DAY = pd.Timestamp("2000-01-01")
+_REFERENCE_SUNDAY = pd.Timestamp("2000-01-02")
+
+
+def _bucket_starts(dates, unit, bin_size):
+    """Vectorized $dateTrunc: the start of each date's ``bin_size``-``unit`` bucket."""
+    if unit == "month":
+        months = ((dates.dt.year - 2000) * 12 + dates.dt.month - 1) // bin_size * bin_size
+        return pd.to_datetime(pd.DataFrame({"year": 2000 + months // 12, "month": months % 12 + 1, "day": 1}))
+    reference = _REFERENCE_SUNDAY if unit == "week" else _REFERENCE_DAY
+    days = 7 * bin_size if unit == "week" else bin_size
+    offsets = (dates - reference).dt.days // days * days
+    return reference + pd.to_timedelta(offsets, unit="D")
+
+
+def _explode_counts(frame, column, name):
+    exploded = frame[column].explode().dropna()
+    return exploded.value_counts().rename_axis(name).reset_index(name="count")
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_snapshot_figures(company_name, include_archived, unit, snapshot_parts):
+    """The page's figures computed with pandas over the tenant's analytics snapshot.
+
+    ``snapshot_parts`` (the manifest's part list) is only part of the cache key. Adds time logged per
+    user and overdue work per assignee, which the live path doesn't compute.
+    """
+    frames, _ = load_snapshot(company_name)
+    tasks, subtasks, events = frames["tasks"], frames["subtasks"], frames["events"]
+    if not include_archived:
+        tasks = tasks[~tasks["archived"]]
+        subtasks = subtasks[subtasks["task_id"].isin(tasks["task_id"])]
+        events = events[events["task_id"].isin(tasks["task_id"])]
+
+    df_status = tasks.loc[tasks["status"].isin(TASK_STATUSES), "status"].value_counts().rename_axis("status").reset_index(name="count")
+    df_priority = tasks["priority"].value_counts().rename_axis("priority").reset_index(name="count")
+    df_user = _explode_counts(tasks, "assigned_to", "user").rename(columns={"count": "task_count"})
+
+    created = tasks["created_at"].dropna()
+    bin_size = _bucket_size(created.min(), created.max(), unit) if len(created) else 1
+    df_time = (_bucket_starts(created, unit, bin_size).value_counts().sort_index()
+               .rename_axis("task_creation_times").reset_index(name="task_count"))
+
+    linked = tasks[tasks["dependent_tasks"].map(len) > 0]
+    figures = _figures(df_status, df_priority, df_user, df_time, bin_size, unit, zip(linked["name"], linked["dependent_tasks"]))
+
+    # Time logged per person from the status history
+    df_minutes = events.groupby("updated_by", as_index=False)["minutes_worked"].sum()
+    df_minutes = df_minutes[df_minutes["minutes_worked"] > 0].assign(hours=lambda df: df["minutes_worked"] / 60)
+    figures["time_logged"] = px.bar(df_minutes.sort_values("hours", ascending=False), x="updated_by", y="hours",
+                                    title="Time Logged by User", labels={"updated_by": "user"})
+
+    # Open tasks and subtasks past their due date, per assignee
+    today = pd.Timestamp(start_of_today())
+    overdue_tasks = tasks[tasks["status"].isin(OPEN_STATUSES) & (tasks["due_date"] < today)]
+    overdue_subtasks = subtasks[subtasks["status"].isin(OPEN_STATUSES) & (subtasks["due_date"] < today)]
+    df_overdue = pd.concat([
+        _explode_counts(overdue_tasks, "assigned_to", "user").assign(kind="task"),
+        _explode_counts(overdue_subtasks, "assigned_to", "user").assign(kind="subtask"),
+    ], ignore_index=True)
+    figures["overdue"] = px.bar(df_overdue, x="user", y="count", color="kind", title="Overdue Work by Assignee",
+                                color_discrete_map={"task": "#F62817", "subtask": "#FA6C5C"})
+    return figures
@@ -1,9 +1,12 @@
 import streamlit as st
 from .database import get_users_collection
-from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, change_password, admin_user_exists, get_task_collection, get_user_names_from_emails
+from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, change_password, admin_user_exists, get_task_collection, get_user_names_from_emails, get_attention_summary, get_user_name_map, get_task, add_subtask, update_subtask_status, flash, WriteConflict, InvalidInput, TaskNotFound, status_author
+from .prefetch import prefetch
+from .pickers import user_picker
 from datetime import datetime
 from pymongo import DESCENDING
 import pytz
+import pandas as pd
 from bson import ObjectId
 import time
 
@@ -27,13 +30,19 @@ def display_task(task, email=None, company_name=None, is_admin=False, allow_stat
         "Low": "green"
     }
     
+    # Flags written by the background due-date scanner
+    attention_badge = {
+        "overdue": ' <span style="color:red">(overdue)</span>',
+        "due_soon": ' <span style="color:orange">(due soon)</span>'
+    }
+    
     # Fetch user names for assigned users and admins
-    assigned_to_names = get_user_names_from_emails(task['assigned_to'], company_name)
-    task_admin_names = get_user_names_from_emails(task.get('task_admin', []), company_name)
+    assigned_to_names = get_user_names_from_emails(task.assigned_to, company_name)
+    task_admin_names = get_user_names_from_emails(task.task_admin, company_name)
     
     col1, col2, col3, col4, col5, col6, col7, col8, col9 = st.columns([1, 3, 3, 1, 1, 1, 1, 2, 2])
     with col1:
-        truncated_name = truncate_text(task['name'], 30)
+        truncated_name = truncate_text(task.name, 30)
         st.markdown(f"**Task**: {truncated_name}")
     with col2:
         st.markdown(f"**Assigned to**: {', '.join(assigned_to_names)}")
@@ -41,22 +50,25 @@ def display_task(task, email=None, company_name=None, is_admin=False, allow_stat
         task_admin = ', '.join(task_admin_names) if task_admin_names else 'Not Set'
         st.markdown(f"**Admin**: {task_admin}")
     with col4:
-        st.markdown(f'**Status**: <p style="color:{status_color[task["status"]]}">{task["status"]}</p>', unsafe_allow_html=True)
+        st.markdown(f'**Status**: <p style="color:{status_color[task.status]}">{task.status}</p>', unsafe_allow_html=True)
+        rollup = task.rollup or {}
+        if rollup.get("progress") is not None:
+            st.progress(rollup["progress"] / 100, text=f"{rollup['subtasks_completed']}/{rollup['subtasks_total']} subtasks")
     with col5:
-        st.markdown(f'**Priority**: <p style="color:{priority_color[task["priority"]]}">{task["priority"]}</p>', unsafe_allow_html=True)
+        st.markdown(f'**Priority**: <p style="color:{priority_color[task.priority]}">{task.priority}</p>', unsafe_allow_html=True)
     with col6:
-        days_passed = (datetime.utcnow() - task['created_at']).days
+        days_passed = (datetime.utcnow() - task.created_at).days
         st.markdown(f"**Days passed**: {days_passed}")
     with col7:
-        due_date = task.get('due_date')
+        due_date = task.due_date
         if due_date:
             due_date_str = due_date.strftime('%Y-%m-%d')
-            st.markdown(f"**Due Date**: {due_date_str}")
+            st.markdown(f"**Due Date**: {due_date_str}{attention_badge.get(task.attention, '')}", unsafe_allow_html=True)
         else:
             st.markdown(f"**Due Date**: Not Set")
     if email:
         with col8:
-            unique_key = f"{task['_id']}-{email}-{task_index:05d}-{task['created_at'].isoformat()}"
+            unique_key = f"{task.id}-{email}-{task_index:05d}-{task.created_at.isoformat()}"
             view_update_btn = None
             try:
                 view_update_btn = st.button("View/Update", key=f"view-update-{unique_key}")
@@ -64,23 +76,132 @@ def display_task(task, email=None, company_name=None, is_admin=False, allow_stat
                 pass
             if view_update_btn:
                 st.write('## Clicked')
-                st.session_state.selected_task_id = str(task['_id'])
+                st.session_state.selected_task_id = str(task.id)
                 st.session_state.company_name = company_name
                 st.session_state.page = "Task Details"                
                 st.rerun()
         with col9:
-            unique_key = f"{task['_id']}-{email}-{task_index:05d}-{task['created_at'].isoformat()}"
+            unique_key = f"{task.id}-{email}-{task_index:05d}-{task.created_at.isoformat()}"
             view_subtasks_btn = None
             try:
                 view_subtasks_btn = st.button("View Subtasks", key=f"view-subtasks-{unique_key}")
             except:
                 pass
             if view_subtasks_btn:
-                st.session_state.selected_task_id = str(task['_id'])
+                st.session_state.selected_task_id = str(task.id)
                 st.session_state.company_name = company_name
                 st.session_state.page = "Subtask Details"
                 st.rerun()
 
+# Lists longer than this default to the table layout
+CARD_LAYOUT_MAX_TASKS = 25
+TABLE_PAGE_SIZE = 50
+
+def display_task_list(tasks, email, company_name, is_admin=False, allow_status_change=True, key="tasks", separators=False):
+    """Render a task list as cards (small lists) or as one paged table (large lists).
+
+    The table layout uses a fixed number of widgets per page regardless of list length.
+    """
+    layouts = ["Cards", "Table"]
+    default_layout = 1 if len(tasks) > CARD_LAYOUT_MAX_TASKS else 0
+    layout = st.radio("Layout", layouts, index=default_layout, horizontal=True, key=f"{key}-layout")
+
+    if layout == "Cards":
+        if separators:
+            st.write("---")
+        for idx, task in enumerate(tasks):
+            display_task(task, email, company_name, is_admin=is_admin, allow_status_change=allow_status_change, task_index=idx)
+            if separators:
+                st.write("---")
+    else:
+        display_task_table(tasks, company_name, key=key)
+
+def display_task_table(tasks, company_name, key="tasks"):
+    """Show one page of task summaries in a data editor; ticking Open or Subtasks navigates to that task."""
+    page_count = max(1, -(-len(tasks) // TABLE_PAGE_SIZE))
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key=f"{key}-page")
+    page_tasks = tasks[(page - 1) * TABLE_PAGE_SIZE:page * TABLE_PAGE_SIZE]
+
+    # Resolve every name on the page with one query instead of two per row
+    emails = [email for task in page_tasks for email in task.assigned_to + task.task_admin]
+    names = get_user_name_map(emails, company_name)
+    now = datetime.utcnow()
+    attention_labels = {"overdue": "Overdue", "due_soon": "Due soon"}
+
+    df = pd.DataFrame({
+        "Open": [False] * len(page_tasks),
+        "Subtasks": [False] * len(page_tasks),
+        "Task": [task.name for task in page_tasks],
+        "Assigned to": [', '.join(names[e] for e in task.assigned_to) for task in page_tasks],
+        "Admin": [', '.join(names[e] for e in task.task_admin) or 'Not Set' for task in page_tasks],
+        "Status": [task.status for task in page_tasks],
+        "Priority": [task.priority for task in page_tasks],
+        "Days passed": [(now - task.created_at).days for task in page_tasks],
+        "Due Date": [task.due_date.date() if task.due_date else None for task in page_tasks],
+        "Attention": [attention_labels.get(task.attention, '') for task in page_tasks],
+        "Progress": [(task.rollup or {}).get("progress") for task in page_tasks],
+        "Blocked until": [rollup_blocking_date(task.rollup) for task in page_tasks],
+    })
+    editor_key = f"{key}-table-{page}"
+    edited = st.data_editor(
+        df,
+        key=editor_key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=[column for column in df.columns if column not in ("Open", "Subtasks")],
+        column_config={
+            "Open": st.column_config.CheckboxColumn("Open", help="View/Update this task", width="small"),
+            "Subtasks": st.column_config.CheckboxColumn("Subtasks", help="View this task's subtasks", width="small"),
+            "Progress": st.column_config.ProgressColumn("Progress", help="Completed subtasks", format="%d%%", min_value=0, max_value=100),
+            "Blocked until": st.column_config.DateColumn("Blocked until", help="Earliest due date among the open tasks this one waits on"),
+        },
+    )
+
+    for column, page_name in [("Open", "Task Details"), ("Subtasks", "Subtask Details")]:
+        selected = edited.index[edited[column]].tolist()
+        if selected:
+            # Forget the tick so the table is clean when the user comes back
+            del st.session_state[editor_key]
+            st.session_state.selected_task_id = str(page_tasks[selected[0]].id)
+            st.session_state.company_name = company_name
+            st.session_state.page = page_name
+            st.rerun()
+
+CONFLICT_MESSAGE = "{} was changed by someone else while you had it open, so your update was not saved. This is the latest version."
+
+def shown_version(key, version):
+    """The version the form at ``key`` showed when it was submitted, i.e. the one drawn by the previous run.
+
+    Records ``version`` for the next run. A submit rerun re-reads the task first, so comparing against
+    that fresh read would miss edits made while the user was filling in the form.
+    """
+    shown = st.session_state.get(f"shown-version-{key}", version)
+    st.session_state[f"shown-version-{key}"] = version
+    return shown
+
+def rollup_blocking_date(rollup):
+    blocking_due_date = (rollup or {}).get("blocking_due_date")
+    return blocking_due_date.date() if blocking_due_date else None
+
+def format_minutes(minutes):
+    hours, minutes = divmod(int(minutes or 0), 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m"
+
+def display_attention_summary(email, company_name):
+    """Show the user's overdue / due-soon counts from the scanner's summary (one small read)."""
+    summary = get_attention_summary(email, company_name)
+    if not summary or not (summary.get("overdue_count") or summary.get("due_soon_count")):
+        return
+    st.warning(f"You have {summary.get('overdue_count', 0)} overdue and {summary.get('due_soon_count', 0)} due-soon tasks or subtasks.")
+    with st.expander("Show overdue and due-soon items", expanded=False):
+        for label, key in [("Overdue", "overdue"), ("Due soon", "due_soon")]:
+            for item in summary.get(key, []):
+                name = f"{item['parent_name']} / {item['name']}" if item.get("parent_name") else item["name"]
+                st.markdown(f"**{label}**: {name} (due {item['due_date'].strftime('%Y-%m-%d')})")
+        st.caption(f"Last checked {summary['scanned_at'].strftime('%Y-%m-%d %H:%M')} UTC")
+
 def display_task_details(email=None):
     st.subheader("Task Details")
 
@@ -89,12 +210,19 @@ def display_task_details(email=None):
         st.session_state.page = "Dashboard"
         st.experimental_rerun()
 
-    task = get_task_collection(st.session_state.company_name).find_one({"_id": ObjectId(st.session_state.selected_task_id)})
-    truncated_name = truncate_text(task['name'], 30)
+    tasks_collection = get_task_collection(st.session_state.company_name)
+    task_id = ObjectId(st.session_state.selected_task_id)
+    # These queries don't depend on each other, so fetch them together
+    prefetched = prefetch(
+        task=lambda: get_task(task_id, st.session_state.company_name),
+        user=lambda: get_users_collection().find_one({"email": email}, {"name": 1}),
+        dependent_tasks=lambda: list(tasks_collection.find({"depends_on": task_id}, {"name": 1, "assigned_to": 1})),
+    )
+    task = prefetched["task"]
+    truncated_name = truncate_text(task.name, 30)
 
-    user = get_users_collection().find_one({"email": email})
-    first_name = user['name'].split(' ')[0]
-    updated_by = f"{first_name} ({email})"
+    user = prefetched["user"]
+    updated_by = status_author(user['name'], email)
 
     with st.container():
         st.write('---')
@@ -110,68 +238,76 @@ def display_task_details(email=None):
             st.markdown("")
             st.markdown("**Dependent Tasks:**")
             st.markdown("**Due Date:**")
+            st.markdown("**Progress:**")
+            st.markdown("**Time logged:**")
+            st.markdown("**Blocked until:**")
         with col2:
-            st.markdown(f"{task['name']}")
-            st.markdown(f"{', '.join(task['assigned_to'])}")
+            st.markdown(f"{task.name}")
+            st.markdown(f"{', '.join(task.assigned_to)}")
             task_admin = task.get('task_admin', 'Not Set')
             st.markdown(f"{task_admin}")
             description_expander = st.expander("Description", expanded=False)
-            description_expander.markdown(f'<div style="height:250px; overflow:auto;border:1px solid black;padding:10px;">{task["description"]}</div>', unsafe_allow_html=True)
-            st.markdown(f"{task['status'].capitalize()}")
-            st.markdown(f"{task['priority']}")
+            description_expander.markdown(f'<div style="height:250px; overflow:auto;border:1px solid black;padding:10px;">{task.description}</div>', unsafe_allow_html=True)
+            st.markdown(f"{task.status.capitalize()}")
+            st.markdown(f"{task.priority}")
             dependent_tasks_expander = st.expander("Dependent Tasks", expanded=False)
-            if task["dependent_tasks"]:
-                dependent_tasks = get_task_collection(st.session_state.company_name).find({"name": {"$in": task["dependent_tasks"]}})
+            if task.dependent_tasks:
+                dependent_tasks = prefetched["dependent_tasks"]
                 dependent_tasks_info = [(t["name"], t["assigned_to"]) for t in dependent_tasks]
                 dependent_tasks_expander.markdown('<br>'.join(f'{name} (Assigned to: {assigned_to})' for name, assigned_to in dependent_tasks_info), unsafe_allow_html=True)
             else:
                 dependent_tasks_expander.markdown('No dependent tasks.')
-            due_date = task.get('due_date')
+            due_date = task.due_date
             if due_date:
                 st.markdown(f"{due_date.strftime('%Y-%m-%d')}")
             else:
                 st.markdown(f"Not Set")
+            rollup = task.rollup or {}
+            if rollup.get("progress") is not None:
+                st.progress(rollup["progress"] / 100, text=f"{rollup['subtasks_completed']} of {rollup['subtasks_total']} subtasks completed")
+            else:
+                st.markdown("No subtasks")
+            st.markdown(format_minutes(rollup.get("minutes_worked")) + " including subtasks")
+            blocking_date = rollup_blocking_date(rollup)
+            if blocking_date:
+                st.markdown(f"{blocking_date.strftime('%Y-%m-%d')} ({rollup['blocking_tasks']} open task(s) upstream)")
+            else:
+                st.markdown("Not blocked")
         st.write('---')
 
         st.subheader("Subtasks")
-        if task.get("subtasks"):
-            for idx, subtask in enumerate(task["subtasks"]):
-                display_subtask(subtask, task['_id'], idx, email)
+        for idx, subtask in enumerate(task.subtasks):
+            display_subtask(subtask, task.id, idx, email)
                 
-        user_mapping = {f"{user['name']} ({user['email']})": user['email'] for user in get_users_collection().find({"company_name": st.session_state.company_name})}
         subtask_name = st.text_input("Subtask Name", key="subtask_name")
         subtask_description = st.text_area("Subtask Description", key="subtask_description")
-        subtask_assigned_to_keys = st.multiselect("Assign Subtask To", list(user_mapping.keys()), key="subtask_assigned_to")
-        subtask_assigned_to = [user_mapping[key] for key in subtask_assigned_to_keys]
-        subtask_admin_keys = st.multiselect("Subtask Admin", list(user_mapping.keys()), key="subtask_admin")
-        subtask_admin = [user_mapping[key] for key in subtask_admin_keys]
+        subtask_assigned_to = user_picker("Assign Subtask To", st.session_state.company_name, key="subtask_assigned_to")
+        subtask_admin = user_picker("Subtask Admin", st.session_state.company_name, key="subtask_admin")
         subtask_due_date = st.date_input("Subtask Due Date", key="subtask_due_date", min_value=datetime.now().date())
         subtask_priority = st.selectbox("Subtask Priority", ["High", "Moderate", "Low"], key="subtask_priority")
         subtask_status = st.selectbox("Subtask Status", ["pending", "in progress", "completed", "cancelled"], key="subtask_status")
         create_subtask_btn = st.button("Create Subtask", key="create_subtask_btn")
 
         if create_subtask_btn:
-            subtask = {
-                "name": subtask_name,
-                "description": subtask_description,
-                "assigned_to": subtask_assigned_to,
-                "task_admin": subtask_admin,
-                "status": subtask_status,
-                "priority": subtask_priority,
-                "created_at": datetime.utcnow(),
-                "due_date": datetime.combine(subtask_due_date, datetime.min.time()),  # Convert to datetime
-                "parent_task_id": task["_id"],
-                "dependent_tasks": []
-            }
-            get_task_collection(st.session_state.company_name).update_one(
-                {"_id": task["_id"]},
-                {"$push": {"subtasks": subtask}}
-            )
-            st.success("Subtask created successfully!")
-            st.experimental_rerun()
+            try:
+                add_subtask(task.id, {
+                    "name": subtask_name,
+                    "description": subtask_description,
+                    "assigned_to": subtask_assigned_to,
+                    "task_admin": subtask_admin,
+                    "status": subtask_status,
+                    "priority": subtask_priority,
+                    "due_date": datetime.combine(subtask_due_date, datetime.min.time()),  # Convert to datetime
+                }, st.session_state.company_name)
+            except InvalidInput as e:
+                st.error(str(e))
+            else:
+                flash("Subtask created successfully!")
+                st.experimental_rerun()
 
-        if email and task["status"] not in ["completed", "cancelled"]:
-            unique_key = f"{task['_id']}-{email}"
+        if email and task.status not in ["completed", "cancelled"]:
+            unique_key = f"{task.id}-{email}"
+            expected_version = shown_version(unique_key, task.version)
             with st.form(key=f"update_form-{unique_key}", clear_on_submit=True):
                 row1_col1, row1_col2 = st.columns([2,2])
                 with row1_col1:
@@ -184,27 +320,36 @@ def display_task_details(email=None):
                 update_task_btn = st.form_submit_button("Update")
             
             if update_task_btn:
-                if not comment.strip() and minutes_worked != 0:
-                    st.error(f"Please provide a reason for updating the minutes worked.")
+                try:
+                    message = update_task_status(str(task.id), new_status, st.session_state.company_name, comment,
+                                                 minutes_worked, updated_by, expected_version=expected_version)
+                except InvalidInput as e:
+                    st.error(str(e))
+                except TaskNotFound:
+                    st.error("This task was deleted or archived and can no longer be updated.")
+                except WriteConflict:
+                    flash(CONFLICT_MESSAGE.format("This task"), "warning")
+                    st.experimental_rerun()
                 else:
-                    update_task_status(str(task["_id"]), new_status, st.session_state.company_name, comment.strip() if comment else None, minutes_worked, updated_by)
-                    if new_status != task["status"]:
-                        task["status"] = new_status
-                    st.success("Task updated successfully!")
-        elif task["status"] in ["completed", "cancelled"]:
+                    if message.startswith("Cannot"):
+                        st.error(message)
+                    else:
+                        flash("Task updated successfully!")
+                        st.experimental_rerun()
+        elif task.status in ["completed", "cancelled"]:
             st.info("This task is already completed or cancelled and cannot be updated.")
 
-    for status_update in task.get('status_updates', []):
+    for status_update in task.status_updates:
         with st.container():
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.markdown(f"**Comment**: {status_update['comment']}")
+                st.markdown(f"**Comment**: {status_update.comment}")
             with col2:
-                st.markdown(f"**Minutes Worked**: {status_update['minutes_worked']}")
+                st.markdown(f"**Minutes Worked**: {status_update.minutes_worked}")
             with col3:
-                st.markdown(f"**Time (IST)**: {status_update['timestamp'].astimezone(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %H:%M:%S')}")
+                st.markdown(f"**Time (IST)**: {status_update.timestamp.astimezone(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %H:%M:%S')}")
             with col4:
-                st.markdown(f"**Updated By**: {status_update['updated_by']}")
+                st.markdown(f"**Updated By**: {status_update.updated_by}")
             st.write('---')
             
 def display_subtask(subtask, parent_task_id, subtask_index, email):
@@ -220,10 +365,10 @@ def display_subtask(subtask, parent_task_id, subtask_index, email):
         "Low": "green"
     }
 
-    assigned_to_names = get_user_names_from_emails(subtask['assigned_to'], st.session_state.company_name)
-    task_admin_names = get_user_names_from_emails(subtask.get('task_admin', []), st.session_state.company_name)
+    assigned_to_names = get_user_names_from_emails(subtask.assigned_to, st.session_state.company_name)
+    task_admin_names = get_user_names_from_emails(subtask.task_admin, st.session_state.company_name)
 
-    st.markdown(f"### Subtask {subtask_index + 1}: {subtask['name']}")
+    st.markdown(f"### Subtask {subtask_index + 1}: {subtask.name}")
     col1, col2, col3, col4, col5, col6 = st.columns([3, 3, 2, 2, 1, 1])
     with col1:
         st.markdown(f"**Assigned to**: {', '.join(assigned_to_names)}")
@@ -231,11 +376,11 @@ def display_subtask(subtask, parent_task_id, subtask_index, email):
         subtask_admin = ', '.join(task_admin_names) if task_admin_names else 'Not Set'
         st.markdown(f"**Admin**: {subtask_admin}")
     with col3:
-        st.markdown(f'**Status**: <p style="color:{status_color[subtask["status"]]}">{subtask["status"]}</p>', unsafe_allow_html=True)
+        st.markdown(f'**Status**: <p style="color:{status_color[subtask.status]}">{subtask.status}</p>', unsafe_allow_html=True)
     with col4:
-        st.markdown(f'**Priority**: <p style="color:{priority_color[subtask["priority"]]}">{subtask["priority"]}</p>', unsafe_allow_html=True)
+        st.markdown(f'**Priority**: <p style="color:{priority_color[subtask.priority]}">{subtask.priority}</p>', unsafe_allow_html=True)
     with col5:
-        due_date = subtask.get('due_date')
+        due_date = subtask.due_date
         if due_date:
             due_date_str = due_date.strftime('%Y-%m-%d')
             st.markdown(f"**Due Date**: {due_date_str}")
@@ -244,34 +389,30 @@ def display_subtask(subtask, parent_task_id, subtask_index, email):
     with col6:
         st.empty()
 
-    unique_key = f"{parent_task_id}-{subtask['name']}-{email}-{subtask_index:05d}-{subtask['created_at'].isoformat()}"
+    unique_key = f"{parent_task_id}-{subtask.name}-{email}-{subtask_index:05d}-{subtask.created_at.isoformat()}"
+    expected_version = shown_version(unique_key, subtask.version)
     with st.form(key=f"update_subtask_form-{unique_key}", clear_on_submit=True):
         row1_col1, row1_col2 = st.columns([2,2])
         with row1_col1:
             status_options = ["Pending", "In Progress", "Completed", "Cancelled"]
-            selected_status = st.selectbox(f"Update status for {subtask['name']}", status_options, key=f"status-{unique_key}")
+            selected_status = st.selectbox(f"Update status for {subtask.name}", status_options, key=f"status-{unique_key}")
             new_status = selected_status.lower()
         with row1_col2:
             minutes_worked = st.number_input("Minutes worked", min_value=0, step=1, format="%i", key=f"minutes-{unique_key}")
-        comment = st.text_area(f"Add comment for {subtask['name']}:", key=f"comment-{unique_key}")
+        comment = st.text_area(f"Add comment for {subtask.name}:", key=f"comment-{unique_key}")
         update_subtask_btn = st.form_submit_button("Update Subtask")
     
     if update_subtask_btn:
-        if not comment.strip() and minutes_worked != 0:
-            st.error(f"Please provide a reason for updating the minutes worked.")
+        try:
+            update_subtask_status(parent_task_id, subtask.name, new_status, st.session_state.company_name, comment, minutes_worked,
+                                  subtask_id=subtask.id, expected_version=expected_version)
+        except InvalidInput as e:
+            st.error(str(e))
+        except WriteConflict:
+            flash(CONFLICT_MESSAGE.format(f"Subtask '{subtask.name}'"), "warning")
+            st.experimental_rerun()
         else:
-            subtask['status'] = new_status
-            subtask['minutes_worked'] = minutes_worked
-            subtask['comment'] = comment.strip() if comment else None
-            get_task_collection(st.session_state.company_name).update_one(
-                {"_id": parent_task_id, "subtasks.name": subtask['name']},
-                {"$set": {
-                    "subtasks.$.status": new_status,
-                    "subtasks.$.minutes_worked": minutes_worked,
-                    "subtasks.$.comment": comment.strip() if comment else None
-                }}
-            )
-            st.success(f"Subtask '{subtask['name']}' updated successfully!")
+            flash(f"Subtask '{subtask.name}' updated successfully!")
             st.experimental_rerun()
 
 def display_subtasks_details(email=None):
@@ -282,10 +423,10 @@ def display_subtasks_details(email=None):
         st.session_state.page = "Task Details"
         st.experimental_rerun()
 
-    task = get_task_collection(st.session_state.company_name).find_one({"_id": ObjectId(st.session_state.selected_task_id)})
+    task = get_task(st.session_state.selected_task_id, st.session_state.company_name)
     
-    if task.get("subtasks"):
-        for idx, subtask in enumerate(task["subtasks"]):
-            display_subtask(subtask, task['_id'], idx, email)
+    if task.subtasks:
+        for idx, subtask in enumerate(task.subtasks):
+            display_subtask(subtask, task.id, idx, email)
     else:
         st.info("No subtasks available.")
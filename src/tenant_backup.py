@@ -0,0 +1,314 @@
+# tenant_backup.py
+"""Per-tenant backup and restore.
+
+A backup is a directory holding ``manifest.json`` and, for every collection of the tenant's database
+plus its rows in ``global_users.users`` (stored as ``_users``), a series of gzip-compressed chunks of
+raw BSON documents. Documents are copied as the raw bytes the server sends, never decoded, and the
+collections are dumped in parallel from a secondary. Each collection's indexes are recorded in the
+manifest.
+
+A restore loads the chunks with unordered ``insert_many`` batches, again in parallel and without
+decoding, into staging collections (``_restore_<name>``) and builds their indexes there. Only once
+every collection has loaded are they renamed over the tenant's, so a corrupt chunk or a failed insert
+leaves the tenant as it was. It can restore under a new ``company_name``, which clones a project: user
+rows get the new name and fresh ids, the tenant database is created under the new name, and the
+``jobs`` collection is left out. Restoring over a tenant that has data requires ``--drop``. Its list
+views are then told about the replaced tasks (see ``snapshots.py``) and its analytics snapshot is
+discarded.
+
+    python -m src.tenant_backup backup --company My_Project --out backups/my_project
+    python -m src.tenant_backup restore --archive backups/my_project --as My_Project_Load_Test
+    python -m src.tenant_backup restore --archive backups/my_project --drop
+
+A backup is not a point-in-time snapshot across collections: writes made while it runs may be
+included in one collection and not another.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import bson
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from .database import get_db, get_users_collection, secondary_read_preference
+from .models import RAW_CODEC_OPTIONS
+from .helpers import get_task_collection, record_tombstones, bump_data_version, ensure_task_indexes, ensure_user_indexes
+from .analytics import _tenant_dir, ANALYTICS_DIR
+
+BACKUP_FORMAT = 1
+BACKUP_WORKERS = 4
+CHUNK_DOCUMENTS = 10000
+CHUNK_BYTES = 64 * 1024 * 1024
+COMPRESS_LEVEL = 4
+USERS = "_users"
+STAGING_PREFIX = "_restore_"
+CLONE_SKIPPED = {"jobs"}
+
+
+class _Progress:
+    """Thread-safe counters, printed at most every ``interval`` seconds and at the end."""
+
+    def __init__(self, label, totals, interval=2.0):
+        self.label = label
+        self.totals = totals
+        self.done = {name: 0 for name in totals}
+        self.bytes = 0
+        self.interval = interval
+        self.started = self.last_report = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, name, documents, size):
+        with self.lock:
+            self.done[name] += documents
+            self.bytes += size
+            now = time.perf_counter()
+            if now - self.last_report >= self.interval:
+                self.last_report = now
+                self._report()
+
+    def _report(self, final=False):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        parts = [f"{name} {self.done[name]}" + (f"/{self.totals[name]}" if self.totals[name] is not None else "") for name in self.done]
+        print(f"{self.label}{' done' if final else ''}: {', '.join(parts)} | {self.bytes / 1024 / 1024:.1f} MiB in {elapsed:.1f}s "
+              f"({self.bytes / 1024 / 1024 / elapsed:.1f} MiB/s)", flush=True)
+
+    def finish(self):
+        with self.lock:
+            self._report(final=True)
+
+
+def _chunk_path(archive, name, chunk):
+    return os.path.join(archive, name, f"chunk-{chunk:06d}.bson.gz")
+
+
+def _dump(collection, query, archive, name, progress, compress_level):
+    """Write ``collection``'s documents matching ``query`` as chunks; returns (documents, bytes, chunks)."""
+    os.makedirs(os.path.join(archive, name), exist_ok=True)
+    cursor = collection.with_options(codec_options=RAW_CODEC_OPTIONS, read_preference=secondary_read_preference()).find(
+        query, batch_size=1000)
+    documents = size = chunks = 0
+    chunk_documents = chunk_bytes = 0
+    out = None
+    try:
+        for document in cursor:
+            if out is None or chunk_documents >= CHUNK_DOCUMENTS or chunk_bytes >= CHUNK_BYTES:
+                if out is not None:
+                    out.close()
+                    progress.add(name, chunk_documents, chunk_bytes)
+                out = gzip.open(_chunk_path(archive, name, chunks), "wb", compresslevel=compress_level)
+                chunks += 1
+                chunk_documents = chunk_bytes = 0
+            raw = document.raw
+            out.write(raw)
+            chunk_documents += 1
+            chunk_bytes += len(raw)
+            documents += 1
+            size += len(raw)
+    finally:
+        if out is not None:
+            out.close()
+            progress.add(name, chunk_documents, chunk_bytes)
+    return documents, size, chunks
+
+
+def _index_specs(collection):
+    specs = []
+    for name, info in collection.index_information().items():
+        if name == "_id_":
+            continue
+        spec = {"name": name, "key": [list(key) for key in info["key"]]}
+        for option in ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression"):
+            if option in info:
+                spec[option] = info[option]
+        specs.append(spec)
+    return specs
+
+
+def backup_tenant(company_name, archive, workers=BACKUP_WORKERS, compress_level=COMPRESS_LEVEL):
+    """Write ``company_name``'s database and user rows to the directory ``archive``. Returns the manifest."""
+    if os.path.exists(os.path.join(archive, "manifest.json")):
+        raise SystemExit(f"{archive} already holds a backup")
+    os.makedirs(archive, exist_ok=True)
+    db = get_db(company_name)
+    names = sorted(name for name in db.list_collection_names() if not name.startswith(STAGING_PREFIX))
+    sources = {name: (db[name], {}) for name in names}
+    sources[USERS] = (get_users_collection(), {"company_name": company_name})
+    progress = _Progress(f"Backup of {company_name}", {name: None for name in sources})
+
+    def dump(name):
+        collection, query = sources[name]
+        documents, size, chunks = _dump(collection, query, archive, name, progress, compress_level)
+        return {"documents": documents, "bytes": size, "chunks": chunks,
+                "indexes": _index_specs(collection) if name != USERS else []}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup") as executor:
+        results = dict(zip(sources, executor.map(dump, sources)))
+    progress.finish()
+
+    manifest = {"format": BACKUP_FORMAT, "company_name": company_name, "created_at": datetime.utcnow().isoformat(),
+                "collections": results}
+    with open(os.path.join(archive, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _read_chunk(archive, name, chunk):
+    with gzip.open(_chunk_path(archive, name, chunk), "rb") as f:
+        data = f.read()
+    return bson.decode_all(data, RAW_CODEC_OPTIONS), len(data)
+
+
+def _insert(collection, documents):
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        raise SystemExit(f"Restoring {collection.name} failed: {e.details['writeErrors'][0]['errmsg']}")
+
+
+def _staging_name(name, target):
+    # Users live in the shared global_users database, so their staging collection is per tenant
+    return STAGING_PREFIX + (target if name == USERS else name)
+
+
+def _staging_database(name, target):
+    return get_users_collection().database if name == USERS else get_db(target)
+
+
+def _restore_collection(archive, name, info, target, progress):
+    """Load ``name`` into its staging collection, which replaces the tenant's once every collection has loaded."""
+    collection = _staging_database(name, target)[_staging_name(name, target)]
+    for chunk in range(info["chunks"]):
+        documents, size = _read_chunk(archive, name, chunk)
+        if name == USERS:
+            # Users live in one shared collection: a clone needs its own ids and company name
+            documents = [{**bson.decode(document.raw), "_id": ObjectId(), "company_name": target} for document in documents]
+        if documents:
+            _insert(collection, documents)
+        progress.add(name, len(documents), size)
+    for spec in info["indexes"]:
+        options = {key: value for key, value in spec.items() if key not in ("key", "name")}
+        collection.create_index([tuple(key) for key in spec["key"]], name=spec["name"], **options)
+
+
+def _drop_staging(target):
+    """Drop the staging collections of a failed or interrupted restore into ``target``."""
+    db = get_db(target)
+    for name in db.list_collection_names():
+        if name.startswith(STAGING_PREFIX):
+            db.drop_collection(name)
+    get_users_collection().database.drop_collection(_staging_name(USERS, target))
+
+
+def _has_data(target):
+    db = get_db(target)
+    return (any(db[name].find_one({}, {"_id": 1}) for name in db.list_collection_names() if not name.startswith(STAGING_PREFIX))
+            or get_users_collection().find_one({"company_name": target}, {"_id": 1}) is not None)
+
+
+def _swap_in(target, names):
+    """Move the staged collections over the tenant's and drop the ones the backup doesn't have."""
+    db = get_db(target)
+    for name in names:
+        if name != USERS:
+            db[_staging_name(name, target)].rename(name, dropTarget=True)
+    for name in db.list_collection_names():
+        if name not in names and not name.startswith(STAGING_PREFIX):
+            db.drop_collection(name)
+    # The shared users collection can't be renamed over: add the restored rows, then remove the old ones
+    users = get_users_collection()
+    previous_user_ids = [user["_id"] for user in users.find({"company_name": target}, {"_id": 1})]
+    if USERS in names:
+        staged = users.database[_staging_name(USERS, target)]
+        batch = []
+        for user in staged.find({}):
+            batch.append(user)
+            if len(batch) >= CHUNK_DOCUMENTS:
+                _insert(users, batch)
+                batch = []
+        if batch:
+            _insert(users, batch)
+        staged.drop()
+    for start in range(0, len(previous_user_ids), CHUNK_DOCUMENTS):
+        users.delete_many({"_id": {"$in": previous_user_ids[start:start + CHUNK_DOCUMENTS]}})
+
+
+def _announce_replacement(target, previous_task_ids):
+    """Make incremental readers see the restore: restamp every task and tombstone the ones that are gone."""
+    tasks = get_task_collection(target)
+    tasks.update_many({}, {"$currentDate": {"updated_at": True}})
+    gone = []
+    for start in range(0, len(previous_task_ids), CHUNK_DOCUMENTS):
+        batch = previous_task_ids[start:start + CHUNK_DOCUMENTS]
+        present = {task["_id"] for task in tasks.find({"_id": {"$in": batch}}, {"_id": 1})}
+        gone.extend(task_id for task_id in batch if task_id not in present)
+    record_tombstones(gone, target, "deleted")
+    shutil.rmtree(_tenant_dir(target, ANALYTICS_DIR), ignore_errors=True)
+
+
+def restore_tenant(archive, target=None, drop=False, workers=BACKUP_WORKERS):
+    """Load the backup in ``archive`` as tenant ``target`` (default: the tenant it was taken from)."""
+    with open(os.path.join(archive, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BACKUP_FORMAT:
+        raise SystemExit(f"Unsupported backup format {manifest.get('format')}")
+    target = target or manifest["company_name"]
+    previous_task_ids = None
+    if _has_data(target):
+        if not drop:
+            raise SystemExit(f"{target} already has data; pass --drop to replace it")
+        previous_task_ids = [task["_id"] for task in get_task_collection(target).find({}, {"_id": 1})]
+
+    collections = manifest["collections"]
+    if target != manifest["company_name"]:
+        # A clone starts without the source's jobs: they point at its uploads and would run again
+        collections = {name: info for name, info in collections.items() if name not in CLONE_SKIPPED}
+    progress = _Progress(f"Restore of {manifest['company_name']} as {target}", {name: info["documents"] for name, info in collections.items()})
+    _drop_staging(target)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="restore") as executor:
+            # Largest first, so the longest load starts straight away
+            order = sorted(collections, key=lambda name: collections[name]["bytes"], reverse=True)
+            list(executor.map(lambda name: _restore_collection(archive, name, collections[name], target, progress), order))
+    except BaseException:
+        # The tenant's own collections haven't been touched yet
+        _drop_staging(target)
+        raise
+    progress.finish()
+    _swap_in(target, collections)
+
+    # Indexes added since the backup was taken
+    ensure_user_indexes()
+    ensure_task_indexes(target)
+    if previous_task_ids is not None:
+        _announce_replacement(target, previous_task_ids)
+    bump_data_version(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up, restore or clone one tenant (project).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup = commands.add_parser("backup", help="Write a tenant's database and user rows to a backup directory")
+    backup.add_argument("--company", required=True, help="Tenant (project) name")
+    backup.add_argument("--out", required=True, help="Directory to create")
+    backup.add_argument("--compress-level", type=int, default=COMPRESS_LEVEL, help="gzip level, 1 (fastest) to 9")
+    backup.add_argument("--workers", type=int, default=BACKUP_WORKERS)
+    restore = commands.add_parser("restore", help="Load a backup directory")
+    restore.add_argument("--archive", required=True, help="Backup directory")
+    restore.add_argument("--as", dest="target", help="Restore under this company name (default: the original)")
+    restore.add_argument("--drop", action="store_true", help="Replace the target tenant's existing data")
+    restore.add_argument("--workers", type=int, default=BACKUP_WORKERS)
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        backup_tenant(args.company, args.out, workers=args.workers, compress_level=args.compress_level)
+    else:
+        restore_tenant(args.archive, args.target, drop=args.drop, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import streamlit as st
 from .database import get_users_collection
-from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, change_password, admin_user_exists, load_lottie_file, get_task_collection
+from .helpers import create_new_user, create_task, find_tasks_by_status, update_task_status, login, change_password, admin_user_exists, load_lottie_file, my_work_query, split_my_work
 from datetime import datetime
 from pymongo import DESCENDING
-from .tasks import display_task
+from .tasks import display_task_list, display_attention_summary
+from .snapshots import snapshot_tasks
+from .portfolio import display_portfolio
 from streamlit_lottie import st_lottie
 import json
 
@@ -12,7 +14,7 @@ def display_user_dashboard(name):
     st.sidebar.write(f"**Welcome, {name}!**")
 
     # Add a selectbox for the navigation menu with emojis
-    menu = ["📋 My Tasks", "👤 Profile"]
+    menu = ["📋 My Tasks", "🗂️ Portfolio", "👤 Profile"]
     choice = st.sidebar.selectbox("Menu", menu, key='user_dashboard_menu')
 
     if choice == "📋 My Tasks":
@@ -28,39 +30,43 @@ def display_user_dashboard(name):
         #         if not (hide_completed_tasks and task["status"] == "completed"):
         #             display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=False, allow_status_change=True, task_index=idx)
         
-        tabs = st.tabs(["Assigned Tasks", "Admin Tasks"])
+        display_attention_summary(st.session_state.user.email, st.session_state.company_name)
+
+        # Both tabs come from one query; the checkboxes below keep their values in session state,
+        # so their current values are known before they are drawn
+        hide_completed_assigned = st.session_state.get("user_hide_completed", True)
+        hide_completed_admin = st.session_state.get("user_hide_completed_admin", True)
+        email = st.session_state.user.email
+        # Kept for the session and patched with just the tasks changed since the last refresh
+        tasks = snapshot_tasks("my_work", my_work_query(email, hide_completed_assigned, hide_completed_admin), st.session_state.company_name)
+        assigned_tasks, admin_tasks = split_my_work(tasks, email, hide_completed_assigned, hide_completed_admin)
+
+        tabs = st.tabs([f"Assigned Tasks ({len(assigned_tasks)})", f"Admin Tasks ({len(admin_tasks)})"])
 
         with tabs[0]:
             st.header("Assigned Tasks")
-            hide_completed_tasks = st.checkbox("Hide completed tasks", key="user_hide_completed", value=True)
+            st.checkbox("Hide completed tasks", key="user_hide_completed", value=True)
 
-            # Fetch tasks where the user is assigned
-            tasks = list(get_task_collection(st.session_state.company_name).find({
-                "assigned_to": st.session_state.user["email"]
-            }))
+            tasks = assigned_tasks
 
             if len(tasks) == 0:
                 st.info("No tasks assigned to you.")
             else:
-                for idx, task in enumerate(tasks):
-                    if not (hide_completed_tasks and task["status"] == "completed"):
-                        display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=False, allow_status_change=True, task_index=idx)
+                display_task_list(tasks, st.session_state.user.email, st.session_state.company_name, is_admin=False, allow_status_change=True, key="user-assigned-tasks")
 
         with tabs[1]:
             st.header("Admin Tasks")
-            hide_completed_tasks = st.checkbox("Hide completed tasks", key="user_hide_completed_admin", value=True)
+            st.checkbox("Hide completed tasks", key="user_hide_completed_admin", value=True)
 
-            # Fetch tasks where the user is an admin
-            tasks = list(get_task_collection(st.session_state.company_name).find({
-                "task_admin": st.session_state.user["email"]
-            }))
+            tasks = admin_tasks
 
             if len(tasks) == 0:
                 st.info("No tasks where you are the admin.")
             else:
-                for idx, task in enumerate(tasks):
-                    if not (hide_completed_tasks and task["status"] == "completed"):
-                        display_task(task, st.session_state.user["email"], st.session_state.company_name, is_admin=True, allow_status_change=True, task_index=idx)
+                display_task_list(tasks, st.session_state.user.email, st.session_state.company_name, is_admin=True, allow_status_change=True, key="user-admin-tasks")
+
+    elif choice == "🗂️ Portfolio":
+        display_portfolio(st.session_state.user.email)
 
     elif choice == "👤 Profile":
         st.subheader("User Profile")
@@ -71,10 +77,10 @@ def display_user_dashboard(name):
         # Display user details in the second column
         with col2:
             st.markdown("### Personal Information")
-            st.write(f"**Name:** {st.session_state.user['name']}")
-            st.write(f"**Email:** {st.session_state.user['email']}")
+            st.write(f"**Name:** {st.session_state.user.name}")
+            st.write(f"**Email:** {st.session_state.user.email}")
             st.write(f"**Company Name:** {st.session_state.company_name}")
-            st.write(f"**Role:** {st.session_state.user['role']}")
+            st.write(f"**Role:** {st.session_state.user.role}")
 
             # Display password change section
             change_password_btn = st.button("🔒 Change Password")
@@ -90,7 +96,7 @@ def display_user_dashboard(name):
                     reset_password_btn = st.form_submit_button(label='Reset Password')  # Use form submit button here
 
                     if reset_password_btn:  # This will only be True when the form submit button is clicked
-                        success, message = change_password(st.session_state.user['email'], current_password, new_password, confirm_password)
+                        success, message = change_password(st.session_state.user.email, current_password, new_password, confirm_password)
                         if success:
                             st.success(message)
                             st.session_state['show_change_password_form'] = False  # Hide the form after successful submission
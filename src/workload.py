@@ -0,0 +1,179 @@
+# workload.py
+"""Per-user workload forecast.
+
+For every project user: the open tasks and subtasks assigned to them, bucketed by the week they are
+due and weighted by priority (overdue work counts double, in the current week), next to their
+throughput over the last HISTORY_WEEKS weeks of status history: hours logged and items completed per
+week, and how many weeks their open work would take at that pace.
+
+The inputs are the tenant's analytics snapshot when it has one, cached per snapshot; otherwise a
+projected fetch of only the fields needed (open tasks, their open subtasks and the recent status
+updates, unwound on the server) from a secondary, cached per data version. Everything after the fetch
+is column operations over the whole tenant: explode the assignee lists, map priorities to weights,
+bucket due dates into weeks and pivot users by weeks.
+"""
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from .database import get_users_collection
+from .helpers import get_read_task_collection, get_data_version, start_of_today, OPEN_STATUSES
+from .analytics import read_manifest, load_snapshot
+
+FORECAST_WEEKS = 8
+HISTORY_WEEKS = 8
+PRIORITY_WEIGHTS = {"High": 3, "Moderate": 2, "Low": 1}
+OVERDUE_WEIGHT = 2
+LATER, NO_DUE_DATE = "Later", "No due date"
+HEATMAP_USERS = 30
+
+_ITEM_COLUMNS = ["assigned_to", "priority", "due_date", "kind"]
+_EVENT_COLUMNS = ["updated_by", "status", "timestamp", "minutes_worked"]
+# "First (email)" from the UI, a bare email from the API; "System" and other non-emails are dropped
+_EMAIL = r"\(([^()\s]+@[^()\s]+)\)\s*$"
+
+
+def _live_frames(company_name, since):
+    """Open work and status updates since ``since``, projected and unwound on the server."""
+    tasks = get_read_task_collection(company_name)
+    open_statuses = {"$in": OPEN_STATUSES}
+    open_tasks = pd.DataFrame(list(tasks.find(
+        {"status": open_statuses}, {"_id": 0, "assigned_to": 1, "priority": 1, "due_date": 1})), columns=_ITEM_COLUMNS[:3])
+    open_subtasks = pd.DataFrame(list(tasks.aggregate([
+        {"$match": {"status": open_statuses, "subtasks.status": open_statuses}},
+        {"$unwind": "$subtasks"},
+        {"$match": {"subtasks.status": open_statuses}},
+        {"$project": {"_id": 0, "assigned_to": "$subtasks.assigned_to", "priority": "$subtasks.priority", "due_date": "$subtasks.due_date"}},
+    ])), columns=_ITEM_COLUMNS[:3])
+    # Every status update stamps updated_at, so its index finds the tasks with recent history
+    recent_updates = [
+        {"$match": {"updated_at": {"$gte": since}}},
+        {"$unwind": "$status_updates"},
+        {"$match": {"status_updates.timestamp": {"$gte": since}}},
+        {"$project": {"_id": 0, **{column: f"$status_updates.{column}" for column in _EVENT_COLUMNS}}},
+    ]
+    events = pd.DataFrame(list(tasks.aggregate(
+        recent_updates + [{"$unionWith": {"coll": "tasks_archive", "pipeline": recent_updates}}])), columns=_EVENT_COLUMNS)
+    return open_tasks, open_subtasks, events
+
+
+def _snapshot_frames(company_name, since):
+    frames, _ = load_snapshot(company_name)
+    tasks, subtasks, events = frames["tasks"], frames["subtasks"], frames["events"]
+    open_tasks = tasks[tasks["status"].isin(OPEN_STATUSES)]
+    open_subtasks = subtasks[subtasks["status"].isin(OPEN_STATUSES) & subtasks["task_id"].isin(open_tasks["task_id"])]
+    return open_tasks, open_subtasks, events[events["timestamp"] >= since]
+
+
+def _week_labels(this_week, weeks):
+    return ["This week"] + [f"Week of {this_week + timedelta(weeks=week):%b %d}" for week in range(1, weeks)]
+
+
+def compute_workload(open_tasks, open_subtasks, events, users, today, weeks=FORECAST_WEEKS, history_weeks=HISTORY_WEEKS):
+    """One row per user (``users`` maps emails to names), sorted by weighted load.
+
+    ``open_tasks`` and ``open_subtasks`` need assigned_to (a list of emails), priority and due_date;
+    ``events`` needs updated_by, status, timestamp and minutes_worked.
+    """
+    today = pd.Timestamp(today)
+    # Weeks start on Sunday, as on Task Statistics
+    this_week = today - pd.Timedelta(days=(today.dayofweek + 1) % 7)
+    week_labels = _week_labels(this_week, weeks)
+
+    items = pd.concat([
+        open_tasks[_ITEM_COLUMNS[:3]].assign(kind="task"),
+        open_subtasks[_ITEM_COLUMNS[:3]].assign(kind="subtask"),
+    ], ignore_index=True).explode("assigned_to")
+    items = items[items["assigned_to"].isin(users.keys())]
+    due = pd.to_datetime(items["due_date"])
+    overdue = (due < today).to_numpy()
+    week = ((due - this_week).dt.days // 7).clip(lower=0).to_numpy()
+    bucket = np.select([due.isna().to_numpy(), week >= weeks], [NO_DUE_DATE, LATER],
+                       default=np.array(week_labels, dtype=object)[np.nan_to_num(np.minimum(week, weeks - 1)).astype(int)])
+    weight = items["priority"].map(PRIORITY_WEIGHTS).fillna(1).to_numpy() * np.where(overdue, OVERDUE_WEIGHT, 1)
+    items = items.assign(bucket=bucket, weight=weight, overdue=overdue)
+
+    grouped = items.groupby("assigned_to")
+    counts = items.groupby(["assigned_to", "kind"]).size().unstack(fill_value=0).reindex(columns=["task", "subtask"], fill_value=0)
+    load = items.groupby(["assigned_to", "bucket"])["weight"].sum().unstack(fill_value=0)
+    summary = pd.DataFrame({
+        "Open tasks": counts["task"],
+        "Open subtasks": counts["subtask"],
+        "Overdue": grouped["overdue"].sum(),
+        "Weighted load": grouped["weight"].sum(),
+    }).join(load.reindex(columns=week_labels + [LATER, NO_DUE_DATE], fill_value=0))
+
+    updated_by = events["updated_by"].astype("string")
+    events = events.assign(user=updated_by.str.extract(_EMAIL, expand=False).fillna(updated_by))
+    events = events[events["user"].isin(users.keys())]
+    history = pd.DataFrame({
+        "Hours/week": events.groupby("user")["minutes_worked"].sum() / 60 / history_weeks,
+        "Completed/week": events[events["status"] == "completed"].groupby("user").size() / history_weeks,
+    })
+
+    workload = summary.join(history, how="outer").reindex(list(users.keys())).fillna(0)
+    workload = workload.astype({**{column: int for column in ["Open tasks", "Open subtasks", "Overdue"]},
+                                **{column: float for column in ["Hours/week", "Completed/week"]}})
+    pace = workload["Completed/week"].replace(0, np.nan)
+    workload["Weeks to clear"] = (workload["Open tasks"] + workload["Open subtasks"]) / pace
+    workload.insert(0, "Name", workload.index.map(users))
+    return workload.rename_axis("Email").sort_values(["Weighted load", "Overdue"], ascending=False)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_workload(company_name, source, version, today):
+    """The tenant's workload table. ``version`` (snapshot parts or data version) is only part of the cache key."""
+    since = today - timedelta(weeks=HISTORY_WEEKS)
+    open_tasks, open_subtasks, events = (_snapshot_frames if source == "snapshot" else _live_frames)(company_name, since)
+    users = {user["email"]: user.get("name", user["email"])
+             for user in get_users_collection().find({"company_name": company_name}, {"_id": 0, "email": 1, "name": 1})}
+    return compute_workload(open_tasks, open_subtasks, events, users, today)
+
+
+def get_workload(company_name):
+    """``(workload, manifest)``; ``manifest`` is None when the table comes from the live database."""
+    manifest = read_manifest(company_name)
+    if manifest is not None:
+        return build_workload(company_name, "snapshot", tuple(manifest["parts"]), start_of_today()), manifest
+    return build_workload(company_name, "live", get_data_version(company_name), start_of_today()), None
+
+
+def _number_columns(workload):
+    columns = {column: st.column_config.NumberColumn(format="%.1f") for column in ["Hours/week", "Completed/week", "Weeks to clear"]}
+    columns["Weighted load"] = st.column_config.ProgressColumn(format="%d", min_value=0, max_value=max(1, int(workload["Weighted load"].max() or 0)))
+    return columns
+
+
+def display_assignee_load(emails, company_name):
+    """Compact load of the users picked in an "Assign To" field."""
+    if not emails:
+        return
+    workload, _ = get_workload(company_name)
+    picked = workload.reindex([email for email in emails if email in workload.index])
+    if len(picked):
+        st.dataframe(picked[["Name", "Open tasks", "Open subtasks", "Overdue", "This week", "Weighted load", "Weeks to clear"]],
+                     column_config=_number_columns(workload), use_container_width=True)
+
+
+def display_workload(company_name):
+    st.subheader("Workload")
+    workload, manifest = get_workload(company_name)
+    if manifest is not None:
+        st.caption(f"Open work as of {manifest['snapshot_at']:%Y-%m-%d %H:%M} UTC. Changes made since then appear with the next snapshot.")
+    else:
+        st.caption("No analytics snapshot yet: computed from the live database.")
+    st.caption(f"Load weighs priorities {', '.join(f'{priority} {weight}' for priority, weight in PRIORITY_WEIGHTS.items())}; "
+               f"overdue work counts {OVERDUE_WEIGHT}x, in this week. Throughput is averaged over the last {HISTORY_WEEKS} weeks.")
+
+    search = st.text_input("Filter by name or email", key="workload_filter").strip().lower()
+    if search:
+        matches = workload.index.str.lower().str.contains(search, regex=False) | workload["Name"].str.lower().str.contains(search, regex=False)
+        workload = workload[matches]
+    st.dataframe(workload, column_config=_number_columns(workload), use_container_width=True)
+
+    busiest = workload[workload["Weighted load"] > 0].head(HEATMAP_USERS)
+    if len(busiest):
+        heatmap = busiest.set_index("Name").loc[:, "This week":LATER]
+        st.plotly_chart(px.imshow(heatmap, aspect="auto", color_continuous_scale="Reds", labels={"color": "weighted load"},
+                                  title=f"Weighted Load by Week (top {len(busiest)})"), config={'displayModeBar': False})
@@ -0,0 +1,20 @@
+"""Test setup shared by the test modules.
+
+The app modules read ``st.secrets`` when they are imported, and Streamlit looks for ``secrets.toml``
+only in ``~/.streamlit`` and in the working directory's ``.streamlit``. Without either, the tests run
+from a temporary directory holding one that selects the SQLite backend; the ``company`` fixture in
+``test_app_backends.py`` then points the app at the backend each test runs on.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if not any(os.path.exists(os.path.join(base, ".streamlit", "secrets.toml")) for base in (os.path.expanduser("~"), os.getcwd())):
+    _directory = tempfile.mkdtemp(prefix="project-management-tests-")
+    os.makedirs(os.path.join(_directory, ".streamlit"))
+    with open(os.path.join(_directory, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f'STORAGE_BACKEND = "sqlite"\nSQLITE_PATH = "{os.path.join(_directory, "app.sqlite3")}"\n')
+    os.chdir(_directory)
@@ -0,0 +1,166 @@
+"""The app's helpers on both storage backends.
+
+``test_storage_backends.py`` checks the collection API; these tests run the helpers that depend on the
+features the SQLite backend emulates ($graphLookup, $unionWith, $facet, $dateTrunc, transactions,
+array_filters, versioned updates) through ``database.client``, on SQLite and, with ``TEST_MONGO_URI``
+set, on MongoDB.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+
+pytest.importorskip("streamlit")
+
+from src import database, offboarding  # noqa: E402
+from src.helpers import (get_task_collection, get_archive_collection, get_task, refresh_task_rollups, find_tasks_matching,  # noqa: E402
+                         update_task_status, update_subtask_status, WriteConflict)
+from src.sqlite_backend import SQLiteClient, _date_trunc  # noqa: E402
+from src.task_statistics import task_counts, build_statistics_figures, _bucket_size, _bucket_starts  # noqa: E402
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def company(request, tmp_path, monkeypatch):
+    """A fresh tenant on the backend under test, which ``database.client`` points at."""
+    if request.param == "sqlite":
+        client = SQLiteClient(str(tmp_path / "app.sqlite3"))
+    else:
+        uri = os.environ.get("TEST_MONGO_URI")
+        if not uri:
+            pytest.skip("TEST_MONGO_URI is not set")
+        client = MongoClient(uri)
+    monkeypatch.setattr(database, "client", client)
+    monkeypatch.setattr(offboarding, "client", client)
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    yield name
+    client.drop_database(name)
+    client["global_users"].users.delete_many({"company_name": name})
+    client.close()
+
+
+def _task(name, **fields):
+    return {"_id": ObjectId(), "name": name, "status": "pending", "priority": "Low", "assigned_to": [], "task_admin": [],
+            "created_at": datetime(2024, 1, 1), "due_date": None, "depends_on": None, "dependent_tasks": [], "subtasks": [],
+            "status_updates": [], "version": 0, **fields}
+
+
+def test_rollups_follow_open_dependencies(company):
+    tasks = get_task_collection(company)
+    root = _task("root", due_date=datetime(2024, 3, 1))
+    closed = _task("closed", status="completed", due_date=datetime(2024, 1, 15))
+    middle = _task("middle", depends_on=root["_id"], due_date=datetime(2024, 4, 1))
+    leaf = _task("leaf", depends_on=middle["_id"], subtasks=[
+        {"name": "a", "status": "completed", "minutes_worked": 30},
+        {"name": "b", "status": "pending", "minutes_worked": 15},
+        {"name": "c", "status": "cancelled"},
+    ], status_updates=[{"status": "pending", "minutes_worked": 45}])
+    after_closed = _task("after closed", depends_on=closed["_id"])
+    tasks.insert_many([root, closed, middle, leaf, after_closed])
+
+    assert refresh_task_rollups(None, company) == 5
+    rollup = get_task(leaf["_id"], company).rollup
+    assert (rollup["blocking_tasks"], rollup["blocking_due_date"]) == (2, datetime(2024, 3, 1))
+    assert (rollup["subtasks_total"], rollup["subtasks_completed"], rollup["progress"], rollup["minutes_worked"]) == (2, 1, 50, 90)
+    assert get_task(after_closed["_id"], company).rollup["blocking_tasks"] == 0
+
+    tasks.update_one({"_id": root["_id"]}, {"$set": {"status": "completed"}})
+    refresh_task_rollups([root["_id"]], company, include_dependents=True)
+    rollup = get_task(leaf["_id"], company).rollup
+    assert (rollup["blocking_tasks"], rollup["blocking_due_date"]) == (1, datetime(2024, 4, 1))
+
+
+def test_lists_and_counts_include_the_archive(company):
+    hot = [_task("open", assigned_to=["ada@x.com"], created_at=datetime(2024, 1, 2)),
+           _task("blocked", priority="High", assigned_to=["ada@x.com", "bob@x.com"], created_at=datetime(2024, 1, 3))]
+    archived = _task("old", status="completed", assigned_to=["bob@x.com"], created_at=datetime(2023, 12, 1))
+    get_task_collection(company).insert_many(hot)
+    get_archive_collection(company).insert_one(archived)
+
+    assert [task.name for task in find_tasks_matching({}, company)] == ["open", "blocked"]
+    listed = find_tasks_matching({"assigned_to": "bob@x.com"}, company, include_archived=True)
+    assert [(task.name, task.archived) for task in listed] == [("old", True), ("blocked", False)]
+    newest = find_tasks_matching({}, company, include_archived=True, newest_first=True, skip=1, limit=1)
+    assert [task.name for task in newest] == ["open"]
+
+    counts = task_counts(company, include_archived=True)
+    assert {row["_id"]: row["count"] for row in counts["status"]} == {"pending": 2, "completed": 1}
+    assert {row["_id"]: row["count"] for row in counts["users"]} == {"ada@x.com": 2, "bob@x.com": 2}
+    assert (counts["span"][0]["first"], counts["span"][0]["last"]) == (datetime(2023, 12, 1), datetime(2024, 1, 3))
+    assert {row["_id"]: row["count"] for row in task_counts(company)["status"]} == {"pending": 2}
+
+
+def test_statistics_bins_match_the_snapshot_bins(company):
+    import pandas as pd
+
+    start = datetime(2021, 12, 25, 13, 30)
+    created = [start + timedelta(days=11 * i, hours=i) for i in range(200)]
+    get_task_collection(company).insert_many([_task(f"t{i}", created_at=date) for i, date in enumerate(created)])
+
+    for unit in ("day", "week", "month"):
+        figures = build_statistics_figures(company, False, unit, 0)
+        trace = figures["time"].data[0]
+        bin_size = _bucket_size(min(created), max(created), unit)
+        expected = _bucket_starts(pd.Series(pd.to_datetime(created)), unit, bin_size).value_counts().sort_index()
+        assert [pd.Timestamp(x) for x in trace.x] == list(expected.index)
+        assert list(trace.y) == list(expected.cumsum())
+
+
+def test_date_trunc_matches_the_server(company):
+    """The SQLite backend's $dateTrunc, and the snapshot bins, against the backend's own $dateTrunc."""
+    import pandas as pd
+
+    dates = [datetime(1999, 12, 30) + timedelta(days=13 * i, hours=7 * i) for i in range(250)]
+    collection = get_task_collection(company)
+    collection.insert_many([{"created_at": date} for date in dates])
+    for unit, bin_size in [("week", 1), ("week", 2), ("week", 5), ("month", 1), ("month", 2), ("month", 5)]:
+        rows = collection.aggregate([{"$project": {"_id": 0, "date": "$created_at",
+                                                   "bin": {"$dateTrunc": {"date": "$created_at", "unit": unit, "binSize": bin_size}}}}])
+        server = {row["date"]: row["bin"] for row in rows}
+        assert all(_date_trunc(date, unit, bin_size) == server[date] for date in dates), (unit, bin_size)
+        snapshot = _bucket_starts(pd.Series(pd.to_datetime(dates)), unit, bin_size)
+        assert [bucket.to_pydatetime() for bucket in snapshot] == [server[date] for date in dates], (unit, bin_size)
+
+
+def test_offboarding_rewrites_hot_and_archived_tasks(company):
+    database.get_users_collection().insert_many([{"email": email, "company_name": company} for email in ("a@x.com", "c@x.com")])
+    hot = _task("hot", assigned_to=["a@x.com", "b@x.com"], task_admin=["a@x.com"], subtasks=[
+        {"_id": ObjectId(), "name": "mine", "assigned_to": ["a@x.com"], "task_admin": [], "version": 0},
+        {"_id": ObjectId(), "name": "theirs", "assigned_to": ["b@x.com"], "task_admin": ["c@x.com"], "version": 0},
+    ])
+    untouched = _task("untouched", assigned_to=["b@x.com"])
+    archived = _task("archived", status="completed", assigned_to=["a@x.com"])
+    get_task_collection(company).insert_many([hot, untouched])
+    get_archive_collection(company).insert_one(archived)
+
+    summary = offboarding.offboard_users(["a@x.com"], "c@x.com", company)
+    assert summary == {"users_deleted": 1, "tasks_updated": 2}
+    task = get_task(hot["_id"], company)
+    # Every rewrite bumps the version, so forms opened before can't write the old references back
+    assert (sorted(task.assigned_to), task.task_admin, task.version > 0) == (["b@x.com", "c@x.com"], ["c@x.com"], True)
+    assert [(subtask.assigned_to, subtask.task_admin, subtask.version > 0) for subtask in task.subtasks] == [
+        (["c@x.com"], [], True), (["b@x.com"], ["c@x.com"], False)]
+    assert get_task(untouched["_id"], company).version == 0
+    assert get_task(archived["_id"], company).assigned_to == ["c@x.com"]
+    assert [user["email"] for user in database.get_users_collection().find({"company_name": company})] == ["c@x.com"]
+
+
+def test_status_updates_compare_and_set_the_version(company):
+    subtask_id = ObjectId()
+    task = _task("task", subtasks=[{"_id": subtask_id, "name": "sub", "status": "pending", "version": 0}])
+    get_task_collection(company).insert_one(task)
+
+    update_task_status(task["_id"], "in progress", company, "started", 10, "Ada (ada@x.com)", expected_version=0)
+    with pytest.raises(WriteConflict) as conflict:
+        update_task_status(task["_id"], "completed", company, "", 0, "Bob (bob@x.com)", expected_version=0)
+    assert (conflict.value.current.status, conflict.value.current.version) == ("in progress", 1)
+    assert get_task(task["_id"], company).status_updates[-1].updated_by == "Ada (ada@x.com)"
+
+    assert update_subtask_status(task["_id"], "sub", "completed", company, "", 0, subtask_id=subtask_id, expected_version=0)
+    with pytest.raises(WriteConflict):
+        update_subtask_status(task["_id"], "sub", "pending", company, "", 0, subtask_id=subtask_id, expected_version=0)
+    subtask = get_task(task["_id"], company).subtasks[0]
+    assert (subtask.status, subtask.version) == ("completed", 1)
+    assert not update_subtask_status(task["_id"], "missing", "completed", company, "", 0)
@@ -0,0 +1,241 @@
+"""The SQLite backend against MongoDB semantics.
+
+Every test runs on the SQLite backend; set ``TEST_MONGO_URI`` to run them against a MongoDB server
+as well, so both backends are held to the same expectations. Run from the repository root:
+
+    python -m pytest tests
+    TEST_MONGO_URI=mongodb://localhost:27017 python -m pytest tests
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+
+from src.sqlite_backend import SQLiteClient
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def db(request, tmp_path):
+    if request.param == "sqlite":
+        client = SQLiteClient(str(tmp_path / "test.sqlite3"))
+    else:
+        uri = os.environ.get("TEST_MONGO_URI")
+        if not uri:
+            pytest.skip("TEST_MONGO_URI is not set")
+        client = MongoClient(uri)
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture(params=[False, True], ids=["unindexed", "indexed"])
+def indexed(request):
+    return request.param
+
+
+def _ids(cursor):
+    return [document["_id"] for document in cursor]
+
+
+def test_bool_and_int_are_different_values(db, indexed):
+    tasks = db.tasks
+    if indexed:
+        tasks.create_index([("flag", 1)])
+    tasks.insert_many([{"_id": "bool", "flag": True}, {"_id": "int", "flag": 1}, {"_id": "str", "flag": "1"}, {"_id": "none"}])
+
+    assert _ids(tasks.find({"flag": 1})) == ["int"]
+    assert _ids(tasks.find({"flag": True})) == ["bool"]
+    assert sorted(_ids(tasks.find({"flag": {"$in": [True, "1"]}}))) == ["bool", "str"]
+    assert sorted(_ids(tasks.find({"flag": {"$ne": 1}}))) == ["bool", "none", "str"]
+    assert tasks.count_documents({"flag": {"$gte": 1}}) == 1
+    assert tasks.count_documents({"flag": None}) == 1
+
+
+def test_ranges_stay_within_a_type(db, indexed):
+    tasks = db.tasks
+    if indexed:
+        tasks.create_index([("due_date", 1)])
+    tasks.insert_many([
+        {"_id": "date", "due_date": datetime(2024, 5, 1)},
+        {"_id": "text", "due_date": "2024-05-01"},
+        {"_id": "number", "due_date": 20240501},
+        {"_id": "missing"},
+    ])
+
+    assert _ids(tasks.find({"due_date": {"$lt": datetime(2025, 1, 1)}})) == ["date"]
+    assert _ids(tasks.find({"due_date": {"$gt": "2024"}})) == ["text"]
+    assert _ids(tasks.find({"due_date": {"$gt": 0}})) == ["number"]
+
+
+def test_sort_follows_the_bson_type_order(db, indexed):
+    tasks = db.tasks
+    if indexed:
+        tasks.create_index([("value", 1), ("_id", 1)])
+    oid = ObjectId()
+    tasks.insert_many([
+        {"_id": 1, "value": datetime(2024, 1, 1)},
+        {"_id": 2, "value": True},
+        {"_id": 3, "value": oid},
+        {"_id": 4, "value": "b"},
+        {"_id": 5, "value": "a"},
+        {"_id": 6, "value": 2.5},
+        {"_id": 7, "value": 10},
+        {"_id": 8, "value": None},
+        {"_id": 9},
+        {"_id": 10, "value": False},
+    ])
+
+    ascending = [8, 9, 6, 7, 5, 4, 3, 10, 2, 1]
+    assert _ids(tasks.find(sort=[("value", 1), ("_id", 1)])) == ascending
+    assert _ids(tasks.find(sort=[("value", -1), ("_id", -1)])) == ascending[::-1]
+    assert _ids(tasks.find(sort=[("value", 1), ("_id", 1)], skip=2, limit=3)) == ascending[2:5]
+
+
+def test_array_fields_sort_by_smallest_element_ascending_and_largest_descending(db):
+    tasks = db.tasks
+    tasks.insert_many([{"_id": "wide", "scores": [1, 9]}, {"_id": "narrow", "scores": [4, 5]}])
+
+    assert _ids(tasks.find(sort=[("scores", 1)])) == ["wide", "narrow"]
+    assert _ids(tasks.find(sort=[("scores", -1)])) == ["wide", "narrow"]
+    tasks.insert_one({"_id": "high", "scores": [7]})
+    assert _ids(tasks.find(sort=[("scores", -1)])) == ["wide", "high", "narrow"]
+
+
+def test_multikey_filters(db, indexed):
+    tasks = db.tasks
+    tasks.insert_one({"_id": "before", "assigned_to": ["ada@x.com", "bob@x.com"], "status": "pending"})
+    if indexed:
+        tasks.create_index([("assigned_to", 1), ("status", 1)])
+    tasks.insert_many([
+        {"_id": "single", "assigned_to": ["bob@x.com"], "status": "completed"},
+        {"_id": "scalar", "assigned_to": "ada@x.com", "status": "pending"},
+        {"_id": "nobody", "assigned_to": [], "status": "pending"},
+        {"_id": "mixed", "assigned_to": [1, True], "status": "pending"},
+    ])
+
+    assert sorted(_ids(tasks.find({"assigned_to": "ada@x.com"}))) == ["before", "scalar"]
+    assert sorted(_ids(tasks.find({"assigned_to": "bob@x.com", "status": "pending"}))) == ["before"]
+    assert sorted(_ids(tasks.find({"assigned_to": {"$in": ["bob@x.com", "cy@x.com"]}}))) == ["before", "single"]
+    assert sorted(_ids(tasks.find({"assigned_to": {"$nin": ["ada@x.com"]}}))) == ["mixed", "nobody", "single"]
+    assert sorted(_ids(tasks.find({"assigned_to": {"$ne": "bob@x.com"}}))) == ["mixed", "nobody", "scalar"]
+    assert _ids(tasks.find({"assigned_to": True})) == ["mixed"]
+    assert _ids(tasks.find({"assigned_to": {"$gt": 0}})) == ["mixed"]
+
+    tasks.update_one({"_id": "single"}, {"$push": {"assigned_to": "ada@x.com"}})
+    tasks.update_one({"_id": "before"}, {"$pull": {"assigned_to": "ada@x.com"}})
+    assert sorted(_ids(tasks.find({"assigned_to": "ada@x.com"}))) == ["scalar", "single"]
+    tasks.delete_one({"_id": "single"})
+    assert _ids(tasks.find({"assigned_to": "ada@x.com"})) == ["scalar"]
+
+
+def test_field_becoming_an_array_after_the_index_exists(db):
+    tasks = db.tasks
+    tasks.create_index([("depends_on", 1)])
+    first, second = ObjectId(), ObjectId()
+    tasks.insert_one({"_id": "scalar", "depends_on": first})
+    tasks.insert_one({"_id": "array", "depends_on": [first, second]})
+
+    assert sorted(_ids(tasks.find({"depends_on": first}))) == ["array", "scalar"]
+    assert _ids(tasks.find({"depends_on": second})) == ["array"]
+
+
+def test_dotted_index_on_subdocuments(db, indexed):
+    tasks = db.tasks
+    if indexed:
+        tasks.create_index([("subtasks.status", 1), ("subtasks.due_date", 1)])
+    today = datetime(2024, 6, 1)
+    tasks.insert_many([
+        {"_id": "a", "subtasks": [{"name": "s1", "status": "pending", "due_date": today - timedelta(days=2)},
+                                  {"name": "s2", "status": "completed", "due_date": today + timedelta(days=2)}]},
+        {"_id": "b", "subtasks": [{"name": "s3", "status": "completed", "due_date": today - timedelta(days=5)}]},
+        {"_id": "c", "subtasks": []},
+    ])
+
+    assert _ids(tasks.find({"subtasks.status": "pending"})) == ["a"]
+    assert sorted(_ids(tasks.find({"subtasks.due_date": {"$lt": today}}))) == ["a", "b"]
+    assert sorted(_ids(tasks.find({"subtasks.status": {"$ne": "pending"}}))) == ["b", "c"]
+    assert _ids(tasks.find({"subtasks": {"$elemMatch": {"status": "completed", "due_date": {"$lt": today}}}})) == ["b"]
+
+    tasks.update_one({"_id": "b"}, {"$set": {"subtasks.$[item].status": "pending"}}, array_filters=[{"item.name": "s3"}])
+    assert sorted(_ids(tasks.find({"subtasks.status": "pending"}))) == ["a", "b"]
+    tasks.delete_many({"_id": "a"})
+    assert _ids(tasks.find({"subtasks.status": "pending"})) == ["b"]
+
+
+def test_index_information_keeps_names_and_options(db):
+    views = db.saved_views
+    views.create_index([("owner", 1), ("name", 1)], unique=True)
+    views.create_index([("created_at", -1)], name="newest_first")
+    views.create_index([("subtasks.status", 1)], name="subtask_status")
+
+    info = views.index_information()
+    assert info["owner_1_name_1"]["key"] == [("owner", 1), ("name", 1)]
+    assert info["owner_1_name_1"]["unique"] is True
+    assert info["newest_first"]["key"] == [("created_at", -1)]
+    assert info["subtask_status"]["key"] == [("subtasks.status", 1)]
+
+
+def test_unique_index_rejects_duplicates(db):
+    from pymongo.errors import DuplicateKeyError
+
+    views = db.saved_views
+    views.create_index([("owner", 1), ("name", 1)], unique=True)
+    views.insert_one({"owner": "ada@x.com", "name": "Mine"})
+    views.insert_one({"owner": "ada@x.com", "name": "Other"})
+    with pytest.raises(DuplicateKeyError):
+        views.insert_one({"owner": "ada@x.com", "name": "Mine"})
+
+
+def test_updates(db):
+    tasks = db.tasks
+    tasks.insert_one({"_id": "t", "version": 1, "status_updates": []})
+    result = tasks.update_one({"_id": "t", "version": 1}, {"$inc": {"version": 1}, "$push": {"status_updates": {"status": "started"}}})
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    assert tasks.update_one({"_id": "t", "version": 1}, {"$inc": {"version": 1}}).matched_count == 0
+
+    result = tasks.bulk_write([UpdateOne({"_id": "t"}, {"$set": {"status": "pending"}}),
+                               UpdateOne({"_id": "u"}, {"$setOnInsert": {"status": "new"}}, upsert=True)])
+    assert (result.modified_count, result.upserted_count) == (1, 1)
+    assert tasks.find_one({"_id": "t"}, {"_id": 0, "version": 1, "status": 1}) == {"version": 2, "status": "pending"}
+    assert tasks.find_one({"_id": "u"})["status"] == "new"
+
+
+def test_aggregation(db):
+    tasks = db.tasks
+    tasks.insert_many([
+        {"status": "pending", "assigned_to": ["ada@x.com", "bob@x.com"], "minutes": 30},
+        {"status": "pending", "assigned_to": ["ada@x.com"], "minutes": 15},
+        {"status": "completed", "assigned_to": ["bob@x.com"], "minutes": 60},
+    ])
+
+    per_user = list(tasks.aggregate([
+        {"$match": {"status": "pending"}},
+        {"$unwind": "$assigned_to"},
+        {"$group": {"_id": "$assigned_to", "count": {"$sum": 1}, "minutes": {"$sum": "$minutes"}}},
+        {"$sort": {"_id": 1}},
+    ]))
+    assert per_user == [{"_id": "ada@x.com", "count": 2, "minutes": 45}, {"_id": "bob@x.com", "count": 1, "minutes": 30}]
+
+    facets = next(tasks.aggregate([{"$facet": {
+        "total": [{"$count": "n"}],
+        "by_status": [{"$group": {"_id": "$status", "n": {"$sum": 1}}}, {"$sort": {"n": -1}}],
+    }}]))
+    assert facets["total"] == [{"n": 3}]
+    assert facets["by_status"] == [{"_id": "pending", "n": 2}, {"_id": "completed", "n": 1}]
+
+
+def test_rename_keeps_documents_and_indexes(db):
+    staged = db.staged_tasks
+    staged.create_index([("assigned_to", 1), ("status", 1)])
+    staged.insert_many([{"_id": "a", "assigned_to": ["ada@x.com"], "status": "pending"}, {"_id": "b", "assigned_to": ["bob@x.com"], "status": "pending"}])
+    db.tasks.insert_one({"_id": "old"})
+
+    staged.rename("tasks", dropTarget=True)
+    assert "staged_tasks" not in db.list_collection_names()
+    assert sorted(_ids(db.tasks.find())) == ["a", "b"]
+    assert _ids(db.tasks.find({"assigned_to": "ada@x.com", "status": "pending"})) == ["a"]
+    assert db.tasks.index_information()["assigned_to_1_status_1"]["key"] == [("assigned_to", 1), ("status", 1)]